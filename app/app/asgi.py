@@ -2,6 +2,7 @@
 ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests to EVENTS_PATH are routed to the change event stream.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -11,6 +12,17 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from app.startup import preload, profile_startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+application = profile_startup('asgi', get_asgi_application)
+
+from core.events import router  # noqa: E402
+
+# Change event streams are served outside Django's request handling so
+# an open stream holds no worker thread.
+application = router(application)
+
+if os.environ.get('APP_PRELOAD'):
+    profile_startup('preload', preload)
@@ -20,12 +20,18 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-jw&c3#=@!_uytmmf=tfa%*!0$8w4hu949-n247d)ikh+#dd0_e'
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY',
+    'django-insecure-jw&c3#=@!_uytmmf=tfa%*!0$8w4hu949-n247d)ikh+#dd0_e',
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = bool(int(os.environ.get('DEBUG', 1)))
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+    if host
+]
 
 # Application definition
 
@@ -45,6 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.RequestProfilingMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -95,6 +104,23 @@ DATABASES = {
     }
 }
 
+# Cache
+# Version tokens, fragments, facets, stats and rebuild locks must be seen
+# by every worker, so deployments point CACHE_LOCATION at memcached.
+# Without it each process caches for itself, which only suits a single
+# development server.
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION', '')
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND') or (
+            'django.core.cache.backends.memcached.PyMemcacheCache'
+            if CACHE_LOCATION else
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': CACHE_LOCATION,
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -138,6 +164,18 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# collectstatic writes content-hashed names with .br and .gz variants,
+# served by core.staticfiles.serve_static with far-future cache headers.
+if not DEBUG:
+    STATICFILES_STORAGE = (
+        'core.staticfiles.CompressedManifestStaticFilesStorage'
+    )
+
+# Responses smaller than this many bytes are sent uncompressed.
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -146,9 +184,99 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_SCHEMA_CLASS': 'core.annotations.LazyAutoSchema',
+    'DEFAULT_THROTTLE_CLASSES': ['core.throttling.TokenBucketThrottle'],
+    'DEFAULT_THROTTLE_RATES': {
+        'reads': os.environ.get('THROTTLE_READS', '1000/min'),
+        'writes': os.environ.get('THROTTLE_WRITES', '200/min'),
+        'uploads': os.environ.get('THROTTLE_UPLOADS', '30/min'),
+        'token': os.environ.get('THROTTLE_TOKEN', '20/min'),
+    },
 }
 
+# Where core.throttling keeps token buckets: CacheBucketStore uses the
+# default cache and suits one process, MmapBucketStore a file shared by
+# workers on the node and locked per bucket. gunicorn.conf.py defaults
+# to the latter. The image recreates /tmp writable for its django-user.
+THROTTLE_STORE = os.environ.get(
+    'THROTTLE_STORE', 'core.throttling.CacheBucketStore'
+)
+THROTTLE_MMAP_PATH = os.environ.get(
+    'THROTTLE_MMAP_PATH', '/tmp/recipe-api-throttle'
+)
+THROTTLE_MMAP_SLOTS = 65536
+
+# Seconds a response stored for an Idempotency-Key can be replayed.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+# Seconds after which a key whose request never finished, e.g. because
+# its worker crashed, can be claimed again. Longer than any request runs.
+IDEMPOTENCY_KEY_LEASE = int(os.environ.get('IDEMPOTENCY_KEY_LEASE', 300))
+
 SPECTACULAR_SETTINGS = {
+    'DEFAULT_GENERATOR_CLASS': 'core.generators.SchemaGenerator',
     'COMPONENT_SPLIT_REQUEST': True,
-}
\ No newline at end of file
+    'SERVE_INCLUDE_SCHEMA': False,
+}
+
+# Most API calls a single /api/batch/ request may carry.
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 25))
+
+# Change events of /api/events/ are published through EVENTS_BACKEND:
+# core.events.LocalBackend reaches streams of the same process only, use
+# core.events.PostgresBackend when streams and writes run in separate
+# processes. Idle streams get a keep-alive comment every EVENTS_KEEPALIVE
+# seconds and a slow client's backlog is capped at EVENTS_QUEUE_SIZE.
+EVENTS_PATH = '/api/events/'
+EVENTS_BACKEND = os.environ.get(
+    'EVENTS_BACKEND', 'core.events.LocalBackend'
+)
+EVENTS_KEEPALIVE = float(os.environ.get('EVENTS_KEEPALIVE', 15))
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+EVENTS_RETRY_MS = 5000
+
+# Weight of a shared tag or ingredient in recipe similarity, and how
+# many users' similarity indexes each process keeps in memory.
+SIMILARITY_WEIGHTS = {'tags': 1.0, 'ingredients': 2.0}
+SIMILARITY_CACHE_USERS = int(os.environ.get('SIMILARITY_CACHE_USERS', 32))
+
+# Seconds facet counts of a recipe filter and recipe statistics are
+# cached, writes to the user's recipes, tags or ingredients expire them
+# earlier.
+FACET_CACHE_TIMEOUT = int(os.environ.get('FACET_CACHE_TIMEOUT', 300))
+STATS_CACHE_TIMEOUT = int(os.environ.get('STATS_CACHE_TIMEOUT', 3600))
+
+# Days soft deleted recipes, tags and ingredients can be restored before
+# purge_deleted removes them for good.
+SOFT_DELETE_RETENTION_DAYS = int(
+    os.environ.get('SOFT_DELETE_RETENTION_DAYS', 30)
+)
+
+# Seconds rendered recipe, tag and ingredient fragments are cached. Their
+# keys carry per-object versions, so writes expire them immediately.
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', 86400))
+
+# The OpenAPI schema is cached per code version, APP_VERSION falls back
+# to a fingerprint of the sources when it is not set.
+APP_VERSION = os.environ.get('APP_VERSION', '')
+SCHEMA_CACHE_DIR = os.environ.get('SCHEMA_CACHE_DIR', '/vol/web/schema')
+
+# Bearer token Prometheus must send to scrape /metrics/. Without one the
+# endpoint is only served with DEBUG on.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Share of requests instrumented by core.profiling.RequestProfilingMiddleware,
+# 0 disables the middleware entirely.
+REQUEST_PROFILING_SAMPLE_RATE = float(
+    os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 0)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.profiling': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
@@ -0,0 +1,92 @@
+"""
+Startup profiling and pre-fork warm up for the app processes
+"""
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+from django.utils.module_loading import import_string
+
+def profile_startup(label, loader):
+    """
+        Run loader, profiling it when STARTUP_PROFILE is set.
+
+        The slowest calls are printed to stderr, and the raw profile is
+        also dumped when STARTUP_PROFILE names a .prof file.
+    """
+    target = os.environ.get('STARTUP_PROFILE')
+    if not target:
+        return loader()
+
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    result = profiler.runcall(loader)
+    elapsed = (time.perf_counter() - started) * 1000
+    sys.stderr.write(f'{label} startup took {elapsed:.1f}ms\n')
+    pstats.Stats(profiler, stream=sys.stderr).sort_stats(
+        'cumulative'
+    ).print_stats(25)
+    if target.endswith('.prof'):
+        profiler.dump_stats(target)
+    return result
+
+def lazy_view(dotted_path, **initkwargs):
+    """
+        Return a view that imports the class-based view at dotted_path on
+        its first request, keeping heavy modules out of worker boot.
+    """
+    view = None
+
+    def load():
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path).as_view(**initkwargs)
+        return view
+
+    def lazy(request, *args, **kwargs):
+        return load()(request, *args, **kwargs)
+    lazy.load = load
+    lazy.csrf_exempt = True
+    return lazy
+
+def preload():
+    """
+        Do the lazy first-request work up front so forked workers share
+        it copy-on-write: import the URL tree and the modules deferred
+        to first use, build model meta caches and every serializer's
+        fields, and render the OpenAPI schema.
+    """
+    from django.apps import apps
+    from django.urls import get_resolver
+
+    from core import schema
+
+    for model in apps.get_models():
+        model._meta.get_fields()
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # populates the resolver caches
+    for callback in iter_callbacks(resolver.url_patterns):
+        if hasattr(callback, 'load'):
+            callback = callback.load()
+        serializer_class = getattr(
+            getattr(callback, 'cls', None), 'serializer_class', None
+        )
+        if serializer_class is not None:
+            serializer_class().fields
+
+    import PIL.Image  # noqa: F401
+    from core import similarity  # noqa: F401
+
+    for format in schema.RENDERERS:
+        schema.get_schema(format)
+
+def iter_callbacks(patterns):
+    """ Yield the view callback of every URL pattern """
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from iter_callbacks(pattern.url_patterns)
+        else:
+            yield pattern.callback
@@ -14,20 +14,42 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from django.urls import path, include, re_path
 from django.conf.urls.static import static
 from django.conf import settings
 
+from app.startup import lazy_view
+from core.batch import BatchView
+from core.health import healthz, readyz
+from core.metrics import metrics_view
+from core.staticfiles import serve_static
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='api-schema'), name='api-docs'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('healthz/', healthz, name='healthz'),
+    path('readyz/', readyz, name='readyz'),
+    path(
+        'api/schema/',
+        lazy_view('core.schema.CachedSpectacularAPIView'),
+        name='api-schema',
+    ),
+    path(
+        'api/docs/',
+        lazy_view(
+            'drf_spectacular.views.SpectacularSwaggerView',
+            url_name='api-schema',
+        ),
+        name='api-docs',
+    ),
+    path('api/batch/', BatchView.as_view(), name='batch'),
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
+    re_path(
+        r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'),
+        serve_static,
+        name='static',
+    ),
 ]
 
 if settings.DEBUG:
@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from app.startup import preload, profile_startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_wsgi_application()
+application = profile_startup('wsgi', get_wsgi_application)
+
+if os.environ.get('APP_PRELOAD'):
+    profile_startup('preload', preload)
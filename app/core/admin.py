@@ -3,9 +3,110 @@ Django admin customization
 """
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
 from core import models
+from core.deletion import schedule_user_deletion
+
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+def estimate_relation(model):
+    """
+        Return the relation whose row estimate counts the rows of the
+        model's default manager: the table, or for soft deleted models a
+        plain partial index on LIVE, which leaves out the tombstones
+    """
+    if issubclass(model, models.SoftDeleteModel):
+        for index in model._meta.indexes:
+            if index.condition == models.LIVE and index.fields:
+                return index.name
+    return model._meta.db_table
+
+class EstimatedCountPaginator(Paginator):
+    """
+        Use the planner's row estimate instead of COUNT(*) for unfiltered
+        changelists of big Postgres tables
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        # The default manager may filter on its own, e.g. LiveManager
+        base = queryset.model._default_manager.all().query.where
+        if connection.vendor == 'postgresql' and queryset.query.where == base:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [estimate_relation(queryset.model)],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+class UserEmailFilter(admin.SimpleListFilter):
+    """ Filter rows of one user by exact email, an indexed lookup """
+    title = _('user email')
+    parameter_name = 'user_email'
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return []
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(user__email=self.value().strip())
+        return queryset
+
+    def choices(self, changelist):
+        yield {
+            'query_parts': [
+                (key, value)
+                for key, value in changelist.get_filters_params().items()
+                if key != self.parameter_name
+            ],
+        }
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """
+        Changelist for tables with millions of rows: no full COUNT(*),
+        raw ID user widget, per-user filter and search limited to indexed
+        lookups (an ID, an owner email or a case-sensitive name prefix).
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    list_filter = [UserEmailFilter]
+    search_prefix_field = None
+
+    def delete_model(self, request, obj):
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        """ Soft delete the selected rows, one by one for the signals """
+        with transaction.atomic():
+            for obj in queryset:
+                obj.soft_delete()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        if '@' in term:
+            return queryset.filter(user__email=term), False
+        return queryset.filter(
+            **{f'{self.search_prefix_field}__startswith': term}
+        ), False
 
 class UserAdmin(BaseUserAdmin):
     """ Define the admin pages for user """
@@ -24,6 +125,7 @@ class UserAdmin(BaseUserAdmin):
         (_('Important dates'), {'fields': ('last_login',)})
     )
     readonly_fields = ['last_login']
+    actions = ['schedule_deletion']
     add_fieldsets = (
         (None, {
             'classes': ('wide',),
@@ -39,7 +141,52 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
-admin.site.register(models.User, UserAdmin) 
-admin.site.register(models.Recipe)  
-admin.site.register(models.Tag)  
-admin.site.register(models.Ingredient)  
+    def get_actions(self, request):
+        """ Users are deleted in batches, never by cascading in memory """
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description=_('Delete selected users in the background'))
+    def schedule_deletion(self, request, queryset):
+        for user in queryset:
+            schedule_user_deletion(user)
+        self.message_user(
+            request, _('Scheduled %d deletions.') % len(queryset)
+        )
+
+class UserDeletionAdmin(admin.ModelAdmin):
+    """ Show the progress of background user deletions """
+    list_display = ['email', 'user_id', 'deleted', 'created', 'finished']
+    readonly_fields = list_display
+
+    def has_add_permission(self, request):
+        return False
+
+class RecipeAdmin(ScalableModelAdmin):
+    """ Define the admin pages for recipes """
+    list_display = ['id', 'title', 'user', 'price', 'time_minutes']
+    search_fields = ['title']
+    search_prefix_field = 'title'
+    autocomplete_fields = ['tags', 'ingredients']
+
+class TagAdmin(ScalableModelAdmin):
+    """ Define the admin pages for tags """
+    list_display = ['id', 'name', 'user', 'recipe_count']
+    search_fields = ['name']
+    search_prefix_field = 'name'
+
+class IngredientAdmin(ScalableModelAdmin):
+    """ Define the admin pages for ingredients """
+    list_display = ['id', 'name', 'quantity', 'scale', 'user', 'recipe_count']
+    search_fields = ['name']
+    search_prefix_field = 'name'
+
+admin.site.register(models.User, UserAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
+admin.site.register(models.UserDeletion, UserDeletionAdmin)
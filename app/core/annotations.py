@@ -0,0 +1,73 @@
+"""
+OpenAPI annotations applied when the schema is first generated
+
+drf-spectacular's extend_schema builds a schema class for the view it
+decorates right away, which imports drf_spectacular.openapi and its
+plumbing in every process that merely serves the API. These decorators
+take the same arguments but only record them. SchemaGenerator of
+core.generators applies them, in declaration order, before it inspects
+any view.
+"""
+import functools
+import inspect
+import sys
+import threading
+
+from drf_spectacular import utils
+from drf_spectacular.utils import OpenApiParameter, OpenApiTypes  # noqa: F401
+
+from rest_framework.schemas.inspectors import ViewInspector
+
+_pending = []
+_lock = threading.Lock()
+
+class LazyAutoSchema(ViewInspector):
+    """
+        DEFAULT_SCHEMA_CLASS that stands in for drf-spectacular's
+        AutoSchema until schema generation has imported it. Routers
+        build a schema for every viewset they list while the URLs load,
+        which no longer imports drf_spectacular.openapi.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        openapi = sys.modules.get('drf_spectacular.openapi')
+        if openapi is None:
+            return super().__new__(cls)
+        return openapi.AutoSchema(*args, **kwargs)
+
+def extend_schema(**kwargs):
+    """ Deferred drf_spectacular.utils.extend_schema """
+    def decorator(f):
+        _pending.append((f, functools.partial(_extend, kwargs=kwargs)))
+        return f
+    decorator.kwargs = kwargs
+    return decorator
+
+def extend_schema_view(**decorators):
+    """
+        Deferred drf_spectacular.utils.extend_schema_view, taking the
+        extend_schema decorators of this module
+    """
+    def decorator(view):
+        _pending.append((view, utils.extend_schema_view(**{
+            name: functools.partial(_extend, kwargs=method_decorator.kwargs)
+            for name, method_decorator in decorators.items()
+        })))
+        return view
+    return decorator
+
+def _extend(target, kwargs):
+    """ Apply extend_schema on top of drf-spectacular's AutoSchema """
+    from drf_spectacular.openapi import AutoSchema
+    if not inspect.isclass(target):
+        # Methods would otherwise extend DEFAULT_SCHEMA_CLASS, the lazy one
+        target.kwargs = getattr(target, 'kwargs', {})
+        target.kwargs.setdefault('schema', AutoSchema)
+    return utils.extend_schema(**kwargs)(target)
+
+def apply_annotations():
+    """ Apply the annotations recorded so far, each one once """
+    with _lock:
+        while _pending:
+            target, decorator = _pending.pop(0)
+            decorator(target)
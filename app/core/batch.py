@@ -0,0 +1,165 @@
+"""
+Batch endpoint running many API calls in one HTTP request
+"""
+import json
+import logging
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import DatabaseError, transaction
+from django.urls import Resolver404, resolve
+
+from rest_framework import serializers, status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.annotations import extend_schema
+
+logger = logging.getLogger('core.batch')
+
+# URL namespaces sub-requests may target
+NAMESPACES = ('user', 'recipe')
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+SERVER_ERROR = (
+    status.HTTP_500_INTERNAL_SERVER_ERROR, {'detail': 'Internal server error.'}
+)
+
+class SubRequestSerializer(serializers.Serializer):
+    """ Serializer for one call of a batch """
+    method = serializers.ChoiceField(
+        choices=['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'],
+        default='GET',
+    )
+    path = serializers.CharField(help_text='Path with optional query string.')
+    body = serializers.JSONField(required=False)
+
+class BatchSerializer(serializers.Serializer):
+    """ Serializer for a batch of API calls """
+    requests = SubRequestSerializer(many=True)
+
+    def validate_requests(self, requests):
+        if not requests:
+            raise serializers.ValidationError('Send at least one request.')
+        if len(requests) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                f'At most {settings.BATCH_MAX_REQUESTS} requests per batch.'
+            )
+        return requests
+
+class SubResponseSerializer(serializers.Serializer):
+    """ Serializer for the response of one call """
+    status = serializers.IntegerField()
+    body = serializers.JSONField(allow_null=True)
+
+class BatchResponseSerializer(serializers.Serializer):
+    """ Serializer for the responses of a batch, in request order """
+    responses = SubResponseSerializer(many=True)
+
+def build_request(request, method, path, body=None):
+    """
+        Return a WSGI request for a sub-call that reuses the batch
+        request's environment and its already authenticated user.
+    """
+    url = urlsplit(path)
+    content = b'' if body is None else json.dumps(body).encode()
+    environ = {
+        key: value for key, value in request.META.items()
+        if not key.startswith(('CONTENT_', 'HTTP_IDEMPOTENCY_KEY'))
+    }
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': BytesIO(content),
+    })
+    if body is not None:
+        environ['CONTENT_TYPE'] = 'application/json'
+    sub_request = WSGIRequest(environ)
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+def run_call(request, method, path, body=None):
+    """ Dispatch one call to its view and return (status, body) """
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        match = None
+    if match is None or match.app_name not in NAMESPACES:
+        return status.HTTP_404_NOT_FOUND, {'detail': 'Not found.'}
+
+    response = match.func(
+        build_request(request, method, path, body),
+        *match.args, **match.kwargs
+    )
+    if hasattr(response, 'render'):
+        response.render()
+    if not response.content:
+        return response.status_code, None
+    try:
+        return response.status_code, json.loads(response.content)
+    except ValueError:
+        return response.status_code, response.content.decode(errors='replace')
+
+class BatchView(APIView):
+    """
+        Run up to BATCH_MAX_REQUESTS calls to the user and recipe APIs.
+
+        The caller is authenticated once and every call runs in one
+        transaction on the same database connection, so reads see a
+        single consistent state. Each write gets its own savepoint: a
+        failed write is rolled back without affecting the others. A read
+        that fails only fails its own call, unless it is a database
+        error, which aborts the transaction every call shares.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=BatchSerializer, responses=BatchResponseSerializer
+    )
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        responses = []
+        with transaction.atomic():
+            for call in serializer.validated_data['requests']:
+                method = call['method']
+                if method in SAFE_METHODS:
+                    code, body = self.run_read(request, call)
+                else:
+                    code, body = self.run_write(request, call)
+                responses.append({'status': code, 'body': body})
+        return Response({'responses': responses})
+
+    def run_read(self, request, call):
+        """ Run a read without a savepoint, which would cost two queries """
+        try:
+            return run_call(request, call['method'], call['path'])
+        except DatabaseError:
+            raise
+        except Exception:
+            logger.exception('Batch call %s %s failed', call['method'],
+                             call['path'])
+            return SERVER_ERROR
+
+    def run_write(self, request, call):
+        """ Run a write in a savepoint, rolled back if it fails """
+        try:
+            with transaction.atomic():
+                code, body = run_call(
+                    request, call['method'], call['path'], call.get('body')
+                )
+                if code >= 400:
+                    transaction.set_rollback(True)
+                return code, body
+        except Exception:
+            logger.exception('Batch call %s %s failed', call['method'],
+                             call['path'])
+            return SERVER_ERROR
@@ -0,0 +1,175 @@
+"""
+Benchmarks for the API hot paths
+"""
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+SIZES = {
+    'small': {'users': 20, 'recipes': 2000, 'power_user_recipes': 100},
+    'medium': {'users': 50, 'recipes': 10000, 'power_user_recipes': 1000},
+    'large': {'users': 100, 'recipes': 50000, 'power_user_recipes': 10000},
+}
+PASSWORD = 'synthetic123'
+
+def jpeg_file():
+    """ Return a small in-memory JPEG ready for multipart upload """
+    from PIL import Image
+
+    content = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(content, format='JPEG')
+    content.name = 'bench.jpg'
+    content.seek(0)
+    return content
+
+def scenarios(user):
+    """ Return (name, request callable) pairs for the benchmarked routes """
+    recipe = Recipe.objects.filter(user=user).order_by('-id').first()
+    recipe_url = reverse('recipe:recipe-detail', args=[recipe.id])
+    create_payload = {
+        'title': 'Benchmark Curry',
+        'time_minutes': 30,
+        'price': '5.50',
+        'tags': [{'name': 'Vegan'}, {'name': 'Dinner'}],
+        'ingredients': [{'name': 'Rice', 'quantity': 200, 'scale': 'gm'}],
+    }
+    update_payload = {
+        'title': 'Benchmark Dal',
+        'tags': [{'name': 'Lunch'}],
+    }
+    token_payload = {'email': user.email, 'password': PASSWORD}
+    # Writes come last, so every read is timed against the dataset as
+    # generated rather than one grown by the benchmark itself
+    return [
+        ('recipe-list', lambda client: client.get(
+            reverse('recipe:recipe-list'))),
+        ('recipe-detail', lambda client: client.get(recipe_url)),
+        ('recipe-similar', lambda client: client.get(
+            reverse('recipe:recipe-similar', args=[recipe.id]))),
+        ('tag-list', lambda client: client.get(reverse('recipe:tag-list'))),
+        ('ingredient-list', lambda client: client.get(
+            reverse('recipe:ingredient-list'))),
+        ('token', lambda client: client.post(
+            reverse('user:token'), token_payload)),
+        ('recipe-create', lambda client: client.post(
+            reverse('recipe:recipe-list'), create_payload, format='json')),
+        ('recipe-update', lambda client: client.patch(
+            recipe_url, update_payload, format='json')),
+        ('upload-image', lambda client: client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe.id]),
+            {'image': jpeg_file()}, format='multipart')),
+    ]
+
+def percentile(samples, fraction):
+    """ Return the nearest-rank percentile of sorted samples """
+    index = max(0, min(len(samples) - 1, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+def make_client(token):
+    """ Return an API client authenticated with token """
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+def check(name, response):
+    """ Fail the benchmark on an error response """
+    if response.status_code >= 400:
+        raise RuntimeError(
+            f'{name} failed with {response.status_code}: {response.data}'
+        )
+
+def measure_throughput(name, request, token, iterations, concurrency):
+    """
+        Send iterations requests from each of concurrency clients at
+        once and return the requests completed per second
+    """
+    def send():
+        client = make_client(token)
+        for _ in range(iterations):
+            check(name, request(client))
+
+    def send_and_close():
+        try:
+            send()
+        finally:
+            # Every thread opened its own database connection
+            connection.close()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        send()
+    else:
+        with ThreadPoolExecutor(concurrency) as executor:
+            futures = [
+                executor.submit(send_and_close) for _ in range(concurrency)
+            ]
+            for future in futures:
+                future.result()
+    elapsed = time.perf_counter() - started
+    return iterations * concurrency / elapsed
+
+def run_scenarios(user, iterations=20, only=None, concurrency=1):
+    """
+        Time every scenario against the real URL routes as user.
+
+        The query count comes from a separate warm-up request so that
+        capturing queries does not skew the timed iterations. Latency is
+        measured one request at a time, throughput with concurrency
+        clients sending iterations requests each.
+    """
+    token, created = Token.objects.get_or_create(user=user)
+    client = make_client(token)
+    results = {}
+    for name, request in scenarios(user):
+        if only and name not in only:
+            continue
+        with CaptureQueriesContext(connection) as queries:
+            response = request(client)
+        query_count = len(queries)
+        check(name, response)
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            request(client)
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        results[name] = {
+            'p50_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(percentile(samples, 0.95), 3),
+            'rps': round(measure_throughput(
+                name, request, token, iterations, concurrency
+            ), 1),
+            'queries': query_count,
+        }
+    return results
+
+def compare(results, baseline, threshold=0.2):
+    """ Return a description of every regression against baseline """
+    regressions = []
+    for size, scenario_results in results.items():
+        for name, result in scenario_results.items():
+            expected = baseline.get(size, {}).get(name)
+            if expected is None:
+                continue
+            if result['queries'] > expected['queries']:
+                regressions.append(
+                    f"{size}/{name}: {result['queries']} queries, "
+                    f"baseline {expected['queries']}"
+                )
+            limit = expected['p50_ms'] * (1 + threshold)
+            if result['p50_ms'] > limit:
+                regressions.append(
+                    f"{size}/{name}: p50 {result['p50_ms']}ms, "
+                    f"baseline {expected['p50_ms']}ms"
+                )
+    return regressions
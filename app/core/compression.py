@@ -0,0 +1,94 @@
+"""
+Negotiated gzip and brotli compression for responses and static files
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is in requirements.txt
+    brotli = None
+
+# Formats that are already compressed gain nothing from another pass
+INCOMPRESSIBLE_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff', 'application/gzip',
+    'application/zip', 'application/x-brotli', 'text/event-stream',
+)
+
+def available_encodings():
+    """ Return the supported encodings, most preferred first """
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def negotiate(accept_encoding, encodings=None):
+    """
+        Return the first of encodings the Accept-Encoding header allows
+        with the highest q-value, or None for the identity encoding.
+    """
+    if encodings is None:
+        encodings = available_encodings()
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    wildcard = weights.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for coding in encodings:
+        quality = weights.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+def compress(content, encoding):
+    """ Compress bytes with encoding ('br' or 'gzip') """
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.GZIP_LEVEL, mtime=0)
+
+def is_compressible(content_type):
+    """ Return whether a response of content_type is worth compressing """
+    content_type = content_type.lower()
+    return not content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+class CompressionMiddleware:
+    """
+        Compress responses with brotli or gzip, whichever the client
+        prefers, once they reach COMPRESSION_MIN_SIZE bytes. Streaming
+        responses and already-compressed media types are left alone.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not is_compressible(response.get('Content-Type', '')):
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
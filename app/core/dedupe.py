@@ -0,0 +1,143 @@
+"""
+Merging of duplicate tags and ingredients
+
+Tags and ingredients used to be matched on their exact name, so users
+piled up "Vegan", "vegan " and "VEGAN" side by side. Names are now
+normalized on write and unique per user whatever their case. This module
+clusters the near duplicates that remain, such as "Gluten-free" and
+"gluten free", and merges each cluster into its most used member. The
+through table references are rewritten with a couple of set-based
+statements in one transaction, however many recipes are involved.
+"""
+import unicodedata
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from core import events
+from core.fragments import touch
+from core.models import Ingredient, refresh_recipe_counts
+
+# (duplicate, kept) pairs rewritten per statement, keeping the number of
+# query parameters well below the backends' limits
+REWRITE_BATCH_SIZE = 500
+
+def cluster_key(value):
+    """
+        Return what near-duplicate names have in common: their letters
+        and digits with case and accents folded
+    """
+    decomposed = unicodedata.normalize('NFKD', value)
+    folded = ''.join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).casefold()
+    words = ''.join(char if char.isalnum() else ' ' for char in folded)
+    return ' '.join(words.split()) or folded
+
+def duplicate_key(obj):
+    """ Return the key shared by duplicates of a tag or ingredient """
+    if isinstance(obj, Ingredient):
+        return (cluster_key(obj.name), obj.quantity, cluster_key(obj.scale))
+    return (cluster_key(obj.name),)
+
+def find_duplicates(model, user_id):
+    """
+        Return [(kept, [duplicates])] for each cluster of the user's
+        near-duplicate tags or ingredients. The one used by the most
+        recipes is kept, the oldest on a tie.
+    """
+    clusters = defaultdict(list)
+    objs = model.objects.filter(user_id=user_id).order_by(
+        '-recipe_count', 'pk'
+    )
+    for obj in objs:
+        clusters[duplicate_key(obj)].append(obj)
+    return [
+        (cluster[0], cluster[1:])
+        for cluster in clusters.values() if len(cluster) > 1
+    ]
+
+def rewrite_references(through, column, targets):
+    """
+        Point the through rows of each (duplicate pk, kept pk) pair of
+        targets at kept, first dropping the rows that would link a
+        recipe to kept twice
+    """
+    quote = connection.ops.quote_name
+    table = quote(through._meta.db_table)
+    column = quote(column)
+    recipe, pk = quote('recipe_id'), quote(through._meta.pk.column)
+    for start in range(0, len(targets), REWRITE_BATCH_SIZE):
+        batch = targets[start:start + REWRITE_BATCH_SIZE]
+        mapping = 'WITH merge_map (source, target) AS (VALUES {})'.format(
+            ', '.join(['(%s, %s)'] * len(batch))
+        )
+        params = [value for pair in batch for value in pair]
+        with connection.cursor() as cursor:
+            # A duplicate's row goes when its recipe already has the
+            # kept one, or another duplicate of it with a lower id
+            cursor.execute(
+                f'{mapping} DELETE FROM {table} WHERE {pk} IN ('
+                f'SELECT t.{pk} FROM {table} t '
+                f'JOIN merge_map m ON m.source = t.{column} '
+                f'WHERE EXISTS (SELECT 1 FROM {table} s '
+                f'LEFT JOIN merge_map n ON n.source = s.{column} '
+                f'WHERE s.{recipe} = t.{recipe} '
+                f'AND COALESCE(n.target, s.{column}) = m.target '
+                f'AND (n.source IS NULL OR s.{pk} < t.{pk})))',
+                params,
+            )
+            cursor.execute(
+                f'{mapping} UPDATE {table} SET {column} = ('
+                f'SELECT target FROM merge_map WHERE source = {table}.{column}'
+                f') WHERE {column} IN (SELECT source FROM merge_map)',
+                params,
+            )
+
+def merge(model, user_id, groups):
+    """
+        Merge each {kept pk: [duplicate pks]} of the user's groups in
+        one transaction: recipes of the duplicates get the kept tag or
+        ingredient instead and the duplicates are deleted. Returns the
+        IDs of the recipes that changed.
+    """
+    targets = [
+        (duplicate, kept)
+        for kept, duplicates in groups.items() for duplicate in duplicates
+    ]
+    if not targets:
+        return []
+    through = model.recipe_set.through
+    column = f'{model._meta.model_name}_id'
+    duplicates = [duplicate for duplicate, kept in targets]
+
+    with transaction.atomic():
+        recipe_ids = list(
+            through.objects.filter(**{f'{column}__in': duplicates})
+            .order_by().values_list('recipe_id', flat=True).distinct()
+        )
+        rewrite_references(through, column, targets)
+        # Deleted through the ORM so the usual signals expire caches,
+        # rebuild the similarity index and publish the deletions
+        model.objects.filter(user_id=user_id, pk__in=duplicates).delete()
+        refresh_recipe_counts(model, list(groups))
+        touch(model._meta.model_name, groups)
+        touch('recipe', recipe_ids)
+        for pk in groups:
+            events.publish(user_id, model._meta.model_name, 'updated', pk)
+        for recipe_id in recipe_ids:
+            events.publish(user_id, 'recipe', 'updated', recipe_id)
+    return recipe_ids
+
+def merge_duplicates(model, user_id):
+    """
+        Merge every cluster of the user's near-duplicate tags or
+        ingredients, return the clusters as find_duplicates does
+    """
+    with transaction.atomic():
+        clusters = find_duplicates(model, user_id)
+        merge(model, user_id, {
+            kept.pk: [duplicate.pk for duplicate in duplicates]
+            for kept, duplicates in clusters
+        })
+    return clusters
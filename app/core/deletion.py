@@ -0,0 +1,151 @@
+"""
+Batched deletion of users and everything they own
+
+Deleting a user through the ORM collects every recipe, tag, ingredient
+and M2M row in memory, sends a signal per object and removes them all in
+one long transaction. Here the user is deactivated at once and their rows
+are then removed with plain DELETE statements in bounded batches, each
+batch its own short transaction, children before parents. A deletion that
+is interrupted simply resumes with what is left. Soft deleted rows past
+their retention are purged the same way.
+"""
+import logging
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from core.fragments import touch
+from core.models import (
+    Recipe, Tag, Ingredient, IdempotencyKey, SoftDeleteModel, UserDeletion,
+)
+
+logger = logging.getLogger('core.deletion')
+
+# Models owned by a user, deleted in this order with the M2M rows
+# pointing at them: (model, [(through model, column)])
+OWNED = (
+    (Recipe, [
+        (Recipe.tags.through, 'recipe_id'),
+        (Recipe.ingredients.through, 'recipe_id'),
+    ]),
+    (Tag, [(Recipe.tags.through, 'tag_id')]),
+    (Ingredient, [(Recipe.ingredients.through, 'ingredient_id')]),
+    (IdempotencyKey, []),
+)
+
+def schedule_user_deletion(user):
+    """
+        Deactivate the user, revoke their tokens and queue the deletion
+        of their data. Returns the UserDeletion.
+    """
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        Token.objects.filter(user=user).delete()
+        deletion, created = UserDeletion.objects.get_or_create(
+            user_id=user.pk, defaults={'email': user.email}
+        )
+    return deletion
+
+def delete_rows(model, column, ids):
+    """ Delete rows of model whose column is in ids, without signals """
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(column)} IN ({placeholders})',
+            list(ids),
+        )
+        return cursor.rowcount
+
+def delete_files(names):
+    """ Remove uploaded files, ignoring the ones already gone """
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.warning('Could not delete %s', name)
+
+def delete_batch(queryset, children, batch_size):
+    """
+        Delete the first batch_size rows of queryset and the M2M rows
+        pointing at them in one transaction, return how many went
+    """
+    model = queryset.model
+    columns = ['pk', 'image'] if model is Recipe else ['pk']
+    with transaction.atomic():
+        rows = list(queryset.order_by('pk').values_list(*columns)[:batch_size])
+        if not rows:
+            return 0
+        ids = [row[0] for row in rows]
+        for through, column in children:
+            if column != 'recipe_id':
+                touch('recipe', through.objects.filter(
+                    **{f'{column}__in': ids}
+                ).values_list('recipe_id', flat=True))
+            delete_rows(through, column, ids)
+        count = delete_rows(model, 'id', ids)
+        if model is Recipe:
+            images = [row[1] for row in rows if row[1]]
+            # Files go only once the rows are gone for good
+            transaction.on_commit(lambda: delete_files(images))
+    return count
+
+def run_user_deletion(deletion, batch_size=1000, pause=0, progress=None):
+    """
+        Delete everything the user owns in batches of batch_size rows,
+        sleeping pause seconds between batches, then the user itself.
+        progress(deletion) is called after every batch.
+    """
+    for model, children in OWNED:
+        name = str(model._meta.verbose_name_plural)
+        queryset = model._base_manager.filter(user_id=deletion.user_id)
+        while True:
+            with transaction.atomic():
+                count = delete_batch(queryset, children, batch_size)
+                if not count:
+                    break
+                deletion.deleted[name] = deletion.deleted.get(name, 0) + count
+                deletion.save(update_fields=['deleted'])
+            if progress:
+                progress(deletion)
+            if pause:
+                time.sleep(pause)
+
+    with transaction.atomic():
+        get_user_model().objects.filter(pk=deletion.user_id).delete()
+        deletion.finished = timezone.now()
+        deletion.save(update_fields=['finished'])
+    if progress:
+        progress(deletion)
+    return deletion
+
+def purge_deleted(cutoff, batch_size=1000, pause=0, progress=None):
+    """
+        Hard delete rows soft deleted before cutoff in batches, return
+        {model name: count}. progress(name, count) is called after every
+        batch.
+    """
+    purged = {}
+    for model, children in OWNED:
+        if not issubclass(model, SoftDeleteModel):
+            continue
+        name = str(model._meta.verbose_name_plural)
+        purged[name] = 0
+        queryset = model.all_objects.filter(deleted_at__lt=cutoff)
+        while True:
+            count = delete_batch(queryset, children, batch_size)
+            if not count:
+                break
+            purged[name] += count
+            if progress:
+                progress(name, purged[name])
+            if pause:
+                time.sleep(pause)
+    return purged
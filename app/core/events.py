@@ -0,0 +1,320 @@
+"""
+Server-Sent Events stream of changes to a user's recipes
+
+Model signals publish small change events through a backend once the
+write commits. Every ASGI process keeps one Broker fanning the events out
+to its open streams, so an idle stream costs an asyncio queue and a
+suspended coroutine rather than a thread or a database connection.
+
+LocalBackend hands events straight to the broker of the current process,
+which is enough when the API and the streams are served by one process.
+PostgresBackend sends them with NOTIFY and each ASGI process LISTENs on
+a single connection, so writes from any worker reach every stream.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils.module_loading import import_string
+
+from prometheus_client import Gauge
+
+logger = logging.getLogger('core.events')
+
+OPEN_STREAMS = Gauge(
+    'event_streams_open',
+    'Server-Sent Events streams currently open.',
+    multiprocess_mode='livesum',
+)
+
+def publish(user_id, kind, action, pk):
+    """ Publish a change of one object once the transaction commits """
+    event = {'type': kind, 'action': action, 'id': pk}
+
+    def send():
+        try:
+            get_backend().publish(user_id, event)
+        except Exception:
+            logger.exception('Could not publish %s event', kind)
+    transaction.on_commit(send)
+
+class Subscription:
+    """ Bounded queue of events for one open stream """
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = asyncio.Event()
+
+    def put(self, event):
+        """
+            Queue an event from the loop thread. A client too slow to
+            keep up gets its backlog replaced by a reset event, telling
+            it to refetch instead of buffering without bound.
+        """
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'reset'})
+
+    def close(self):
+        """ Wake the stream up so it ends, however full its backlog """
+        self.closed.set()
+
+    async def get(self):
+        """ Return the next event, or None once the stream is closed """
+        if self.closed.is_set():
+            return None
+        getter = asyncio.ensure_future(self.queue.get())
+        closer = asyncio.ensure_future(self.closed.wait())
+        try:
+            await asyncio.wait(
+                [getter, closer], return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            getter.cancel()
+            closer.cancel()
+        if self.closed.is_set():
+            return None
+        return getter.result()
+
+class Broker:
+    """ Fan events out to the streams open in this process """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, settings.EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions[subscription.user_id]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def dispatch(self, user_id, event):
+        """ Deliver an event to the user's streams, from any thread """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    def reset_all(self):
+        """ Tell every stream it may have missed events """
+        with self._lock:
+            user_ids = list(self._subscriptions)
+        for user_id in user_ids:
+            self.dispatch(user_id, {'type': 'reset'})
+
+class LocalBackend:
+    """ Deliver events to the streams of the publishing process only """
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def start(self):
+        pass
+
+    def publish(self, user_id, event):
+        self.broker.dispatch(user_id, event)
+
+class PostgresBackend:
+    """
+        Deliver events across processes with Postgres LISTEN/NOTIFY.
+
+        Publishing runs pg_notify() on the Django connection. Each
+        process listening for streams opens one extra connection and
+        reads notifications from the event loop as its socket becomes
+        readable. When that connection drops, streams get a reset event
+        and it is reopened.
+    """
+    channel = 'recipe_events'
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.listener = None
+        self._starting = None
+
+    async def start(self):
+        if self.listener is not None:
+            return
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._listen())
+        try:
+            await asyncio.shield(self._starting)
+        finally:
+            self._starting = None
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        listener = await loop.run_in_executor(None, self._connect)
+        loop.add_reader(listener.fileno(), self._read, listener)
+        self.listener = listener
+
+    def _connect(self):
+        import psycopg2
+
+        db = settings.DATABASES['default']
+        listener = psycopg2.connect(
+            dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'],
+            host=db['HOST'], port=db.get('PORT') or None,
+        )
+        listener.autocommit = True
+        with listener.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+        return listener
+
+    def _read(self, listener):
+        import psycopg2
+
+        try:
+            listener.poll()
+        except psycopg2.Error:
+            logger.exception('Lost the event listener connection')
+            asyncio.get_running_loop().remove_reader(listener.fileno())
+            listener.close()
+            self.listener = None
+            self.broker.reset_all()
+            asyncio.ensure_future(self._reconnect())
+            return
+        while listener.notifies:
+            notify = listener.notifies.pop(0)
+            message = json.loads(notify.payload)
+            self.broker.dispatch(message['user'], message['event'])
+
+    async def _reconnect(self):
+        delay = 0.5
+        while self.listener is None:
+            try:
+                await self.start()
+            except Exception:
+                logger.exception('Could not reopen the event listener')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def publish(self, user_id, event):
+        payload = json.dumps({'user': user_id, 'event': event})
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+broker = Broker()
+_backend = None
+
+def get_backend():
+    """ Return the process-wide backend named by EVENTS_BACKEND """
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.EVENTS_BACKEND)(broker)
+    return _backend
+
+def format_event(event):
+    """ Encode an event in the text/event-stream format """
+    return (
+        f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    ).encode()
+
+@sync_to_async
+def authenticate(headers):
+    """ Return the id of the active user owning the request's token """
+    from rest_framework.authtoken.models import Token
+
+    scheme, _, key = headers.get(b'authorization', b'').decode().partition(' ')
+    if scheme.lower() != 'token' or not key:
+        return None
+    close_old_connections()
+    try:
+        token = Token.objects.select_related('user').get(key=key.strip())
+    except Token.DoesNotExist:
+        return None
+    finally:
+        close_old_connections()
+    return token.user.pk if token.user.is_active else None
+
+async def send_json(send, status, data):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({
+        'type': 'http.response.body', 'body': json.dumps(data).encode(),
+    })
+
+async def stream(scope, receive, send):
+    """ ASGI application streaming the caller's change events """
+    if scope['method'] != 'GET':
+        return await send_json(
+            send, 405, {'detail': f"Method \"{scope['method']}\" not allowed."}
+        )
+    user_id = await authenticate(dict(scope['headers']))
+    if user_id is None:
+        return await send_json(
+            send, 401,
+            {'detail': 'Authentication credentials were not provided.'},
+        )
+
+    await get_backend().start()
+    subscription = broker.subscribe(user_id)
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        subscription.close()
+    watcher = asyncio.ensure_future(watch_disconnect())
+
+    OPEN_STREAMS.inc()
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': f'retry: {settings.EVENTS_RETRY_MS}\n\n'.encode(),
+            'more_body': True,
+        })
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), settings.EVENTS_KEEPALIVE
+                )
+            except asyncio.TimeoutError:
+                event = {'type': 'ping'}
+            if event is None:
+                break
+            body = b': ping\n\n' if event['type'] == 'ping' else \
+                format_event(event)
+            await send({
+                'type': 'http.response.body', 'body': body, 'more_body': True,
+            })
+    finally:
+        OPEN_STREAMS.dec()
+        watcher.cancel()
+        broker.unsubscribe(subscription)
+
+def router(application):
+    """ Serve EVENTS_PATH with stream and everything else with application """
+    async def route(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == settings.EVENTS_PATH:
+            return await stream(scope, receive, send)
+        return await application(scope, receive, send)
+    return route
@@ -0,0 +1,179 @@
+"""
+Cache of rendered JSON fragments keyed by per-object versions
+
+Each fragment is cached under the version of the object it renders (see
+core.versions), so a write only bumps that object's version and every
+response is assembled from many fragments with one multi-get. When
+several workers miss the same fragment, the one that takes its lock
+rebuilds it and the others wait for the result.
+"""
+import json
+import re
+import time
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from rest_framework.renderers import JSONRenderer
+
+from core.metrics import record_cache
+from core.versions import bump_versions, get_versions, make_key
+
+# Seconds a rebuild lock is held at most, and how long other workers
+# wait for its result before building the fragment themselves
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.5
+POLL_INTERVAL = 0.02
+
+MARK = '\x00fragment:'
+MARKED = re.compile(rb'"\\u0000fragment:(\d+)"')
+
+class RawJSON(Mapping):
+    """
+        Rendered JSON object spliced as is into the response by
+        FragmentJSONRenderer. It reads as the decoded mapping, which is
+        only parsed when accessed from Python.
+    """
+    def __init__(self, content):
+        self.content = content
+
+    @cached_property
+    def parsed(self):
+        return json.loads(self.content)
+
+    def __getitem__(self, key):
+        return self.parsed[key]
+
+    def __iter__(self):
+        return iter(self.parsed)
+
+    def __len__(self):
+        return len(self.parsed)
+
+    def __repr__(self):
+        return f'RawJSON({self.content!r})'
+
+class FragmentJSONRenderer(JSONRenderer):
+    """ JSON renderer copying RawJSON fragments without re-encoding """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        fragments = []
+
+        def mark(value):
+            if isinstance(value, RawJSON):
+                fragments.append(value.content)
+                return f'{MARK}{len(fragments) - 1}'
+            if isinstance(value, dict):
+                return {key: mark(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [mark(item) for item in value]
+            return value
+
+        rendered = super().render(
+            mark(data), accepted_media_type, renderer_context
+        )
+        if not fragments:
+            return rendered
+        return MARKED.sub(
+            lambda match: fragments[int(match.group(1))], rendered
+        )
+
+def render(data):
+    """ Render data the way FragmentJSONRenderer renders responses """
+    return FragmentJSONRenderer().render(data)
+
+def pending_writes():
+    """
+        Return the (scope, ident) pairs written by the open transaction.
+        Their new versions are only published on commit, so until then
+        this connection builds their fragments without the cache.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block or \
+            not hasattr(connection, 'fragment_writes'):
+        connection.fragment_writes = set()
+    return connection.fragment_writes
+
+def touch(scope, idents):
+    """ Expire the fragments of idents of scope once the write commits """
+    idents = set(idents)
+    if not idents:
+        return
+    writes = pending_writes()
+    pairs = {(scope, ident) for ident in idents}
+    writes.update(pairs)
+    bump_versions(scope, idents)
+    transaction.on_commit(lambda: writes.difference_update(pairs))
+
+def get_fragments(prefix, scope, idents, parts, build):
+    """
+        Return {ident: fragment} for idents of scope, each cached under
+        the ident's version plus parts. build(idents) returns
+        {ident: fragment} for the ones that are missing and may leave
+        out idents that no longer exist.
+    """
+    written = {ident for name, ident in pending_writes() if name == scope}
+    cached = [ident for ident in idents if ident not in written]
+    versions = get_versions(scope, cached)
+    keys = {
+        ident: make_key(prefix, versions[ident], scope, ident, *parts)
+        for ident in cached
+    }
+    found = cache.get_many(list(keys.values()))
+    fragments = {
+        ident: found[key] for ident, key in keys.items() if key in found
+    }
+    missing = {
+        ident: key for ident, key in keys.items() if ident not in fragments
+    }
+    record_cache(prefix, True, len(fragments))
+    record_cache(prefix, False, len(missing))
+
+    if missing:
+        fragments.update(rebuild(missing, build))
+    uncached = [ident for ident in idents if ident in written]
+    if uncached:
+        fragments.update(build(uncached))
+    return fragments
+
+def rebuild(keys, build):
+    """
+        Build the fragments of {ident: key}. Only the worker that takes
+        a fragment's lock builds and caches it, the others poll the
+        cache for up to LOCK_WAIT seconds before building it themselves.
+    """
+    locks = {ident: f'lock:{key}' for ident, key in keys.items()}
+    owned = [
+        ident for ident in keys if cache.add(locks[ident], 1, LOCK_TIMEOUT)
+    ]
+    fragments = {}
+    if owned:
+        try:
+            fragments = build(owned)
+            cache.set_many(
+                {
+                    keys[ident]: fragment
+                    for ident, fragment in fragments.items()
+                },
+                settings.FRAGMENT_CACHE_TIMEOUT,
+            )
+        finally:
+            cache.delete_many([locks[ident] for ident in owned])
+
+    waiting = {
+        ident: key for ident, key in keys.items() if ident not in owned
+    }
+    deadline = time.monotonic() + LOCK_WAIT
+    while waiting and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        found = cache.get_many(list(waiting.values()))
+        for ident, key in list(waiting.items()):
+            if key in found:
+                fragments[ident] = found.pop(key)
+                del waiting[ident]
+    if waiting:
+        fragments.update(build(list(waiting)))
+    return fragments
@@ -0,0 +1,17 @@
+"""
+OpenAPI schema generation
+"""
+from django.urls import get_resolver
+
+from drf_spectacular import generators
+
+from core.annotations import apply_annotations
+
+class SchemaGenerator(generators.SchemaGenerator):
+    """ Generator applying the deferred annotations of core.annotations """
+
+    def get_schema(self, request=None, public=False):
+        # Importing the URL tree imports the views and their annotations
+        get_resolver(self.urlconf).url_patterns
+        apply_annotations()
+        return super().get_schema(request, public)
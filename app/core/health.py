@@ -0,0 +1,108 @@
+"""
+Lightweight liveness and readiness probes for databases and caches
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from django.http import JsonResponse
+
+CHECK_TIMEOUT = 2
+
+# One long-lived thread per check, so each database alias keeps a single
+# connection across probes and a hung check only holds up its own
+_executors = {}
+_lock = threading.Lock()
+
+def get_executor(name):
+    """ Return the thread running the check name, started on first use """
+    with _lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f'health-{name}'
+            )
+        return _executors[name]
+
+def check_database(alias):
+    """
+        Run a trivial query on the probe thread's connection for alias,
+        reconnecting once when the kept connection went stale
+    """
+    connection = connections[alias]
+    for retry in (connection.connection is not None, False):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return
+        except DatabaseError:
+            connection.close()
+            if not retry:
+                raise
+
+def close_connections():
+    """ Close the database connections the probe threads keep """
+    with _lock:
+        names = list(_executors)
+    for name in names:
+        kind, alias = name.split(':', 1)
+        if kind == 'database':
+            get_executor(name).submit(
+                lambda alias=alias: connections[alias].close()
+            ).result()
+
+def check_cache(alias):
+    """ Look up a key, which connects to the cache server if there is one """
+    caches[alias].get('health:probe')
+
+def run_checks(databases=None, cache_aliases=None, timeout=CHECK_TIMEOUT):
+    """
+        Probe every database and cache alias concurrently and return a
+        dict mapping 'database:<alias>' and 'cache:<alias>' to None when
+        healthy or the error message. Probes still running after timeout
+        seconds are reported as timed out.
+    """
+    if databases is None:
+        databases = list(settings.DATABASES)
+    if cache_aliases is None:
+        cache_aliases = list(settings.CACHES)
+    checks = [(f'database:{alias}', check_database, alias)
+              for alias in databases]
+    checks += [(f'cache:{alias}', check_cache, alias)
+               for alias in cache_aliases]
+
+    futures = {
+        name: get_executor(name).submit(check, alias)
+        for name, check, alias in checks
+    }
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            results[name] = f'timed out after {timeout}s'
+        elif future.exception() is not None:
+            error = future.exception()
+            results[name] = f'{type(error).__name__}: {error}'.strip()
+        else:
+            results[name] = None
+    return results
+
+def healthz(request):
+    """ Liveness probe, only proves the process serves requests """
+    return JsonResponse({'status': 'ok'})
+
+def readyz(request):
+    """ Readiness probe, 503 until every database and cache answers """
+    results = run_checks()
+    ready = not any(results.values())
+    return JsonResponse(
+        {
+            'status': 'ok' if ready else 'unavailable',
+            'checks': {
+                name: error or 'ok' for name, error in results.items()
+            },
+        },
+        status=200 if ready else 503,
+    )
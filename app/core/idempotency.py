@@ -0,0 +1,124 @@
+"""
+Idempotency-Key support for API writes
+"""
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+def expiry_cutoff():
+    """ Return the creation time before which keys have expired """
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+def lease_cutoff():
+    """ Return the claim time before which unfinished keys are abandoned """
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE)
+
+def request_fingerprint(request):
+    """
+        Hash what identifies a request. Clients pick a new multipart
+        boundary on every retry, so multipart requests hash the form
+        fields and the uploaded file names and sizes instead of the body.
+    """
+    digest = hashlib.sha256(f'{request.method} {request.path}'.encode())
+    if request.content_type.startswith('multipart/'):
+        form = request._request
+        for name, values in sorted(form.POST.lists()):
+            digest.update(f'{name}={values}'.encode())
+        for name, upload in sorted(form.FILES.items()):
+            digest.update(f'{name}={upload.name}:{upload.size}'.encode())
+    else:
+        digest.update(request.body)
+    return digest.hexdigest()
+
+def claim_key(user, key, fingerprint):
+    """
+        Insert an in-progress key, return the existing row if taken.
+        Expired keys and keys whose request never finished within the
+        lease are claimed again.
+    """
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                user=user, key=key, fingerprint=fingerprint
+            )
+            return None
+    except IntegrityError:
+        pass
+    existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+    abandoned = existing is not None and existing.status_code is None and \
+        existing.created < lease_cutoff()
+    if existing is None or abandoned or existing.created < expiry_cutoff():
+        if existing is not None:
+            IdempotencyKey.objects.filter(pk=existing.pk).delete()
+        return claim_key(user, key, fingerprint)
+    return existing
+
+def idempotent(view_method):
+    """
+        Make a viewset write replayable with an Idempotency-Key header.
+
+        The first request claims the key and its response is stored for
+        IDEMPOTENCY_KEY_TTL seconds, retries get the stored response.
+        A retry while the first request is still running gets 409, and
+        reusing a key for a different request gets 422. Server errors
+        release the key so the client can retry, and a key whose request
+        died with its worker is released after IDEMPOTENCY_KEY_LEASE.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > KEY_MAX_LENGTH:
+            return Response(
+                {'detail': f'Idempotency-Key is longer than '
+                           f'{KEY_MAX_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        existing = claim_key(request.user, key, fingerprint)
+        if existing is not None:
+            if existing.fingerprint != fingerprint:
+                return Response(
+                    {'detail': 'Idempotency-Key reused for another request.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if existing.status_code is None:
+                return Response(
+                    {'detail': 'A request with this Idempotency-Key is '
+                               'still in progress.'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return Response(
+                existing.response,
+                status=existing.status_code,
+                headers={'Idempotent-Replayed': 'true'},
+            )
+
+        claimed = IdempotencyKey.objects.filter(user=request.user, key=key)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            claimed.delete()
+            raise
+        if response.status_code >= 500:
+            claimed.delete()
+        else:
+            claimed.update(
+                status_code=response.status_code, response=response.data
+            )
+        return response
+    return wrapper
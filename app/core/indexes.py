@@ -0,0 +1,17 @@
+"""
+Custom index types
+"""
+from django.db import models
+
+class UniqueIndex(models.Index):
+    """
+        Unique index, which unlike a UniqueConstraint can be built over
+        expressions such as Upper('name') and added concurrently
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        statement = super().create_sql(model, schema_editor, using, **kwargs)
+        statement.template = statement.template.replace(
+            'CREATE INDEX', 'CREATE UNIQUE INDEX', 1
+        )
+        return statement
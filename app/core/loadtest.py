@@ -0,0 +1,134 @@
+"""
+Load test driving a running application server over HTTP
+"""
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+def start_server(workers, port, extra_env=None):
+    """
+        Start gunicorn with the project config and the given workers.
+        Its log goes to a temporary file available as process.log.
+    """
+    env = {
+        **os.environ,
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_ACCESSLOG': '',
+        **(extra_env or {}),
+    }
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app.wsgi'],
+        cwd=Path(settings.BASE_DIR),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=log,
+    )
+    process.log = log
+    return process
+
+def wait_until_ready(port, path, timeout=30):
+    """ Poll the server until it answers, return False on timeout """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(
+                '127.0.0.1', port, timeout=1
+            )
+            connection.request('GET', path)
+            connection.getresponse().read()
+            return True
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.2)
+    return False
+
+def stop_server(process):
+    """
+        Shut the server down gracefully, killing it if it hangs, and
+        return its log.
+    """
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    process.log.seek(0)
+    output = process.log.read().decode(errors='replace')
+    process.log.close()
+    return output
+
+def client_loop(port, path, headers, duration):
+    """
+        Send requests over one keep-alive connection for duration seconds
+        and return (ok, errors).
+    """
+    ok = errors = 0
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(
+                '127.0.0.1', port, timeout=10
+            )
+            continue
+        if response.status == 200:
+            ok += 1
+        else:
+            errors += 1
+        if response.will_close:
+            connection.close()
+    connection.close()
+    return ok, errors
+
+def drive(port, path, headers, clients, duration):
+    """ Run concurrent client processes, return throughput and errors """
+    with ProcessPoolExecutor(max_workers=clients) as pool:
+        started = time.monotonic()
+        futures = [
+            pool.submit(client_loop, port, path, headers, duration)
+            for _ in range(clients)
+        ]
+        totals = [future.result() for future in futures]
+        elapsed = time.monotonic() - started
+    ok = sum(result[0] for result in totals)
+    return {
+        'requests': ok,
+        'errors': sum(result[1] for result in totals),
+        'rps': ok / elapsed,
+    }
+
+def scaling_failures(results, min_efficiency, cores):
+    """
+        Return messages for worker counts whose throughput is below
+        min_efficiency of linear scaling from the smallest run. Counts
+        above the available cores cannot scale linearly and are skipped.
+    """
+    base_workers = min(results)
+    base_rps = results[base_workers]['rps'] / base_workers
+    failures = []
+    for workers, result in sorted(results.items()):
+        if workers == base_workers or workers > cores:
+            continue
+        efficiency = result['rps'] / (base_rps * workers)
+        if efficiency < min_efficiency:
+            failures.append(
+                f"{workers} workers: {result['rps']:.1f} req/s is "
+                f"{efficiency:.0%} of linear scaling "
+                f"(minimum {min_efficiency:.0%})"
+            )
+    return failures
@@ -0,0 +1,121 @@
+"""
+Django command to benchmark the API hot paths
+"""
+import json
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core import benchmarks, synthetic
+
+class Command(BaseCommand):
+    """
+        Django command to measure latency, throughput and query counts
+    """
+    help = (
+        'Benchmark the recipe and user API against a throwaway test '
+        'database and gate on regressions from a stored baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', default=['small'],
+            choices=list(benchmarks.SIZES),
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Clients sending requests at once to measure throughput.',
+        )
+        parser.add_argument(
+            '--scenarios', nargs='+',
+            help='Only run these scenarios (e.g. recipe-list token).',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=str(
+                Path(settings.BASE_DIR) / '.benchmarks' / 'baseline.json'
+            ),
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Store the results as the new baseline.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Allowed relative p50 slowdown before failing.',
+        )
+        parser.add_argument('--workers', type=int, default=1)
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command. """
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with override_settings(
+                DEBUG=False,
+                ALLOWED_HOSTS=['testserver'],
+                MEDIA_ROOT=tempfile.mkdtemp(),
+                REST_FRAMEWORK={
+                    **settings.REST_FRAMEWORK,
+                    'DEFAULT_THROTTLE_RATES': {},
+                },
+            ):
+                results = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2))
+            self.stdout.write(self.style.SUCCESS(
+                f"Baseline saved to {baseline_path}"
+            ))
+            return
+        if not baseline_path.exists():
+            self.stdout.write("No baseline found, run with --save-baseline")
+            return
+
+        regressions = benchmarks.compare(
+            results,
+            json.loads(baseline_path.read_text()),
+            options['threshold'],
+        )
+        if regressions:
+            raise CommandError(
+                "Benchmark regressions:\n" + "\n".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    def _run(self, options):
+        """ Generate each dataset size and benchmark its power user """
+        results = {}
+        for size in options['sizes']:
+            prefix = f'bench-{size}-'
+            synthetic.generate(
+                power_users=1,
+                images=1,
+                prefix=prefix,
+                workers=options['workers'],
+                **benchmarks.SIZES[size],
+            )
+            user = get_user_model().objects.get(email=f'{prefix}0@example.com')
+            results[size] = benchmarks.run_scenarios(
+                user, options['iterations'], options['scenarios'],
+                options['concurrency'],
+            )
+            for name, result in results[size].items():
+                self.stdout.write(
+                    f"{size:<8}{name:<18}p50 {result['p50_ms']:>9.2f}ms  "
+                    f"p95 {result['p95_ms']:>9.2f}ms  "
+                    f"{result['rps']:>8.1f} req/s  "
+                    f"{result['queries']:>4} queries"
+                )
+        return results
@@ -0,0 +1,53 @@
+"""
+Django command to merge near-duplicate tags and ingredients
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.dedupe import find_duplicates, merge_duplicates
+from core.models import Tag, Ingredient
+
+class Command(BaseCommand):
+    """
+        Django command merging each user's near-duplicate tags and
+        ingredients, one transaction per user and model
+    """
+    help = 'Merge near-duplicate tags and ingredients of every user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email', action='append', default=[],
+            help='Only dedupe this user, may be repeated.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list the duplicates that would be merged.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command. """
+        users = get_user_model().objects.order_by('pk')
+        if options['email']:
+            users = users.filter(email__in=options['email'])
+            found = set(users.values_list('email', flat=True))
+            for email in options['email']:
+                if email not in found:
+                    raise CommandError(f'No user with email {email}')
+
+        dedupe = find_duplicates if options['dry_run'] else merge_duplicates
+        merged = {Tag: 0, Ingredient: 0}
+        for user in users.only('pk', 'email').iterator():
+            for model in merged:
+                for kept, duplicates in dedupe(model, user.pk):
+                    names = ', '.join(repr(obj.name) for obj in duplicates)
+                    self.stdout.write(
+                        f'  {user.email}: {names} -> {kept.name!r}'
+                    )
+                    merged[model] += len(duplicates)
+
+        verb = 'Would merge' if options['dry_run'] else 'Merged'
+        for model, count in merged.items():
+            self.stdout.write(
+                f'{verb} {count} {model._meta.verbose_name_plural}'
+            )
+        self.stdout.write(self.style.SUCCESS('Duplicates merged'))
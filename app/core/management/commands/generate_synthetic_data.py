@@ -0,0 +1,68 @@
+"""
+Django command to generate synthetic data for scale testing
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import synthetic
+
+class Command(BaseCommand):
+    """
+        Django command to bulk load users, recipes, tags and ingredients
+    """
+    help = 'Generate a reproducible synthetic dataset for perf testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Recipes spread over the regular users.',
+        )
+        parser.add_argument('--power-users', type=int, default=0)
+        parser.add_argument('--power-user-recipes', type=int, default=100000)
+        parser.add_argument('--tags-per-user', type=int, default=20)
+        parser.add_argument('--ingredients-per-user', type=int, default=40)
+        parser.add_argument(
+            '--images', type=int, default=10,
+            help='Number of distinct image files shared by recipes.',
+        )
+        parser.add_argument('--image-ratio', type=float, default=0.1)
+        parser.add_argument('--prefix', default='synthetic')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command. """
+        prefix = options['prefix']
+        if get_user_model().objects.filter(
+            email__startswith=prefix, email__endswith='@example.com'
+        ).exists():
+            raise CommandError(
+                f"Users with prefix '{prefix}' exist, pick another --prefix."
+            )
+
+        started = time.monotonic()
+        user_ids = synthetic.generate(
+            users=options['users'],
+            recipes=options['recipes'],
+            power_users=options['power_users'],
+            power_user_recipes=options['power_user_recipes'],
+            tags_per_user=options['tags_per_user'],
+            ingredients_per_user=options['ingredients_per_user'],
+            images=options['images'],
+            image_ratio=options['image_ratio'],
+            prefix=prefix,
+            seed=options['seed'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            progress=lambda count: self.stdout.write(
+                f"{count} recipes generated", ending='\r'
+            ),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(user_ids)} users in "
+            f"{time.monotonic() - started:.1f}s"
+        ))
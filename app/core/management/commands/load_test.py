@@ -0,0 +1,99 @@
+"""
+Django command to load test the production application server
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core import loadtest, synthetic
+
+PREFIX = 'loadtest-'
+
+class Command(BaseCommand):
+    """
+        Django command to check that throughput scales with gunicorn workers
+    """
+    help = (
+        'Start gunicorn with increasing worker counts against the '
+        'configured database and fail when throughput does not scale.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', nargs='+', type=int, default=[1, 2, 4]
+        )
+        parser.add_argument(
+            '--clients', type=int, default=0,
+            help='Concurrent clients, defaults to twice the most workers.',
+        )
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument(
+            '--min-efficiency', type=float, default=0.7,
+            help='Minimum fraction of linear scaling per added core.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command. """
+        token = self._ensure_user(options['recipes'])
+        path = reverse('recipe:recipe-list')
+        headers = {'Authorization': f'Token {token}'}
+        clients = options['clients'] or 2 * max(options['workers'])
+
+        results = {}
+        for workers in sorted(set(options['workers'])):
+            server = loadtest.start_server(
+                workers, options['port'],
+                {'THROTTLE_READS': '1000000/s'},
+            )
+            ready = loadtest.wait_until_ready(options['port'], path)
+            try:
+                if ready:
+                    loadtest.drive(options['port'], path, headers, clients, 1)
+                    results[workers] = loadtest.drive(
+                        options['port'], path, headers, clients,
+                        options['duration'],
+                    )
+            finally:
+                log = loadtest.stop_server(server)
+            if not ready:
+                raise CommandError(
+                    f"Server with {workers} workers did not start:\n{log}"
+                )
+            self.stdout.write(
+                f"{workers:>3} workers  "
+                f"{results[workers]['rps']:>9.1f} req/s  "
+                f"{results[workers]['errors']:>5} errors"
+            )
+
+        cores = os.cpu_count()
+        if max(results) > cores:
+            self.stdout.write(
+                f"Only {cores} cores available, runs above that are not "
+                "checked for scaling"
+            )
+        failures = loadtest.scaling_failures(
+            results, options['min_efficiency'], cores
+        )
+        if failures:
+            raise CommandError(
+                "Throughput does not scale:\n" + "\n".join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS("Throughput scales"))
+
+    def _ensure_user(self, recipes):
+        """ Create the load test user and data once, return its token """
+        email = f'{PREFIX}0@example.com'
+        user = get_user_model().objects.filter(email=email).first()
+        if user is None:
+            synthetic.generate(
+                users=0, power_users=1, power_user_recipes=recipes,
+                images=0, prefix=PREFIX,
+            )
+            user = get_user_model().objects.get(email=email)
+        return Token.objects.get_or_create(user=user)[0].key
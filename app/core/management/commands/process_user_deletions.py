@@ -0,0 +1,66 @@
+"""
+Django command to delete scheduled users and their data in batches
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.deletion import run_user_deletion, schedule_user_deletion
+from core.models import UserDeletion
+
+class Command(BaseCommand):
+    """
+        Django command running the user deletions queued by the API and
+        the admin, meant to run in the background
+    """
+    help = 'Delete scheduled users and everything they own in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows deleted per transaction.',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Seconds to sleep between batches.',
+        )
+        parser.add_argument(
+            '--email', action='append', default=[],
+            help='Schedule this user for deletion first.',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=0,
+            help='Keep running, looking for new deletions every N seconds.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command. """
+        for email in options['email']:
+            try:
+                user = get_user_model().objects.get(email=email)
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'No user with email {email}')
+            schedule_user_deletion(user)
+
+        while True:
+            for deletion in UserDeletion.objects.filter(
+                finished__isnull=True
+            ).order_by('created'):
+                self.stdout.write(f'Deleting {deletion.email}')
+                run_user_deletion(
+                    deletion, options['batch_size'], options['pause'],
+                    self.report,
+                )
+                self.stdout.write(self.style.SUCCESS(
+                    f'Deleted {deletion.email}'
+                ))
+            if not options['poll']:
+                break
+            time.sleep(options['poll'])
+
+    def report(self, deletion):
+        deleted = ', '.join(
+            f'{count} {name}' for name, count in deletion.deleted.items()
+        )
+        self.stdout.write(f'  {deletion.email}: {deleted or "nothing"}')
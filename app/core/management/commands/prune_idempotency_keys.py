@@ -0,0 +1,31 @@
+"""
+Django command to delete expired idempotency keys
+"""
+from django.core.management.base import BaseCommand
+
+from core.idempotency import expiry_cutoff
+from core.models import IdempotencyKey
+
+class Command(BaseCommand):
+    """
+        Django command to prune idempotency keys past their TTL in batches
+    """
+    help = 'Delete expired idempotency keys, meant to run periodically.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command. """
+        expired = IdempotencyKey.objects.filter(created__lt=expiry_cutoff())
+        deleted = 0
+        while True:
+            pks = list(
+                expired.values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {deleted} idempotency keys"
+        ))
@@ -0,0 +1,44 @@
+"""
+Django command to hard delete expired soft deleted rows
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.deletion import purge_deleted
+
+class Command(BaseCommand):
+    """
+        Django command to purge recipes, tags and ingredients soft
+        deleted longer ago than the retention period, in batches
+    """
+    help = 'Purge soft deleted rows past retention, meant to run periodically.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.SOFT_DELETE_RETENTION_DAYS,
+            help='Purge rows deleted more than this many days ago.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows deleted per transaction.',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Seconds to sleep between batches.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command. """
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        purged = purge_deleted(
+            cutoff, options['batch_size'], options['pause'], self.report
+        )
+        for name, count in purged.items():
+            self.stdout.write(f'Purged {count} {name}')
+        self.stdout.write(self.style.SUCCESS('Soft deleted rows purged'))
+
+    def report(self, name, count):
+        self.stdout.write(f'  {count} {name} so far')
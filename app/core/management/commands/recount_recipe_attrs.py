@@ -0,0 +1,40 @@
+"""
+Django command to recompute recipe counts of tags and ingredients
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Tag, Ingredient, refresh_recipe_counts
+
+class Command(BaseCommand):
+    """
+        Django command to repair denormalized recipe counts
+    """
+    help = 'Recompute recipe_count for tags and ingredients in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of rows updated per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command. """
+        batch_size = options['batch_size']
+        for model in (Tag, Ingredient):
+            updated = 0
+            last_pk = 0
+            while True:
+                pks = list(
+                    model.objects.filter(pk__gt=last_pk)
+                    .order_by('pk').values_list('pk', flat=True)[:batch_size]
+                )
+                if not pks:
+                    break
+                with transaction.atomic():
+                    updated += refresh_recipe_counts(model, pks)
+                last_pk = pks[-1]
+            self.stdout.write(
+                f"Recounted {updated} {model._meta.verbose_name_plural}"
+            )
+        self.stdout.write(self.style.SUCCESS("Recipe counts repaired"))
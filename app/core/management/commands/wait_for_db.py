@@ -1,26 +1,59 @@
 """
-Django command to wait for the database to be available
+Django command to wait for the databases and caches to be available
 """
 import time
 
-from psycopg2 import OperationalError as Pyscopg2Error
+from django.core.management.base import BaseCommand, CommandError
 
-from django.core.management.base import BaseCommand
-from django.db.utils import OperationalError
+from core import health
 
 class Command(BaseCommand):
-    """ 
-        Django command to wait for database 
     """
-    def handle(self, *args, **kwargs):
+        Django command to wait for every database and cache alias
+    """
+    help = (
+        'Probe all database and cache aliases in parallel, retrying with '
+        'exponential backoff until they answer or the timeout expires.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Give up after this many seconds, 0 waits forever.',
+        )
+        parser.add_argument('--initial-delay', type=float, default=0.1)
+        parser.add_argument('--max-delay', type=float, default=5)
+        parser.add_argument(
+            '--database', dest='databases', action='append',
+            help='Only probe this database alias (repeatable).',
+        )
+        parser.add_argument(
+            '--cache', dest='caches', action='append',
+            help='Only probe this cache alias (repeatable).',
+        )
+
+    def handle(self, *args, **options):
         """ Entrypoint for command. """
         self.stdout.write("Waiting for databases...")
-        db_up = False
-        while db_up is False:
-            try:
-                self.check(databases=['default'])
-                db_up = True
-            except (Pyscopg2Error, OperationalError):
-                self.stdout.write("Database unavailable, wait for a second...")
-                time.sleep(1)
+        started = time.monotonic()
+        delay = options['initial_delay']
+        while True:
+            results = health.run_checks(
+                options['databases'], options['caches']
+            )
+            failing = {name: error for name, error in results.items() if error}
+            if not failing:
+                break
+            remaining = options['timeout'] - (time.monotonic() - started)
+            if options['timeout'] and remaining <= 0:
+                raise CommandError(
+                    "Gave up waiting for: " + ", ".join(
+                        f"{name} ({error})" for name, error in failing.items()
+                    )
+                )
+            self.stdout.write(
+                f"Unavailable: {', '.join(failing)}, retrying in {delay:.1f}s"
+            )
+            time.sleep(min(delay, remaining) if options['timeout'] else delay)
+            delay = min(delay * 2, options['max_delay'])
         self.stdout.write(self.style.SUCCESS("Database Available"))
@@ -0,0 +1,30 @@
+"""
+Django command to pre-warm the OpenAPI schema cache
+"""
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+class Command(BaseCommand):
+    """
+        Django command to render the schema for the current code version
+    """
+    help = 'Generate the OpenAPI schema files served by /api/schema/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lang', nargs='*', default=[],
+            help='Extra languages to render besides the default.',
+        )
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command. """
+        for lang in [None] + options['lang']:
+            for format in schema.RENDERERS:
+                content, etag = schema.store_schema(
+                    format, lang, schema.build_schema(format, lang)
+                )
+                self.stdout.write(
+                    f"Wrote {schema.cache_path(format, lang)} ({etag})"
+                )
+        self.stdout.write(self.style.SUCCESS("Schema cache warmed"))
@@ -0,0 +1,141 @@
+"""
+Prometheus metrics for API, DB and cache health
+
+Metrics live in the default prometheus_client registry. When the
+PROMETHEUS_MULTIPROC_DIR environment variable points at a writable
+directory, every worker process writes its samples to mmap-backed files
+there and the scrape endpoint aggregates them across processes.
+"""
+import hmac
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by route.',
+    ['route', 'method'],
+    buckets=(
+        .005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10,
+    ),
+)
+REQUESTS = Counter(
+    'http_requests_total',
+    'Requests by route and status.',
+    ['route', 'method', 'status'],
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Requests currently being served.',
+    multiprocess_mode='livesum',
+)
+DB_QUERIES = Counter(
+    'db_queries_total',
+    'Database queries by connection alias and route.',
+    ['alias', 'route'],
+)
+DB_QUERY_TIME = Counter(
+    'db_query_seconds_total',
+    'Time spent in database queries by connection alias.',
+    ['alias'],
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Cache lookups by cache name and result (hit or miss).',
+    ['cache', 'result'],
+)
+IMAGE_UPLOADS_IN_PROGRESS = Gauge(
+    'image_uploads_in_progress',
+    'Recipe image uploads currently being processed.',
+    multiprocess_mode='livesum',
+)
+
+def record_cache(cache, hit, count=1):
+    """ Count cache lookups, hit ratio is hit / (hit + miss) """
+    if count:
+        CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc(count)
+
+class QueryCounter:
+    """ Database execute wrapper counting queries for one request """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+class MetricsMiddleware:
+    """ Record latency, status, in-flight and query metrics per route """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counters = [QueryCounter(alias) for alias in connections]
+        started = time.perf_counter()
+        IN_FLIGHT.inc()
+        try:
+            with ExitStack() as stack:
+                for counter in counters:
+                    stack.enter_context(
+                        connections[counter.alias].execute_wrapper(counter)
+                    )
+                response = self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        REQUEST_LATENCY.labels(route, request.method).observe(
+            time.perf_counter() - started
+        )
+        REQUESTS.labels(route, request.method, response.status_code).inc()
+        for counter in counters:
+            if counter.count:
+                DB_QUERIES.labels(counter.alias, route).inc(counter.count)
+                DB_QUERY_TIME.labels(counter.alias).inc(counter.seconds)
+        return response
+
+def metrics_view(request):
+    """
+        Expose metrics in the Prometheus text format to scrapers sending
+        METRICS_TOKEN as a bearer token
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            raise Http404
+    elif not hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', '').encode(),
+        f'Bearer {settings.METRICS_TOKEN}'.encode(),
+    ):
+        return HttpResponseForbidden()
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+import core.operations
+
+LIVE = models.Q(('deleted_at__isnull', True))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['deleted_at'], name='recipe_deleted_idx', condition=~LIVE),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['deleted_at'], name='tag_deleted_idx', condition=~LIVE),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['deleted_at'], name='ingredient_deleted_idx', condition=~LIVE),
+        ),
+    ]
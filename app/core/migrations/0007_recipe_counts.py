@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-19 08:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+import core.operations
+
+LIVE = models.Q(('deleted_at__isnull', True))
+
+
+def backfill_recipe_counts(apps, schema_editor):
+    # A frozen copy of core.models.refresh_recipe_counts as of this
+    # migration, the current one relies on fields added later
+    for model_name in ('Tag', 'Ingredient'):
+        model = apps.get_model('core', model_name)
+        through = model.recipe_set.through
+        column = f'{model._meta.model_name}_id'
+        counts = through.objects.filter(
+            **{column: OuterRef('pk')}
+        ).order_by().values(column).annotate(
+            total=Count('pk')
+        ).values('total')
+        model.objects.update(recipe_count=Coalesce(
+            Subquery(counts, output_field=models.PositiveIntegerField()), 0
+        ))
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            backfill_recipe_counts, migrations.RunPython.noop, atomic=True,
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-name'], name='ingredient_assigned_live_idx', condition=models.Q(('recipe_count__gt', 0)) & LIVE),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['user', '-name'], name='tag_user_assigned_live_idx', condition=models.Q(('recipe_count__gt', 0)) & LIVE),
+        ),
+    ]
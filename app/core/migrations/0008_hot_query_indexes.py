@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:20
+
+from django.db import migrations, models
+
+import core.operations
+
+LIVE = models.Q(('deleted_at__isnull', True))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_recipe_counts'),
+    ]
+
+    operations = [
+        core.operations.AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_live_idx', condition=LIVE),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['user', '-name'], name='tag_user_name_live_idx', condition=LIVE),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-name'], name='ingredient_user_name_live_idx', condition=LIVE),
+        ),
+        core.operations.AddThroughIndexConcurrently(
+            model_name='recipe',
+            field_name='tags',
+            index=models.Index(fields=['tag', 'recipe'], name='recipe_tags_tag_recipe_idx'),
+        ),
+        core.operations.AddThroughIndexConcurrently(
+            model_name='recipe',
+            field_name='ingredients',
+            index=models.Index(fields=['ingredient', 'recipe'], name='recipe_ingr_ingr_recipe_idx'),
+        ),
+    ]
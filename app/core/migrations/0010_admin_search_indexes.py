@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+import core.operations
+
+LIVE = models.Q(('deleted_at__isnull', True))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_idempotencykey'),
+    ]
+
+    operations = [
+        core.operations.AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['title'], name='recipe_title_prefix_live_idx', opclasses=['varchar_pattern_ops'], condition=LIVE),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['name'], name='tag_name_prefix_live_idx', opclasses=['varchar_pattern_ops'], condition=LIVE),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_prefix_live_idx', opclasses=['varchar_pattern_ops'], condition=LIVE),
+        ),
+    ]
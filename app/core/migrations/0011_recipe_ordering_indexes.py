@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:20
+
+from django.db import migrations, models
+
+import core.operations
+
+LIVE = models.Q(('deleted_at__isnull', True))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_admin_search_indexes'),
+    ]
+
+    operations = [
+        core.operations.AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'price', 'id'], name='recipe_user_price_live_idx', condition=LIVE),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'time_minutes', 'id'], name='recipe_user_time_live_idx', condition=LIVE),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'title', 'id'], name='recipe_user_title_live_idx', condition=LIVE),
+        ),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.expressions
+import django.db.models.functions.text
+
+import core.indexes
+import core.operations
+
+LIVE = models.Q(('deleted_at__isnull', True))
+
+# Fields normalized on write, per model
+NORMALIZED = {
+    'Tag': ['name'],
+    'Ingredient': ['name', 'scale'],
+}
+BATCH_SIZE = 500
+
+
+def normalize(value):
+    return ' '.join(value.split())
+
+
+def rewrite_references(connection, through, column, targets):
+    # A frozen copy of core.dedupe.rewrite_references as of this migration
+    quote = connection.ops.quote_name
+    table = quote(through._meta.db_table)
+    column = quote(column)
+    recipe, pk = quote('recipe_id'), quote(through._meta.pk.column)
+    mapping = 'WITH merge_map (source, target) AS (VALUES {})'.format(
+        ', '.join(['(%s, %s)'] * len(targets))
+    )
+    params = [value for pair in targets for value in pair]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{mapping} DELETE FROM {table} WHERE {pk} IN ('
+            f'SELECT t.{pk} FROM {table} t '
+            f'JOIN merge_map m ON m.source = t.{column} '
+            f'WHERE EXISTS (SELECT 1 FROM {table} s '
+            f'LEFT JOIN merge_map n ON n.source = s.{column} '
+            f'WHERE s.{recipe} = t.{recipe} '
+            f'AND COALESCE(n.target, s.{column}) = m.target '
+            f'AND (n.source IS NULL OR s.{pk} < t.{pk})))',
+            params,
+        )
+        cursor.execute(
+            f'{mapping} UPDATE {table} SET {column} = ('
+            f'SELECT target FROM merge_map WHERE source = {table}.{column}'
+            f') WHERE {column} IN (SELECT source FROM merge_map)',
+            params,
+        )
+
+
+def merge_case_duplicates(apps, schema_editor):
+    # Normalize names and merge the live rows the unique indexes would
+    # reject into the most used one, so the indexes can be built
+    for model_name, fields in NORMALIZED.items():
+        model = apps.get_model('core', model_name)
+        through = model.recipe_set.through
+        column = f'{model._meta.model_name}_id'
+        kept, renamed, targets = {}, [], []
+
+        def flush():
+            model.objects.bulk_update(renamed, fields)
+            if targets:
+                rewrite_references(
+                    schema_editor.connection, through, column, targets
+                )
+                model.objects.filter(
+                    pk__in=[source for source, target in targets]
+                ).delete()
+            survivors = {target for source, target in targets}
+            counts = through.objects.filter(
+                recipe__deleted_at__isnull=True, **{column: OuterRef('pk')}
+            ).order_by().values(column).annotate(
+                total=Count('pk')
+            ).values('total')
+            model.objects.filter(pk__in=survivors).update(
+                recipe_count=Coalesce(Subquery(
+                    counts, output_field=models.PositiveIntegerField()
+                ), 0)
+            )
+            renamed.clear()
+            targets.clear()
+
+        rows = model.objects.filter(LIVE).order_by(
+            'user_id', '-recipe_count', 'pk'
+        )
+        user_id = None
+        for obj in rows.iterator():
+            if obj.user_id != user_id:
+                user_id = obj.user_id
+                kept.clear()
+            values = [normalize(getattr(obj, field)) for field in fields]
+            key = (getattr(obj, 'quantity', None),) + tuple(
+                value.upper() for value in values
+            )
+            if key in kept:
+                targets.append((obj.pk, kept[key]))
+            else:
+                kept[key] = obj.pk
+                if values != [getattr(obj, field) for field in fields]:
+                    for field, value in zip(fields, values):
+                        setattr(obj, field, value)
+                    renamed.append(obj)
+            if len(targets) >= BATCH_SIZE or len(renamed) >= BATCH_SIZE:
+                flush()
+        flush()
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_userdeletion'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_case_duplicates, migrations.RunPython.noop, atomic=True,
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='ingredient',
+            index=core.indexes.UniqueIndex(django.db.models.expressions.F('user'), django.db.models.functions.text.Upper('name'), django.db.models.expressions.F('quantity'), django.db.models.functions.text.Upper('scale'), condition=LIVE, name='ingredient_user_name_unique'),
+        ),
+        core.operations.AddIndexConcurrently(
+            model_name='tag',
+            index=core.indexes.UniqueIndex(django.db.models.expressions.F('user'), django.db.models.functions.text.Upper('name'), condition=LIVE, name='tag_user_name_unique'),
+        ),
+    ]
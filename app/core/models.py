@@ -5,13 +5,19 @@ import uuid
 import os
 
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Upper
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
 
+from core.indexes import UniqueIndex
+
 def recipe_image_file_path(instance, filename):
     """ generate filepath for image """
     ext = os.path.splitext(filename)[1]
@@ -49,7 +55,44 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
-class Recipe(models.Model):
+LIVE = Q(deleted_at__isnull=True)
+
+def normalize_name(name):
+    """ Trim a tag or ingredient name and collapse inner whitespace """
+    return ' '.join(name.split())
+
+class LiveManager(models.Manager):
+    """ Manager hiding soft deleted rows """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(LIVE)
+
+class SoftDeleteModel(models.Model):
+    """
+        Model whose deletes only set deleted_at. objects and related
+        managers skip the tombstones, which purge_deleted removes for
+        good after SOFT_DELETE_RETENTION_DAYS. Indexes serving live
+        queries are partial on LIVE so tombstones do not bloat them.
+    """
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
+
+    def soft_delete(self):
+        """ Hide the row until it is restored or purged """
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
+
+    def restore(self):
+        """ Bring a soft deleted row back """
+        self.deleted_at = None
+        self.save(update_fields=['deleted_at'])
+
+class Recipe(SoftDeleteModel):
     """ Recipe Object """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
@@ -61,23 +104,172 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-id'], name='recipe_user_id_live_idx',
+                condition=LIVE,
+            ),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='recipe_user_price_live_idx', condition=LIVE,
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='recipe_user_time_live_idx', condition=LIVE,
+            ),
+            models.Index(
+                fields=['user', 'title', 'id'],
+                name='recipe_user_title_live_idx', condition=LIVE,
+            ),
+            models.Index(
+                fields=['title'],
+                name='recipe_title_prefix_live_idx',
+                opclasses=['varchar_pattern_ops'],
+                condition=LIVE,
+            ),
+            models.Index(
+                fields=['deleted_at'], name='recipe_deleted_idx',
+                condition=~LIVE,
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
-class Tag(models.Model):
+class Tag(SoftDeleteModel):
     """ Tags Objects """
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name'], name='tag_user_name_live_idx',
+                condition=LIVE,
+            ),
+            models.Index(
+                fields=['name'],
+                name='tag_name_prefix_live_idx',
+                opclasses=['varchar_pattern_ops'],
+                condition=LIVE,
+            ),
+            models.Index(
+                fields=['user', '-name'],
+                name='tag_user_assigned_live_idx',
+                condition=Q(recipe_count__gt=0) & LIVE,
+            ),
+            models.Index(
+                fields=['deleted_at'], name='tag_deleted_idx',
+                condition=~LIVE,
+            ),
+            UniqueIndex(
+                F('user'), Upper('name'), name='tag_user_name_unique',
+                condition=LIVE,
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
-class Ingredient(models.Model):
+    def save(self, *args, **kwargs):
+        self.name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
+class Ingredient(SoftDeleteModel):
     """ Ingredient Objects """
     name = models.CharField(max_length=255)
     quantity = models.IntegerField()
     scale = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name'],
+                name='ingredient_user_name_live_idx', condition=LIVE,
+            ),
+            models.Index(
+                fields=['name'],
+                name='ingredient_prefix_live_idx',
+                opclasses=['varchar_pattern_ops'],
+                condition=LIVE,
+            ),
+            models.Index(
+                fields=['user', '-name'],
+                name='ingredient_assigned_live_idx',
+                condition=Q(recipe_count__gt=0) & LIVE,
+            ),
+            models.Index(
+                fields=['deleted_at'], name='ingredient_deleted_idx',
+                condition=~LIVE,
+            ),
+            UniqueIndex(
+                F('user'), Upper('name'), F('quantity'), Upper('scale'),
+                name='ingredient_user_name_unique', condition=LIVE,
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.name = normalize_name(self.name)
+        self.scale = normalize_name(self.scale)
+        super().save(*args, **kwargs)
+
+class IdempotencyKey(models.Model):
+    """ Stored response of a write made with an Idempotency-Key header """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'], name='idempotency_user_key_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return self.key
+
+class UserDeletion(models.Model):
+    """
+        Deletion of a user and everything they own, run in batches by
+        the process_user_deletions command. Rows outlive the user as a
+        record of the progress.
+    """
+    user_id = models.BigIntegerField(unique=True)
+    email = models.EmailField(max_length=255)
+    deleted = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, db_index=True)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.email
+
+def refresh_recipe_counts(model, pks=None):
+    """
+        Recompute recipe_count for tags or ingredients from the M2M
+        table, counting live recipes only
+    """
+    through = model.recipe_set.through
+    column = f'{model._meta.model_name}_id'
+    counts = through.objects.filter(
+        recipe__deleted_at__isnull=True, **{column: OuterRef('pk')}
+    ).order_by().values(column).annotate(total=Count('pk')).values('total')
+    queryset = model.all_objects.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+
+    return queryset.update(recipe_count=Coalesce(
+        Subquery(counts, output_field=models.PositiveIntegerField()), 0
+    ))
@@ -0,0 +1,126 @@
+"""
+Custom migration operations
+"""
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently as PostgresAddIndexConcurrently,
+    RemoveIndexConcurrently as PostgresRemoveIndexConcurrently,
+)
+from django.db import NotSupportedError
+from django.db.migrations.operations import AddIndex, RemoveIndex
+from django.db.migrations.operations.base import Operation
+
+class AddIndexConcurrently(PostgresAddIndexConcurrently):
+    """
+        Build an index without blocking writes on Postgres,
+        falling back to a plain CREATE INDEX on other backends
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        return AddIndex.database_forwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        return AddIndex.database_backwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+class RemoveIndexConcurrently(PostgresRemoveIndexConcurrently):
+    """
+        Drop an index without blocking reads and writes on Postgres,
+        falling back to a plain DROP INDEX on other backends
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        return RemoveIndex.database_forwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        return RemoveIndex.database_backwards(
+            self, app_label, schema_editor, from_state, to_state
+        )
+
+class AddThroughIndexConcurrently(Operation):
+    """
+        Concurrently add an index to the auto-created through table
+        of a ManyToManyField. The migration state does not track
+        these indexes, so only the database is touched.
+    """
+    atomic = False
+    reduces_to_sql = False
+
+    def __init__(self, model_name, field_name, index):
+        self.model_name = model_name
+        self.field_name = field_name
+        self.index = index
+
+    def deconstruct(self):
+        return (
+            self.__class__.__name__,
+            [],
+            {
+                'model_name': self.model_name,
+                'field_name': self.field_name,
+                'index': self.index,
+            },
+        )
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _through(self, app_label, state):
+        model = state.apps.get_model(app_label, self.model_name)
+        return model._meta.get_field(self.field_name).remote_field.through
+
+    def _concurrently(self, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return {}
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                f'{self.__class__.__name__} cannot be executed inside a '
+                'transaction (set atomic = False on the migration).'
+            )
+        return {'concurrently': True}
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        through = self._through(app_label, to_state)
+        if self.allow_migrate_model(schema_editor.connection.alias, through):
+            schema_editor.add_index(
+                through, self.index, **self._concurrently(schema_editor)
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        through = self._through(app_label, from_state)
+        if self.allow_migrate_model(schema_editor.connection.alias, through):
+            schema_editor.remove_index(
+                through, self.index, **self._concurrently(schema_editor)
+            )
+
+    def describe(self):
+        return (
+            f'Concurrently create index {self.index.name} on the through '
+            f'table of {self.model_name}.{self.field_name}'
+        )
@@ -0,0 +1,143 @@
+"""
+Per-request SQL and timing instrumentation
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger('core.profiling')
+
+_current_profile = contextvars.ContextVar('request_profile', default=None)
+
+class RequestProfile:
+    """ Timings collected while serving a single request """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_ms = 0.0
+        self.serialize_ms = 0.0
+        self.render_ms = 0.0
+        self.render_started = None
+        self.serializing = False
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """ Database execute wrapper timing every query """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - started) * 1000
+            self.signatures[sql] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.signatures.values())
+
+    @property
+    def duplicates(self):
+        return {sql: n for sql, n in self.signatures.most_common() if n > 1}
+
+    def server_timing(self, total_ms):
+        """ Return the Server-Timing header value """
+        return ', '.join([
+            f'db;dur={self.sql_ms:.2f};desc="{self.query_count} queries"',
+            f'dup;desc="{len(self.duplicates)} duplicated"',
+            f'serialize;dur={self.serialize_ms:.2f}',
+            f'render;dur={self.render_ms:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ])
+
+def _timed_data(data):
+    """ Wrap BaseSerializer.data to account serializer time """
+    def timed(serializer):
+        profile = _current_profile.get()
+        if profile is None or profile.serializing:
+            return data.fget(serializer)
+        profile.serializing = True
+        started = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            profile.serialize_ms += (time.perf_counter() - started) * 1000
+            profile.serializing = False
+    timed.profiled = True
+    return property(timed)
+
+class RequestProfilingMiddleware:
+    """
+        Opt-in middleware recording query count, SQL time, duplicate
+        query signatures, serializer and render time for a sample of
+        requests. Disabled entirely when the sample rate is 0.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(
+            settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0
+        )
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        if not getattr(BaseSerializer.data.fget, 'profiled', False):
+            BaseSerializer.data = _timed_data(BaseSerializer.data)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        request._profile = profile
+        token = _current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+
+        total_ms = (time.perf_counter() - profile.started) * 1000
+        response['Server-Timing'] = profile.server_timing(total_ms)
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'event': 'request_profile',
+            'method': request.method,
+            'path': request.path,
+            'route': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'queries': profile.query_count,
+            'sql_ms': round(profile.sql_ms, 2),
+            'serialize_ms': round(profile.serialize_ms, 2),
+            'render_ms': round(profile.render_ms, 2),
+            'duplicates': [
+                {'sql': sql, 'count': count}
+                for sql, count in list(profile.duplicates.items())[:5]
+            ],
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        """ Start the render timer, DRF responses render after this hook """
+        profile = getattr(request, '_profile', None)
+        if profile is not None:
+            profile.render_started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: self._rendered(profile)
+            )
+        return response
+
+    def _rendered(self, profile):
+        profile.render_ms += (
+            time.perf_counter() - profile.render_started
+        ) * 1000
@@ -0,0 +1,106 @@
+"""
+Precomputed OpenAPI schema served from memory or a file cache
+"""
+import functools
+import hashlib
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import translation
+from django.utils.cache import patch_cache_control
+
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+from core.metrics import record_cache
+
+RENDERERS = {'yaml': OpenApiYamlRenderer, 'json': OpenApiJsonRenderer}
+
+_memory = {}
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """
+        Return APP_VERSION, or a fingerprint of the project sources so
+        the schema is rebuilt whenever the code changes.
+    """
+    if settings.APP_VERSION:
+        return settings.APP_VERSION
+    digest = hashlib.sha256()
+    for path in sorted(Path(settings.BASE_DIR).rglob('*.py')):
+        stat = path.stat()
+        digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode())
+    return digest.hexdigest()[:16]
+
+def cache_path(format, lang):
+    """ Return the file caching the schema for this code version """
+    suffix = f'-{lang}' if lang else ''
+    return Path(settings.SCHEMA_CACHE_DIR) / (
+        f'schema-{code_version()}{suffix}.{format}'
+    )
+
+def build_schema(format, lang=None):
+    """ Generate and render the schema, bypassing every cache """
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(
+        urlconf=spectacular_settings.SERVE_URLCONF
+    )
+    with translation.override(lang or settings.LANGUAGE_CODE):
+        schema = generator.get_schema(
+            request=None, public=spectacular_settings.SERVE_PUBLIC
+        )
+    return RENDERERS[format]().render(schema)
+
+def store_schema(format, lang, content):
+    """ Keep rendered schema in memory and, when writable, on disk """
+    etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+    _memory[(code_version(), format, lang)] = (content, etag)
+    path = cache_path(format, lang)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+    return content, etag
+
+def get_schema(format, lang=None):
+    """ Return (content, etag), building the schema at most once """
+    key = (code_version(), format, lang)
+    if key in _memory:
+        record_cache('schema', True)
+        return _memory[key]
+    record_cache('schema', False)
+    try:
+        content = cache_path(format, lang).read_bytes()
+    except OSError:
+        content = build_schema(format, lang)
+    return store_schema(format, lang, content)
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """ Serve the OpenAPI schema from cache with an ETag """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        format = 'json' if request.accepted_renderer.format == 'json' \
+            else 'yaml'
+        lang = request.GET.get('lang') if settings.USE_I18N else None
+        # Only known languages, the code names cache entries and files
+        if lang not in dict(settings.LANGUAGES):
+            lang = None
+        content, etag = get_schema(format, lang)
+
+        # CompressionMiddleware weakens the ETag of compressed responses
+        if request.META.get('HTTP_IF_NONE_MATCH') in (etag, f'W/{etag}'):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                content, content_type=request.accepted_media_type
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,206 @@
+"""
+Signal handlers keeping denormalized recipe data in sync
+"""
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, pre_delete, post_delete, post_save,
+)
+from django.dispatch import receiver
+
+from core.fragments import touch
+from core.models import Recipe, Tag, Ingredient, refresh_recipe_counts
+from core.versions import bump_version
+
+RECIPE_ATTRS = {
+    Recipe.tags.through: Tag,
+    Recipe.ingredients.through: Ingredient,
+}
+SIMILARITY_KINDS = {
+    Recipe.tags.through: 'tags',
+    Recipe.ingredients.through: 'ingredients',
+}
+
+def recount(model, pks):
+    """ Recount recipes of tags or ingredients and expire their fragments """
+    refresh_recipe_counts(model, pks)
+    touch(model._meta.model_name, pks)
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Keep recipe_count of tags and ingredients in step with the M2M """
+    model = RECIPE_ATTRS[sender]
+    if action == 'post_add' and pk_set:
+        if reverse:
+            model.objects.filter(pk=instance.pk).update(
+                recipe_count=F('recipe_count') + len(pk_set)
+            )
+            touch(model._meta.model_name, [instance.pk])
+        else:
+            model.objects.filter(pk__in=pk_set).update(
+                recipe_count=F('recipe_count') + 1
+            )
+            touch(model._meta.model_name, pk_set)
+    elif action == 'post_remove' and pk_set:
+        recount(model, [instance.pk] if reverse else pk_set)
+    elif action == 'pre_clear' and not reverse:
+        column = f'{model._meta.model_name}_id'
+        instance._cleared_attr_ids = list(
+            sender.objects.filter(recipe_id=instance.pk)
+            .values_list(column, flat=True)
+        )
+    elif action == 'post_clear':
+        if reverse:
+            recount(model, [instance.pk])
+        else:
+            recount(model, instance.__dict__.pop('_cleared_attr_ids', []))
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_similarity_index(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    """ Patch the recipe similarity index after M2M changes """
+    from core import similarity
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        similarity.record_change(instance.user_id)
+        return
+    similarity.record_change(
+        instance.user_id, instance.pk, action[len('post_'):],
+        SIMILARITY_KINDS[sender], pk_set,
+    )
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_similarity_index(sender, instance, **kwargs):
+    """ Cascaded M2M deletes send no m2m_changed, rebuild instead """
+    from core import similarity
+
+    similarity.record_change(instance.user_id)
+
+@receiver(pre_delete, sender=Recipe)
+def collect_recipe_attrs(sender, instance, **kwargs):
+    """ Remember which tags and ingredients lose a recipe on delete """
+    instance._deleted_attr_ids = {
+        Tag: list(instance.tags.values_list('pk', flat=True)),
+        Ingredient: list(instance.ingredients.values_list('pk', flat=True)),
+    }
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_attrs(sender, instance, **kwargs):
+    """ Recount tags and ingredients detached by a recipe delete """
+    for model, pks in instance.__dict__.pop('_deleted_attr_ids', {}).items():
+        if pks:
+            recount(model, pks)
+
+@receiver(post_delete, sender=Recipe)
+def drop_similar_recipe(sender, instance, **kwargs):
+    """ Remove a deleted recipe from the similarity index """
+    from core import similarity
+
+    similarity.record_change(instance.user_id, instance.pk, 'delete')
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_user_caches(sender, instance, **kwargs):
+    """ Expire cached aggregates over the collection of the writer """
+    bump_version('user', instance.user_id)
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_user_caches_m2m(sender, instance, action, **kwargs):
+    """ Expire cached aggregates when recipe tags or ingredients change """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version('user', instance.user_id)
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def publish_change(sender, instance, created=False, **kwargs):
+    """ Push a change event to the writer's open event streams """
+    from core import events
+
+    if kwargs['signal'] is post_delete or instance.deleted_at:
+        action = 'deleted'
+    elif 'deleted_at' in (kwargs.get('update_fields') or ()):
+        action = 'restored'
+    else:
+        action = 'created' if created else 'updated'
+    events.publish(
+        instance.user_id, sender._meta.model_name, action, instance.pk
+    )
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def publish_change_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Report recipes whose tags or ingredients changed as updated """
+    from core import events
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    recipe_ids = (pk_set or ()) if reverse else [instance.pk]
+    for recipe_id in recipe_ids:
+        events.publish(instance.user_id, 'recipe', 'updated', recipe_id)
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def expire_fragments(sender, instance, **kwargs):
+    """ Expire the cached fragments of a saved or deleted object """
+    touch(sender._meta.model_name, [instance.pk])
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def expire_fragments_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Expire fragments of recipes whose tags or ingredients changed """
+    if action == 'pre_clear' and reverse:
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True)
+        )
+    elif action in ('post_add', 'post_remove') and reverse:
+        touch('recipe', pk_set)
+    elif action == 'post_clear' and reverse:
+        touch('recipe', instance.__dict__.pop('_cleared_recipe_ids', []))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        touch('recipe', [instance.pk])
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def apply_soft_delete(sender, instance, update_fields, **kwargs):
+    """ Recount and reindex after a soft delete or a restore """
+    from core import similarity
+
+    if 'deleted_at' not in (update_fields or ()):
+        return
+    if sender is not Recipe:
+        # Recipes show only live tags and ingredients
+        column = f'{sender._meta.model_name}_id'
+        through = next(t for t, m in RECIPE_ATTRS.items() if m is sender)
+        touch('recipe', through.objects.filter(
+            **{column: instance.pk}
+        ).values_list('recipe_id', flat=True))
+        similarity.record_change(instance.user_id)
+        return
+    for through, model in RECIPE_ATTRS.items():
+        pks = list(through.objects.filter(recipe_id=instance.pk).values_list(
+            f'{model._meta.model_name}_id', flat=True
+        ))
+        if pks:
+            recount(model, pks)
+    if instance.deleted_at:
+        similarity.record_change(instance.user_id, instance.pk, 'delete')
+    else:
+        similarity.record_change(instance.user_id)
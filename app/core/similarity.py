@@ -0,0 +1,289 @@
+"""
+Recipe similarity over tag and ingredient membership
+
+Each user's recipes are kept as a sparse incidence matrix, one row per
+recipe and one weighted column per tag or ingredient, so scoring a
+recipe against the whole collection is a single sparse mat-vec.
+Indexes are cached per process and patched in place on M2M changes; a
+revision counter in the shared cache tells other processes to rebuild.
+"""
+import secrets
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.metrics import record_cache
+from core.models import Recipe
+
+FEATURES = {
+    'tags': (Recipe.tags.through, 'tag_id'),
+    'ingredients': (Recipe.ingredients.through, 'ingredient_id'),
+}
+METRICS = ('cosine', 'jaccard')
+# Patched rows are folded back into the matrix past this many
+COMPACT_MIN_ROWS = 256
+
+_indexes = OrderedDict()
+_lock = threading.RLock()
+
+class SimilarityIndex:
+    """
+        Weighted recipe x feature matrix of one user's collection.
+
+        Rows changed since the last build live in an overlay of column
+        sets and their matrix rows are masked out, which keeps updates
+        O(row) instead of rebuilding the CSR structure every time.
+    """
+
+    def __init__(self, user_id, version):
+        self.user_id = user_id
+        self.version = version
+        self.columns = {}
+        self.kinds = []
+        self.weights = np.empty(0)
+        self.recipe_ids = np.empty(0, dtype=np.int64)
+        self.matrix = sparse.csr_matrix((0, 0))
+        self.overlay = {}
+        self._reindex()
+
+    @classmethod
+    def build(cls, user_id, version):
+        """ Load the user's memberships from the database """
+        index = cls(user_id, version)
+        index.recipe_ids = np.fromiter(
+            Recipe.objects.filter(user_id=user_id).order_by('id')
+            .values_list('id', flat=True),
+            dtype=np.int64,
+        )
+        rows, cols = [], []
+        for kind, (through, column) in FEATURES.items():
+            related = column[:-len('_id')]
+            pairs = np.array(
+                through.objects.filter(
+                    recipe__user_id=user_id, recipe__deleted_at__isnull=True,
+                    **{f'{related}__deleted_at__isnull': True},
+                ).values_list('recipe_id', column),
+                dtype=np.int64,
+            ).reshape(-1, 2)
+            attr_ids, inverse = np.unique(pairs[:, 1], return_inverse=True)
+            cols.append(inverse + len(index.kinds))
+            rows.append(np.searchsorted(index.recipe_ids, pairs[:, 0]))
+            for attr_id in attr_ids.tolist():
+                index.columns[(kind, attr_id)] = len(index.kinds)
+                index.kinds.append(kind)
+        index.weights = np.array(
+            [settings.SIMILARITY_WEIGHTS[kind] for kind in index.kinds]
+        )
+        cols = np.concatenate(cols)
+        index.matrix = sparse.csr_matrix(
+            (index.weights[cols], (np.concatenate(rows), cols)),
+            shape=(len(index.recipe_ids), len(index.kinds)),
+        )
+        index._reindex()
+        return index
+
+    def _reindex(self):
+        """ Recompute row lookups and per-row norms after a build """
+        self.row_of = {
+            recipe_id: row
+            for row, recipe_id in enumerate(self.recipe_ids.tolist())
+        }
+        self.live = np.ones(len(self.recipe_ids), dtype=bool)
+        self.sums = np.asarray(self.matrix.sum(axis=1)).ravel()
+        self.norms = np.sqrt(
+            np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel()
+        )
+
+    def features(self, recipe_id):
+        """ Return the column indexes of a recipe's tags and ingredients """
+        if recipe_id in self.overlay:
+            return self.overlay[recipe_id]
+        row = self.row_of.get(recipe_id)
+        if row is None or not self.live[row]:
+            return frozenset()
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return frozenset(self.matrix.indices[start:end].tolist())
+
+    def column(self, kind, attr_id):
+        """ Return the column of a tag or ingredient, adding it if new """
+        key = (kind, attr_id)
+        if key not in self.columns:
+            self.columns[key] = len(self.kinds)
+            self.kinds.append(kind)
+            self.weights = np.append(
+                self.weights, settings.SIMILARITY_WEIGHTS[kind]
+            )
+        return self.columns[key]
+
+    def apply(self, recipe_id, action, kind=None, pks=()):
+        """ Patch one recipe after an add, remove, clear or delete """
+        row = self.row_of.get(recipe_id)
+        if action == 'delete':
+            self.overlay.pop(recipe_id, None)
+            if row is not None:
+                self.live[row] = False
+            return
+        current = set(self.features(recipe_id))
+        if action == 'add':
+            current.update(self.column(kind, pk) for pk in pks)
+        elif action == 'remove':
+            current.difference_update(
+                self.columns[(kind, pk)] for pk in pks
+                if (kind, pk) in self.columns
+            )
+        elif action == 'clear':
+            current = {col for col in current if self.kinds[col] != kind}
+        self.overlay[recipe_id] = frozenset(current)
+        if row is not None:
+            self.live[row] = False
+        limit = max(COMPACT_MIN_ROWS, len(self.recipe_ids) // 20)
+        if len(self.overlay) > limit:
+            self.compact()
+
+    def compact(self):
+        """ Fold the overlay into a freshly built matrix """
+        keep = np.flatnonzero(self.live)
+        base = self.matrix[keep]
+        base.resize((len(keep), len(self.kinds)))
+        overlay_ids = sorted(self.overlay)
+        indptr, indices = [0], []
+        for recipe_id in overlay_ids:
+            indices.extend(sorted(self.overlay[recipe_id]))
+            indptr.append(len(indices))
+        indices = np.array(indices, dtype=np.int64)
+        patched = sparse.csr_matrix(
+            (self.weights[indices], indices, indptr),
+            shape=(len(overlay_ids), len(self.kinds)),
+        )
+        self.matrix = sparse.vstack([base, patched], format='csr')
+        self.recipe_ids = np.concatenate([
+            self.recipe_ids[keep], np.array(overlay_ids, dtype=np.int64),
+        ])
+        self.overlay = {}
+        self._reindex()
+
+    def similar(self, recipe_id, k=10, metric='cosine'):
+        """
+            Return up to k (recipe_id, score) pairs most similar to
+            recipe_id, best first. Cosine compares the weighted
+            membership vectors, jaccard is the weighted Jaccard index.
+        """
+        query = self.features(recipe_id)
+        if not query:
+            return []
+        cols = np.fromiter(query, dtype=np.int64)
+        weights = self.weights[cols]
+        in_base = cols < self.matrix.shape[1]
+        vector = np.zeros(self.matrix.shape[1])
+        if metric == 'cosine':
+            vector[cols[in_base]] = weights[in_base]
+            query_norm = np.sqrt(np.dot(weights, weights))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = (self.matrix @ vector) / (self.norms * query_norm)
+        else:
+            vector[cols[in_base]] = 1
+            shared = self.matrix @ vector
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = shared / (self.sums + weights.sum() - shared)
+        scores = np.nan_to_num(scores)
+        scores[~self.live] = 0
+        if recipe_id in self.row_of:
+            scores[self.row_of[recipe_id]] = 0
+
+        top = np.flatnonzero(scores)
+        if len(top) > k:
+            top = top[np.argpartition(-scores[top], k - 1)[:k]]
+        matches = list(
+            zip(self.recipe_ids[top].tolist(), scores[top].tolist())
+        )
+        for other_id, other in self.overlay.items():
+            if other_id != recipe_id and other & query:
+                matches.append((other_id, self._score(query, other, metric)))
+        matches.sort(key=lambda match: (-match[1], -match[0]))
+        return matches[:k]
+
+    def _score(self, query, other, metric):
+        """ Score two column sets directly, used for overlay rows """
+        shared = self.weights[list(query & other)]
+        if metric == 'cosine':
+            mine = self.weights[list(query)]
+            theirs = self.weights[list(other)]
+            return float(np.dot(shared, shared) / np.sqrt(
+                np.dot(mine, mine) * np.dot(theirs, theirs)
+            ))
+        return float(shared.sum() / self.weights[list(query | other)].sum())
+
+def version_key(user_id):
+    """ Return the cache key holding a user's revision counter """
+    return f'similarity:revision:{user_id}'
+
+def current_version(user_id):
+    """ Return the shared revision of a user's memberships """
+    version = cache.get(version_key(user_id))
+    if version is None:
+        # A random start, so a counter evicted and added again does not
+        # repeat revisions an old index was built at
+        cache.add(version_key(user_id), secrets.randbits(48), None)
+        version = cache.get(version_key(user_id))
+    return version
+
+def get_index(user_id):
+    """ Return the user's index, rebuilt if another process changed it """
+    version = current_version(user_id)
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None and index.version == version:
+            _indexes.move_to_end(user_id)
+            record_cache('similarity', True)
+            return index
+    record_cache('similarity', False)
+    index = SimilarityIndex.build(user_id, version)
+    with _lock:
+        _indexes[user_id] = index
+        while len(_indexes) > settings.SIMILARITY_CACHE_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+def similar_recipes(user_id, recipe_id, k=10, metric='cosine'):
+    """ Return the k recipes of the user most similar to recipe_id """
+    index = get_index(user_id)
+    # Changes patch the index in place under the same lock
+    with _lock:
+        return index.similar(recipe_id, k, metric)
+
+def record_change(user_id, recipe_id=None, action=None, kind=None, pks=()):
+    """
+        Update the user's index once the current transaction commits.
+        Without an action the index is only invalidated.
+    """
+    pks = list(pks or ())
+    transaction.on_commit(
+        lambda: _apply_change(user_id, recipe_id, action, kind, pks)
+    )
+
+def _apply_change(user_id, recipe_id, action, kind, pks):
+    """
+        Bump the shared revision and patch the local index if no other
+        process changed the user's memberships since it was built
+    """
+    with _lock:
+        try:
+            # Atomic on memcached, so concurrent changes in several
+            # workers each get their own revision
+            version = cache.incr(version_key(user_id))
+        except ValueError:
+            version = None
+        index = _indexes.get(user_id)
+        if index is None:
+            return
+        if action is None or version != index.version + 1:
+            del _indexes[user_id]
+            return
+        index.apply(recipe_id, action, kind, pks)
+        index.version = version
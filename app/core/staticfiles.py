@@ -0,0 +1,103 @@
+"""
+Content-hashed, precompressed static files and a view serving them
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from core.compression import brotli, negotiate
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.map', '.json', '.svg', '.html', '.txt', '.xml',
+    '.ttf', '.otf', '.eot', '.ico',
+)
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+STATIC_MAX_AGE = 3600
+# Extension of each precompressed variant, most preferred first
+VARIANTS = (('br', '.br'), ('gzip', '.gz'))
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+        Manifest storage that also writes .br and .gz variants of every
+        compressible file after collectstatic has hashed them, using the
+        slowest, smallest settings since it only runs once per deploy.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(paths) | set(self.hashed_files.values())):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress_file(name)
+
+    def compress_file(self, name):
+        """ Write the compressed variants of name that are smaller """
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < settings.COMPRESSION_MIN_SIZE:
+            return
+        variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content, quality=11)
+        for suffix, compressed in variants.items():
+            if len(compressed) >= len(content):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
+
+@require_safe
+def serve_static(request, path):
+    """
+        Serve a file from STATIC_ROOT, picking a precompressed variant
+        the client accepts. Content-hashed names never change, so they
+        are cached for a year.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    served_path, encoding = full_path, None
+    if path.endswith(COMPRESSIBLE_EXTENSIONS):
+        available = {
+            coding: full_path + suffix for coding, suffix in VARIANTS
+            if os.path.isfile(full_path + suffix)
+        }
+        encoding = negotiate(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), tuple(available)
+        )
+        if encoding is not None:
+            served_path = available[encoding]
+
+    response = FileResponse(
+        open(served_path, 'rb'),
+        content_type=content_type or 'application/octet-stream',
+        filename=os.path.basename(path),
+    )
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    if path.endswith(COMPRESSIBLE_EXTENSIONS):
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if HASHED_NAME.search(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=STATIC_MAX_AGE)
+    return response
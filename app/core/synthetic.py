@@ -0,0 +1,219 @@
+"""
+Synthetic data generation for scale and performance testing
+"""
+import io
+import multiprocessing
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    recipe_image_file_path,
+    refresh_recipe_counts,
+)
+
+DISHES = [
+    'Curry', 'Momo', 'Dal', 'Soup', 'Salad', 'Stew', 'Pasta', 'Pie',
+    'Noodles', 'Risotto', 'Tacos', 'Pancakes', 'Biryani', 'Chowmein',
+]
+ADJECTIVES = [
+    'Spicy', 'Smoky', 'Creamy', 'Quick', 'Classic', 'Crispy', 'Herb',
+    'Garlic', 'Lemon', 'Sweet', 'Roasted', 'Green', 'Rustic', 'Easy',
+]
+TAG_NAMES = [
+    'Vegan', 'Vegetarian', 'Breakfast', 'Lunch', 'Dinner', 'Dessert',
+    'Quick', 'Spicy', 'Gluten Free', 'Nepali', 'Indian', 'Italian',
+    'Snack', 'Soup', 'Healthy', 'Party', 'Kids', 'Festival',
+]
+INGREDIENT_NAMES = [
+    'Rice', 'Lentils', 'Onion', 'Garlic', 'Ginger', 'Tomato', 'Potato',
+    'Chicken', 'Buff', 'Paneer', 'Flour', 'Butter', 'Milk', 'Eggs',
+    'Salt', 'Chilli', 'Cumin', 'Turmeric', 'Coriander', 'Sugar',
+]
+SCALES = ['gm', 'kg', 'ml', 'l', 'piece', 'tsp', 'tbsp', 'cup']
+
+def zipf_weights(count, exponent=1.1):
+    """ Return Zipf weights so a few items dominate like real data """
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+def split_recipes(total, users, rng):
+    """ Split total recipes over users with a long-tailed distribution """
+    weights = zipf_weights(users)
+    rng.shuffle(weights)
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for index in range(total - sum(counts)):
+        counts[index % users] += 1
+    return counts
+
+def attr_names(names, count):
+    """ Return count unique names built from a vocabulary """
+    return [
+        names[index % len(names)] if index < len(names)
+        else f'{names[index % len(names)]} {index // len(names)}'
+        for index in range(count)
+    ]
+
+def create_images(count, seed):
+    """ Store count small JPEGs and return their storage names """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        image = Image.new('RGB', (64, 64), tuple(
+            rng.randrange(256) for _ in range(3)
+        ))
+        content = io.BytesIO()
+        image.save(content, format='JPEG')
+        names.append(default_storage.save(
+            recipe_image_file_path(None, 'synthetic.jpg'),
+            ContentFile(content.getvalue()),
+        ))
+    return names
+
+def generate_user_data(job):
+    """ Generate tags, ingredients and recipes for a single user """
+    user_id, seed, recipe_total, options, images = job
+    rng = random.Random(seed)
+    batch_size = options['batch_size']
+    with transaction.atomic():
+        Tag.objects.bulk_create([
+            Tag(user_id=user_id, name=name)
+            for name in attr_names(TAG_NAMES, options['tags_per_user'])
+        ], batch_size=batch_size)
+        Ingredient.objects.bulk_create([
+            Ingredient(
+                user_id=user_id,
+                name=name,
+                quantity=rng.randint(1, 500),
+                scale=rng.choice(SCALES),
+            )
+            for name in attr_names(
+                INGREDIENT_NAMES, options['ingredients_per_user']
+            )
+        ], batch_size=batch_size)
+        tag_ids = list(Tag.objects.filter(
+            user_id=user_id).order_by('id').values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.filter(
+            user_id=user_id).order_by('id').values_list('id', flat=True))
+        tag_weights = zipf_weights(len(tag_ids))
+        ingredient_weights = zipf_weights(len(ingredient_ids))
+
+        last_id = 0
+        for start in range(0, recipe_total, batch_size):
+            recipes = [
+                Recipe(
+                    user_id=user_id,
+                    title=f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}',
+                    description='Synthetic recipe',
+                    time_minutes=rng.randint(5, 240),
+                    price=Decimal(rng.randint(100, 99999)) / 100,
+                    image=(
+                        rng.choice(images)
+                        if images and rng.random() < options['image_ratio']
+                        else None
+                    ),
+                )
+                for _ in range(min(batch_size, recipe_total - start))
+            ]
+            Recipe.objects.bulk_create(recipes)
+            recipe_ids = [recipe.pk for recipe in recipes]
+            if None in recipe_ids:
+                recipe_ids = list(Recipe.objects.filter(
+                    user_id=user_id, id__gt=last_id
+                ).order_by('id').values_list('id', flat=True))
+            last_id = recipe_ids[-1]
+
+            tag_links, ingredient_links = [], []
+            for recipe_id in recipe_ids:
+                if tag_ids:
+                    tag_links.extend(
+                        Recipe.tags.through(recipe_id=recipe_id, tag_id=pk)
+                        for pk in set(rng.choices(
+                            tag_ids, tag_weights, k=rng.randint(0, 4)
+                        ))
+                    )
+                if ingredient_ids:
+                    ingredient_links.extend(
+                        Recipe.ingredients.through(
+                            recipe_id=recipe_id, ingredient_id=pk
+                        )
+                        for pk in set(rng.choices(
+                            ingredient_ids, ingredient_weights,
+                            k=rng.randint(1, 8),
+                        ))
+                    )
+            Recipe.tags.through.objects.bulk_create(tag_links)
+            Recipe.ingredients.through.objects.bulk_create(ingredient_links)
+
+        refresh_recipe_counts(Tag, tag_ids)
+        refresh_recipe_counts(Ingredient, ingredient_ids)
+    return recipe_total
+
+def generate(users=100, recipes=10000, power_users=0,
+             power_user_recipes=100000, tags_per_user=20,
+             ingredients_per_user=40, images=10, image_ratio=0.1,
+             prefix='synthetic', seed=0, workers=1, batch_size=1000,
+             progress=None):
+    """
+        Generate synthetic users and their collections.
+
+        Power users get power_user_recipes each, the remaining recipes are
+        spread over the other users with a Zipf distribution. The work is
+        split per user so it runs in a pool of worker processes.
+    """
+    rng = random.Random(seed)
+    password = make_password('synthetic123')
+    total_users = users + power_users
+    emails = [f'{prefix}{index}@example.com' for index in range(total_users)]
+    user_model = get_user_model()
+    user_model.objects.bulk_create([
+        user_model(email=email, name=email.split('@')[0], password=password)
+        for email in emails
+    ], batch_size=batch_size)
+    user_ids = list(user_model.objects.filter(
+        email__startswith=prefix, email__endswith='@example.com'
+    ).order_by('id').values_list('id', flat=True))
+
+    counts = [power_user_recipes] * power_users
+    if users:
+        counts += split_recipes(recipes, users, rng)
+    image_names = create_images(images, seed) if images else []
+    options = {
+        'tags_per_user': tags_per_user,
+        'ingredients_per_user': ingredients_per_user,
+        'image_ratio': image_ratio,
+        'batch_size': batch_size,
+    }
+    jobs = [
+        (user_id, seed * 1000003 + index, count, options, image_names)
+        for index, (user_id, count) in enumerate(zip(user_ids, counts))
+    ]
+
+    created = 0
+    if connections['default'].vendor == 'sqlite':
+        # SQLite serializes writers, parallel workers only hit lock errors
+        workers = 1
+    if workers > 1:
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(workers) as pool:
+            for count in pool.imap_unordered(generate_user_data, jobs):
+                created += count
+                if progress:
+                    progress(created)
+    else:
+        for job in jobs:
+            created += generate_user_data(job)
+            if progress:
+                progress(created)
+    return user_ids
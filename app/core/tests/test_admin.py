@@ -1,11 +1,19 @@
 """
 Test for django admin modifications
 """
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import Client
 
+from core import admin, models
+
 class AdminSiteTests(TestCase):
     """ Tests for Django admin """
 
@@ -42,4 +50,102 @@ class AdminSiteTests(TestCase):
         url = reverse('admin:core_user_add')
         res = self.client.get(url)
 
-        self.assertEqual(res.status_code, 200)
\ No newline at end of file
+        self.assertEqual(res.status_code, 200)
+
+    def test_recipe_changelist_filtered_by_user_email(self):
+        """ Test recipe changelist narrows to one user by email """
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='test123'
+        )
+        for owner, title in ((self.user, 'Dal Bhat'), (other, 'Sel Roti')):
+            models.Recipe.objects.create(
+                user=owner, title=title, time_minutes=5, price=Decimal('1.00')
+            )
+        url = reverse('admin:core_recipe_changelist')
+
+        res = self.client.get(url, {'user_email': self.user.email})
+
+        self.assertContains(res, 'Dal Bhat')
+        self.assertNotContains(res, 'Sel Roti')
+
+    def test_recipe_search_by_title_prefix(self):
+        """ Test admin search matches the title prefix """
+        models.Recipe.objects.create(
+            user=self.user, title='Momo', time_minutes=5, price=Decimal('1.00')
+        )
+        models.Recipe.objects.create(
+            user=self.user, title='Chowmein', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        url = reverse('admin:core_recipe_changelist')
+
+        res = self.client.get(url, {'q': 'Mo'})
+
+        self.assertContains(res, 'Momo')
+        self.assertNotContains(res, 'Chowmein')
+
+    def test_recipe_change_page(self):
+        """ Test recipe change page renders with raw ID and autocomplete """
+        recipe = models.Recipe.objects.create(
+            user=self.user, title='Momo', time_minutes=5, price=Decimal('1.00')
+        )
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, 'vForeignKeyRawIdAdminField')
+        self.assertContains(res, 'admin-autocomplete')
+
+    def test_delete_selected_soft_deletes(self):
+        """ Test the delete action only hides the selected recipes """
+        recipe = models.Recipe.objects.create(
+            user=self.user, title='Momo', time_minutes=5, price=Decimal('1.00')
+        )
+        url = reverse('admin:core_recipe_changelist')
+
+        self.client.post(url, {
+            'action': 'delete_selected', '_selected_action': [recipe.id],
+            'post': 'yes',
+        })
+
+        self.assertFalse(models.Recipe.objects.exists())
+        recipe = models.Recipe.all_objects.get()
+        self.assertIsNotNone(recipe.deleted_at)
+
+    def test_estimate_skips_tombstones(self):
+        """ Test soft deleted models are estimated from a LIVE index """
+        self.assertEqual(
+            admin.estimate_relation(models.Recipe), 'recipe_user_id_live_idx'
+        )
+        self.assertEqual(
+            admin.estimate_relation(models.User), models.User._meta.db_table
+        )
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'reltuples is Postgres specific'
+)
+class EstimatedCountTests(TestCase):
+    """ Test changelist counts of big tables come from the planner """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='test123'
+        )
+
+    def count_queries(self, queryset):
+        paginator = admin.EstimatedCountPaginator(queryset, 100)
+        with patch('core.admin.ESTIMATED_COUNT_THRESHOLD', -1), \
+                CaptureQueriesContext(connection) as queries:
+            paginator.count
+        return [q['sql'] for q in queries if 'COUNT(' in q['sql'].upper()]
+
+    def test_live_manager_filter_estimated(self):
+        """ Test the live manager's own filter does not force COUNT(*) """
+        self.assertEqual(self.count_queries(models.Recipe.objects.all()), [])
+
+    def test_filtered_changelist_counted(self):
+        """ Test other filters still get an exact count """
+        queryset = models.Recipe.objects.filter(user=self.user)
+
+        self.assertEqual(len(self.count_queries(queryset)), 1)
@@ -0,0 +1,118 @@
+"""
+Tests for the batch API
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+BATCH_URL = reverse('batch')
+
+class BatchApiTests(TestCase):
+    """ Test running many API calls in one request """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123', name='Test'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Dal', time_minutes=20,
+            price=Decimal('2.00'),
+        )
+        Tag.objects.create(user=self.user, name='Vegan')
+
+    def test_auth_required(self):
+        """ Test the batch endpoint needs authentication """
+        res = APIClient().post(BATCH_URL, {'requests': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_reads_in_one_request(self):
+        """ Test reads return every response in request order """
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'path': reverse('user:me')},
+            {'path': reverse('recipe:tag-list')},
+            {'path': reverse('recipe:recipe-list') + '?ordering=price'},
+            {'path': reverse(
+                'recipe:recipe-detail', args=[self.recipe.id]
+            )},
+        ]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        responses = res.data['responses']
+        self.assertEqual([r['status'] for r in responses], [200] * 4)
+        self.assertEqual(responses[0]['body']['email'], 'test@example.com')
+        self.assertEqual(responses[1]['body'][0]['name'], 'Vegan')
+        self.assertEqual(responses[2]['body'][0]['title'], 'Dal')
+        self.assertEqual(responses[3]['body']['id'], self.recipe.id)
+
+    def test_token_checked_once(self):
+        """ Test sub-requests reuse the batch authentication """
+        calls = [{'path': reverse('recipe:tag-list')}] * 5
+
+        # Token lookup, the batch savepoint and one query per call
+        with self.assertNumQueries(1 + 2 + 5):
+            self.client.post(BATCH_URL, {'requests': calls}, format='json')
+
+    def test_failed_write_rolled_back_alone(self):
+        """ Test a failing write does not undo the other writes """
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'method': 'POST', 'path': reverse('recipe:recipe-list'),
+             'body': {'title': 'Momo', 'time_minutes': 30, 'price': '4.00'}},
+            {'method': 'POST', 'path': reverse('recipe:recipe-list'),
+             'body': {'title': 'Broken'}},
+            {'method': 'DELETE', 'path': reverse(
+                'recipe:recipe-detail', args=[self.recipe.id]
+            )},
+        ]}, format='json')
+
+        self.assertEqual(
+            [r['status'] for r in res.data['responses']], [201, 400, 204]
+        )
+        self.assertEqual(
+            list(Recipe.objects.values_list('title', flat=True)), ['Momo']
+        )
+
+    def test_failed_read_fails_alone(self):
+        """ Test a read raising an error does not fail the batch """
+        with self.assertLogs('core.batch', 'ERROR') as logs:
+            res = self.client.post(BATCH_URL, {'requests': [
+                {'path': reverse('recipe:tag-list') + '?assigned_only=abc'},
+                {'path': reverse('recipe:tag-list')},
+            ]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['status'] for r in res.data['responses']], [500, 200]
+        )
+        self.assertIn('Traceback', logs.output[0])
+
+    def test_paths_outside_api_rejected(self):
+        """ Test only user and recipe routes can be called """
+        res = self.client.post(BATCH_URL, {'requests': [
+            {'path': reverse('batch')},
+            {'path': '/admin/'},
+            {'path': '/api/recipe/nothing/'},
+        ]}, format='json')
+
+        self.assertEqual(
+            [r['status'] for r in res.data['responses']], [404] * 3
+        )
+
+    def test_batch_size_limited(self):
+        """ Test batches over the limit are rejected """
+        calls = [{'path': reverse('user:me')}] * 26
+
+        res = self.client.post(BATCH_URL, {'requests': calls}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,89 @@
+"""
+Tests for the API benchmark helpers
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core import benchmarks, synthetic
+
+class BenchmarkTests(TestCase):
+    """ Test benchmark runs and regression gating """
+
+    def test_run_scenarios_reports_metrics(self):
+        """ Test scenarios hit the real routes and report metrics """
+        synthetic.generate(
+            users=1, recipes=3, power_users=1, power_user_recipes=5,
+            images=0, prefix='bench-test-',
+        )
+        user = get_user_model().objects.get(email='bench-test-0@example.com')
+
+        with override_settings(DEBUG=False):
+            results = benchmarks.run_scenarios(
+                user, iterations=2, only=['recipe-list', 'tag-list']
+            )
+
+        self.assertEqual(set(results), {'recipe-list', 'tag-list'})
+        for result in results.values():
+            self.assertGreater(result['queries'], 0)
+            self.assertGreater(result['p50_ms'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertGreater(result['rps'], 0)
+
+    def test_writes_run_last(self):
+        """ Test reads are timed before writes change the dataset """
+        synthetic.generate(
+            users=1, recipes=3, power_users=1, power_user_recipes=5,
+            images=0, prefix='bench-test-',
+        )
+        user = get_user_model().objects.get(email='bench-test-0@example.com')
+        writes = {'recipe-create', 'recipe-update', 'upload-image'}
+
+        names = [name for name, request in benchmarks.scenarios(user)]
+
+        self.assertEqual(set(names[-len(writes):]), writes)
+
+    def test_compare_flags_regressions(self):
+        """ Test slower latency and extra queries are regressions """
+        baseline = {'small': {
+            'recipe-list': {'p50_ms': 10.0, 'queries': 3},
+            'tag-list': {'p50_ms': 2.0, 'queries': 2},
+        }}
+        results = {'small': {
+            'recipe-list': {'p50_ms': 11.0, 'queries': 4},
+            'tag-list': {'p50_ms': 2.5, 'queries': 2},
+            'token': {'p50_ms': 50.0, 'queries': 2},
+        }}
+
+        regressions = benchmarks.compare(results, baseline, threshold=0.2)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('small/recipe-list', regressions[0])
+        self.assertIn('small/tag-list', regressions[1])
+
+class BenchmarkThroughputTests(TransactionTestCase):
+    """ Test throughput measured with concurrent clients """
+
+    def test_concurrent_clients_counted(self):
+        """ Test every client's requests go into the throughput """
+        synthetic.generate(
+            users=1, recipes=3, power_users=1, power_user_recipes=5,
+            images=0, prefix='bench-test-',
+        )
+        user = get_user_model().objects.get(email='bench-test-0@example.com')
+        calls = []
+
+        def request(client):
+            calls.append(client)
+            return client.get(reverse('recipe:tag-list'))
+
+        with override_settings(DEBUG=False):
+            rps = benchmarks.measure_throughput(
+                'tag-list', request, Token.objects.create(user=user), 3, 2
+            )
+
+        self.assertEqual(len(calls), 6)
+        self.assertEqual(len(set(map(id, calls))), 2)
+        self.assertGreater(rps, 0)
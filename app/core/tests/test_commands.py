@@ -2,29 +2,315 @@
 Test custom Django Management Commands
 """
 
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Pyscopg2Error
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 
-@patch('core.management.commands.wait_for_db.Command.check')
+from core.models import (
+    IdempotencyKey, Ingredient, Recipe, Tag, UserDeletion,
+)
+
+@patch('core.health.check_database')
 class CommandTest(SimpleTestCase):
     """ Test Commands """
     def test_wait_for_db_ready(self, patched_check):
         """ Test waiting for database if database is ready """
-        patched_check.return_value = True
-        call_command('wait_for_db')
-        patched_check.assert_called_once_with(databases=['default'])
+        patched_check.return_value = None
+        call_command('wait_for_db', stdout=StringIO())
+        patched_check.assert_called_once_with('default')
 
     @patch('time.sleep')
     def test_wait_for_db_delay(self, patched_sleep, patched_check):
         """ Test waiting for database when getting OperationalError """
         patched_check.side_effect = [Pyscopg2Error] * 2 + \
-        [OperationalError] * 3 + [True]
-        call_command('wait_for_db')
+        [OperationalError] * 3 + [None]
+        call_command('wait_for_db', stdout=StringIO())
 
         self.assertEqual(patched_check.call_count, 6)
 
-        patched_check.assert_called_with(databases=['default'])
+        patched_check.assert_called_with('default')
+        self.assertEqual(
+            [call.args[0] for call in patched_sleep.call_args_list],
+            [0.1, 0.2, 0.4, 0.8, 1.6],
+        )
+
+    @patch('time.sleep')
+    def test_wait_for_db_backoff_capped(self, patched_sleep, patched_check):
+        """ Test the retry delay stops growing at max delay """
+        patched_check.side_effect = [OperationalError] * 4 + [None]
+        call_command(
+            'wait_for_db', initial_delay=1, max_delay=3, stdout=StringIO()
+        )
+
+        self.assertEqual(
+            [call.args[0] for call in patched_sleep.call_args_list],
+            [1, 2, 3, 3],
+        )
+
+    def test_wait_for_db_timeout(self, patched_check):
+        """ Test the command fails once the timeout expires """
+        patched_check.side_effect = OperationalError('connection refused')
+
+        with self.assertRaisesMessage(CommandError, 'database:default'):
+            call_command(
+                'wait_for_db', timeout=0.05, initial_delay=0.01,
+                stdout=StringIO(),
+            )
+
+    def test_wait_for_db_probes_caches(self, patched_check):
+        """ Test cache aliases are probed along with databases """
+        with patch('core.health.check_cache') as patched_cache:
+            patched_cache.side_effect = [ConnectionError, None]
+            with patch('time.sleep'):
+                call_command('wait_for_db', stdout=StringIO())
+
+        patched_cache.assert_called_with('default')
+        self.assertEqual(patched_cache.call_count, 2)
+
+class RecountRecipeAttrsTest(TestCase):
+    """ Test recount_recipe_attrs command """
+
+    def test_recount_repairs_stale_counts(self):
+        """ Test counts are recomputed from the recipe relations """
+        user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        tag = Tag.objects.create(user=user, name='Vegan')
+        unused = Tag.objects.create(user=user, name='Spicy')
+        recipe = Recipe.objects.create(
+            user=user, title='Dal', time_minutes=20, price=Decimal('1.50')
+        )
+        recipe.tags.add(tag)
+        Tag.objects.update(recipe_count=7)
+
+        call_command('recount_recipe_attrs', batch_size=1, stdout=StringIO())
+
+        tag.refresh_from_db()
+        unused.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertEqual(unused.recipe_count, 0)
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class GenerateSyntheticDataTest(TestCase):
+    """ Test generate_synthetic_data command """
+
+    def test_generate_skewed_dataset(self):
+        """ Test power users and regular users get their recipes """
+        call_command(
+            'generate_synthetic_data', users=5, recipes=50, power_users=1,
+            power_user_recipes=30, tags_per_user=4, ingredients_per_user=6,
+            images=1, batch_size=7, stdout=StringIO(),
+        )
+
+        users = get_user_model().objects.filter(email__startswith='synthetic')
+        self.assertEqual(users.count(), 6)
+        self.assertEqual(Recipe.objects.count(), 80)
+        power_user = users.get(email='synthetic0@example.com')
+        self.assertEqual(Recipe.objects.filter(user=power_user).count(), 30)
+        for tag in Tag.objects.all():
+            self.assertEqual(tag.recipe_count, tag.recipe_set.count())
+
+    def test_generate_existing_prefix_error(self):
+        """ Test generating twice with one prefix is refused """
+        call_command(
+            'generate_synthetic_data', users=1, recipes=1, images=0,
+            stdout=StringIO(),
+        )
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'generate_synthetic_data', users=1, recipes=1, images=0,
+                stdout=StringIO(),
+            )
+
+class PruneIdempotencyKeysTest(TestCase):
+    """ Test prune_idempotency_keys command """
+
+    def test_prune_only_expired(self):
+        """ Test keys past the TTL are deleted in batches """
+        user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        for key in ('a', 'b', 'c'):
+            IdempotencyKey.objects.create(user=user, key=key, fingerprint='')
+        IdempotencyKey.objects.exclude(key='c').update(
+            created=timezone.now() - timedelta(days=2)
+        )
+
+        call_command('prune_idempotency_keys', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('key', flat=True)), ['c']
+        )
+
+class ProcessUserDeletionsTest(TestCase):
+    """ Test process_user_deletions command """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        self.other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123'
+        )
+
+    def create_recipes(self, user, count):
+        tag = Tag.objects.create(user=user, name='Vegan')
+        ingredient = Ingredient.objects.create(
+            user=user, name='Lentils', quantity=200, scale='g'
+        )
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                user=user, title=f'Dal {i}', time_minutes=20,
+                price=Decimal('1.50'),
+                image=f'uploads/recipe/{user.pk}-{i}.jpg',
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+    def test_deletes_user_data_in_batches(self):
+        """ Test the user, their rows and images go, others stay """
+        self.create_recipes(self.user, 5)
+        self.create_recipes(self.other, 1)
+        IdempotencyKey.objects.create(user=self.user, key='a', fingerprint='')
+        out = StringIO()
+
+        with patch('core.deletion.default_storage.delete') as delete, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'process_user_deletions', email=['test@example.com'],
+                batch_size=2, pause=0, stdout=out,
+            )
+
+        self.assertFalse(
+            get_user_model().objects.filter(pk=self.user.pk).exists()
+        )
+        self.assertEqual(Recipe.objects.filter(user=self.other).count(), 1)
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+        self.assertEqual(Recipe.ingredients.through.objects.count(), 1)
+        self.assertEqual(
+            sorted(call.args[0] for call in delete.call_args_list),
+            [f'uploads/recipe/{self.user.pk}-{i}.jpg' for i in range(5)],
+        )
+        deletion = UserDeletion.objects.get(user_id=self.user.pk)
+        self.assertIsNotNone(deletion.finished)
+        self.assertEqual(deletion.deleted, {
+            'recipes': 5, 'tags': 1, 'ingredients': 1,
+            'idempotency keys': 1,
+        })
+        self.assertIn('test@example.com: 4 recipes', out.getvalue())
+
+    def test_unknown_email_rejected(self):
+        """ Test scheduling a missing user fails """
+        with self.assertRaises(CommandError):
+            call_command(
+                'process_user_deletions', email=['nobody@example.com'],
+                stdout=StringIO(),
+            )
+
+class PurgeDeletedTest(TestCase):
+    """ Test purge_deleted command """
+
+    def test_purge_only_expired(self):
+        """ Test rows deleted before the retention period are removed """
+        user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        tag = Tag.objects.create(user=user, name='Vegan')
+        recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=user, title=f'Dal {i}', time_minutes=20,
+                price=Decimal('1.50'), image=f'uploads/recipe/{i}.jpg',
+            )
+            recipe.tags.add(tag)
+            recipes.append(recipe)
+        recipes[0].soft_delete()
+        recipes[1].soft_delete()
+        tag.soft_delete()
+        Recipe.all_objects.filter(pk=recipes[0].pk).update(
+            deleted_at=timezone.now() - timedelta(days=31)
+        )
+
+        with patch('core.deletion.default_storage.delete') as delete, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'purge_deleted', batch_size=1, pause=0, stdout=StringIO()
+            )
+
+        self.assertEqual(
+            sorted(Recipe.all_objects.values_list('title', flat=True)),
+            ['Dal 1', 'Dal 2'],
+        )
+        self.assertTrue(Tag.all_objects.filter(pk=tag.pk).exists())
+        self.assertEqual(Recipe.tags.through.objects.count(), 2)
+        delete.assert_called_once_with('uploads/recipe/0.jpg')
+
+        call_command('purge_deleted', days=0, pause=0, stdout=StringIO())
+
+        self.assertEqual(
+            list(Recipe.all_objects.values_list('title', flat=True)),
+            ['Dal 2'],
+        )
+        self.assertFalse(Tag.all_objects.exists())
+        self.assertFalse(Recipe.tags.through.objects.exists())
+
+class DedupeRecipeAttrsTest(TestCase):
+    """ Test dedupe_recipe_attrs command """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        for name in ('Gluten free', 'Gluten-free', 'Vegan'):
+            Tag.objects.create(user=self.user, name=name)
+        for name in ('Basmati rice', 'Basmati-Rice'):
+            Ingredient.objects.create(
+                user=self.user, name=name, quantity=200, scale='g'
+            )
+
+    def test_dry_run_only_lists(self):
+        """ Test a dry run reports duplicates without merging them """
+        out = StringIO()
+
+        call_command('dedupe_recipe_attrs', dry_run=True, stdout=out)
+
+        self.assertIn("'Gluten-free' -> 'Gluten free'", out.getvalue())
+        self.assertIn('Would merge 1 tags', out.getvalue())
+        self.assertEqual(Tag.objects.count(), 3)
+
+    def test_merges_duplicates(self):
+        """ Test duplicates of the selected users are merged """
+        out = StringIO()
+
+        call_command(
+            'dedupe_recipe_attrs', email=['test@example.com'], stdout=out
+        )
+
+        self.assertEqual(
+            sorted(Tag.objects.values_list('name', flat=True)),
+            ['Gluten free', 'Vegan'],
+        )
+        self.assertEqual(
+            list(Ingredient.objects.values_list('name', flat=True)),
+            ['Basmati rice'],
+        )
+        self.assertIn('Merged 1 ingredients', out.getvalue())
+
+    def test_unknown_email_rejected(self):
+        """ Test deduping a missing user fails """
+        with self.assertRaises(CommandError):
+            call_command(
+                'dedupe_recipe_attrs', email=['nobody@example.com'],
+                stdout=StringIO(),
+            )
@@ -0,0 +1,155 @@
+"""
+Tests for response compression and precompressed static files
+"""
+import gzip
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+import brotli
+
+from django.core.management import call_command
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.compression import CompressionMiddleware, negotiate
+from core.staticfiles import serve_static
+
+PAYLOAD = b'{"title": "Dal Bhat"}' * 200
+
+def respond(content=PAYLOAD, content_type='application/json', **headers):
+    """ Return a middleware wrapping a view with a fixed response """
+    def view(request):
+        response = HttpResponse(content, content_type=content_type)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+    return CompressionMiddleware(view)
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """ Test negotiated response compression """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_negotiate(self):
+        """ Test the preferred allowed encoding is picked """
+        self.assertEqual(negotiate('gzip, deflate, br'), 'br')
+        self.assertEqual(negotiate('gzip, br;q=0.5'), 'gzip')
+        self.assertEqual(negotiate('br;q=0, gzip;q=0'), None)
+        self.assertEqual(negotiate('*'), 'br')
+        self.assertEqual(negotiate(''), None)
+        self.assertEqual(negotiate('br', ('gzip',)), None)
+
+    def test_brotli_response(self):
+        """ Test clients accepting brotli get a brotli body """
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        response = respond(ETag='"abc"')(request)
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), PAYLOAD)
+        self.assertEqual(
+            response['Content-Length'], str(len(response.content))
+        )
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_gzip_response(self):
+        """ Test gzip is used when brotli is not accepted """
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = respond()(request)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), PAYLOAD)
+
+    def test_small_response_uncompressed(self):
+        """ Test responses under the size threshold are sent as is """
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='br')
+        with override_settings(COMPRESSION_MIN_SIZE=len(PAYLOAD) + 1):
+            response = respond()(request)
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, PAYLOAD)
+
+    def test_image_uncompressed(self):
+        """ Test already-compressed media types are skipped """
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='br')
+        response = respond(content_type='image/jpeg')(request)
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_no_accept_encoding(self):
+        """ Test clients without Accept-Encoding get the identity body """
+        response = respond()(self.factory.get('/'))
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+class StaticFilesTests(SimpleTestCase):
+    """ Test collectstatic precompression and static serving """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.static_root = tempfile.mkdtemp()
+        source = Path(tempfile.mkdtemp())
+        (source / 'app.css').write_text('body { color: red; }\n' * 200)
+        (source / 'logo.png').write_bytes(b'\x89PNG' + bytes(2000))
+        override = override_settings(
+            STATIC_ROOT=self.static_root,
+            STATICFILES_DIRS=[str(source)],
+            STATICFILES_STORAGE=(
+                'core.staticfiles.CompressedManifestStaticFilesStorage'
+            ),
+            INSTALLED_APPS=['django.contrib.staticfiles'],
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        call_command('collectstatic', interactive=False, stdout=StringIO())
+
+    def hashed_css(self):
+        """ Return the content-hashed name collectstatic gave app.css """
+        return next(
+            path.name for path in Path(self.static_root).glob('app.*.css')
+        )
+
+    def test_collectstatic_precompresses(self):
+        """ Test hashed compressible files get .br and .gz variants """
+        root = Path(self.static_root)
+        name = self.hashed_css()
+
+        self.assertEqual(
+            brotli.decompress((root / f'{name}.br').read_bytes()),
+            (root / name).read_bytes(),
+        )
+        self.assertTrue((root / f'{name}.gz').exists())
+        self.assertFalse(list(root.glob('logo*.png.*')))
+
+    def test_serve_precompressed_immutable(self):
+        """ Test hashed files are served precompressed for a year """
+        name = self.hashed_css()
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        response = serve_static(request, name)
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertIn('immutable', response['Cache-Control'])
+        body = b''.join(response.streaming_content)
+        self.assertEqual(
+            brotli.decompress(body),
+            (Path(self.static_root) / name).read_bytes(),
+        )
+
+    def test_serve_unhashed_short_cache(self):
+        """ Test unhashed names are cached briefly and sent as is """
+        response = serve_static(self.factory.get('/'), 'app.css')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_serve_missing_or_outside_root(self):
+        """ Test unknown files and path traversal are not found """
+        for path in ('missing.css', '../etc/passwd'):
+            with self.assertRaises(Http404):
+                serve_static(self.factory.get('/'), path)
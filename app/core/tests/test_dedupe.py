@@ -0,0 +1,127 @@
+"""
+Tests for merging duplicate tags and ingredients
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TestCase
+
+from core import dedupe
+from core.models import Recipe, Tag, Ingredient
+
+def create_recipe(user, title, tags=()):
+    """ Create and return a recipe with tags """
+    recipe = Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=Decimal('1.00')
+    )
+    recipe.tags.add(*tags)
+    return recipe
+
+class DedupeTests(TestCase):
+    """ Test clustering and merging near-duplicate names """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+
+    def test_cluster_key(self):
+        """ Test case, accents, punctuation and spacing are folded """
+        self.assertEqual(
+            {dedupe.cluster_key(name) for name in (
+                'Gluten-Free', 'gluten free', 'GLUTEN_free', 'Gluten  Free!',
+            )},
+            {'gluten free'},
+        )
+        self.assertEqual(dedupe.cluster_key('Crème Brûlée'), 'creme brulee')
+        self.assertEqual(dedupe.cluster_key('!!!'), '!!!')
+
+    def test_names_normalized_and_unique_ignoring_case(self):
+        """ Test names are trimmed and a live name exists once per user """
+        tag = Tag.objects.create(user=self.user, name='  Low   carb ')
+        self.assertEqual(tag.name, 'Low carb')
+
+        with self.assertRaises(IntegrityError):
+            Tag.objects.create(user=self.user, name='LOW CARB')
+
+    def test_deleted_names_can_be_reused(self):
+        """ Test the unique index only covers live rows """
+        Tag.objects.create(user=self.user, name='Vegan').soft_delete()
+
+        Tag.objects.create(user=self.user, name='vegan')
+
+    def test_find_duplicates_keeps_most_used(self):
+        """ Test clusters are kept by their most used member """
+        free = Tag.objects.create(user=self.user, name='Gluten free')
+        dashed = Tag.objects.create(user=self.user, name='Gluten-Free')
+        Tag.objects.create(user=self.user, name='Vegan')
+        create_recipe(self.user, 'Dal', [dashed])
+
+        self.assertEqual(
+            dedupe.find_duplicates(Tag, self.user.id), [(dashed, [free])]
+        )
+
+    def test_ingredient_quantities_not_merged(self):
+        """ Test ingredients only cluster with the same amount """
+        for name, quantity in (
+            ('Basmati rice', 200), ('Basmati-rice', 200),
+            ('Basmati rice', 500),
+        ):
+            Ingredient.objects.create(
+                user=self.user, name=name, quantity=quantity, scale='g'
+            )
+
+        clusters = dedupe.find_duplicates(Ingredient, self.user.id)
+
+        self.assertEqual(len(clusters), 1)
+        kept, duplicates = clusters[0]
+        self.assertEqual((kept.name, kept.quantity), ('Basmati rice', 200))
+        self.assertEqual([obj.name for obj in duplicates], ['Basmati-rice'])
+
+    def test_merge_rewrites_references(self):
+        """ Test recipes move to the kept tag without duplicate links """
+        kept = Tag.objects.create(user=self.user, name='Gluten free')
+        dashed = Tag.objects.create(user=self.user, name='Gluten-free')
+        spaced = Tag.objects.create(user=self.user, name='Gluten  free!')
+        other = Tag.objects.create(user=self.user, name='Vegan')
+        both = create_recipe(self.user, 'Dal', [kept, dashed, other])
+        two = create_recipe(self.user, 'Momo', [dashed, spaced])
+        one = create_recipe(self.user, 'Kheer', [spaced])
+        deleted = create_recipe(self.user, 'Old', [dashed])
+        deleted.soft_delete()
+
+        recipe_ids = dedupe.merge(
+            Tag, self.user.id, {kept.id: [dashed.id, spaced.id]}
+        )
+
+        self.assertEqual(
+            sorted(recipe_ids), sorted([both.id, two.id, one.id, deleted.id])
+        )
+        self.assertEqual(
+            sorted(Tag.all_objects.values_list('name', flat=True)),
+            ['Gluten free', 'Vegan'],
+        )
+        for recipe, tags in ((both, [kept, other]), (two, [kept]),
+                             (one, [kept]), (deleted, [kept])):
+            self.assertEqual(
+                sorted(recipe.tags.values_list('id', flat=True)),
+                sorted(tag.id for tag in tags),
+            )
+        kept.refresh_from_db()
+        self.assertEqual(kept.recipe_count, 3)
+
+    def test_merge_duplicates_only_touches_user(self):
+        """ Test merging one user's duplicates leaves others alone """
+        other_user = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123'
+        )
+        for user in (self.user, other_user):
+            Tag.objects.create(user=user, name='Low carb')
+            Tag.objects.create(user=user, name='Low-carb')
+
+        clusters = dedupe.merge_duplicates(Tag, self.user.id)
+
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Tag.objects.filter(user=other_user).count(), 2)
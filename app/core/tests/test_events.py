@@ -0,0 +1,166 @@
+"""
+Tests for the change event stream
+"""
+import asyncio
+import json
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core import events
+from core.models import Recipe, Tag
+
+def connect(token=None, method='GET'):
+    """ Return a communicator for a request to the event stream """
+    headers = [(b'authorization', f'Token {token}'.encode())] if token else []
+    return ApplicationCommunicator(events.stream, {
+        'type': 'http', 'method': method, 'path': '/api/events/',
+        'headers': headers,
+    })
+
+def parse(body):
+    """ Return the events encoded in a chunk of the stream """
+    parsed = []
+    for block in body.decode().strip().split('\n\n'):
+        fields = dict(
+            line.split(': ', 1) for line in block.split('\n')
+            if not line.startswith(':')
+        )
+        if 'event' in fields:
+            parsed.append(json.loads(fields['data']))
+    return parsed
+
+class EventStreamTests(TransactionTestCase):
+    """ Test streaming change events over Server-Sent Events """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        self.token = Token.objects.create(user=self.user).key
+
+    async def open(self, communicator):
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output()
+        if start['status'] == 200:
+            await communicator.receive_output()
+        return start
+
+    def test_auth_required(self):
+        """ Test the stream needs a valid token """
+        async def run():
+            for token in (None, 'invalid'):
+                communicator = connect(token)
+                start = await self.open(communicator)
+                self.assertEqual(start['status'], 401)
+
+        async_to_sync(run)()
+
+    def test_only_get_allowed(self):
+        """ Test the stream rejects other methods """
+        async def run():
+            start = await self.open(connect(self.token, method='POST'))
+            self.assertEqual(start['status'], 405)
+
+        async_to_sync(run)()
+
+    def test_changes_streamed(self):
+        """ Test recipe and tag writes reach the owner's stream """
+        def write():
+            recipe = Recipe.objects.create(
+                user=self.user, title='Dal', time_minutes=20,
+                price=Decimal('2.00'),
+            )
+            recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+            recipe_id = recipe.id
+            recipe.delete()
+            return recipe_id
+
+        async def run():
+            communicator = connect(self.token)
+            start = await self.open(communicator)
+            self.assertEqual(start['status'], 200)
+            self.assertIn(
+                (b'content-type', b'text/event-stream'), start['headers']
+            )
+
+            recipe_id = await sync_to_async(write)()
+            received = []
+            while len(received) < 4:
+                output = await communicator.receive_output()
+                received += parse(output['body'])
+            tag_id = received[1]['id']
+            self.assertEqual(received, [
+                {'type': 'recipe', 'action': 'created', 'id': recipe_id},
+                {'type': 'tag', 'action': 'created', 'id': tag_id},
+                {'type': 'recipe', 'action': 'updated', 'id': recipe_id},
+                {'type': 'recipe', 'action': 'deleted', 'id': recipe_id},
+            ])
+
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+            self.assertEqual(events.broker._subscriptions, {})
+
+        async_to_sync(run)()
+
+    def test_other_users_changes_not_streamed(self):
+        """ Test a stream only carries its user's changes """
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123'
+        )
+
+        async def run():
+            communicator = connect(self.token)
+            await self.open(communicator)
+            await sync_to_async(Tag.objects.create)(user=other, name='Keto')
+
+            self.assertTrue(await communicator.receive_nothing(0.1))
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+        async_to_sync(run)()
+
+    @override_settings(EVENTS_KEEPALIVE=0.05)
+    def test_keepalive(self):
+        """ Test idle streams get keep-alive comments """
+        async def run():
+            communicator = connect(self.token)
+            await self.open(communicator)
+
+            output = await communicator.receive_output()
+            self.assertEqual(output['body'], b': ping\n\n')
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait()
+
+        async_to_sync(run)()
+
+    def test_slow_client_reset(self):
+        """ Test an overflowing backlog is replaced by a reset event """
+        async def run():
+            subscription = events.Subscription(1, 2)
+            for pk in range(3):
+                subscription.put({'type': 'recipe', 'id': pk})
+
+            self.assertEqual(await subscription.get(), {'type': 'reset'})
+            self.assertTrue(subscription.queue.empty())
+
+        async_to_sync(run)()
+
+    def test_close_full_subscription(self):
+        """ Test closing ends a stream whose backlog is full """
+        async def run():
+            subscription = events.Subscription(1, 1)
+            subscription.put({'type': 'recipe', 'id': 1})
+
+            subscription.close()
+
+            self.assertIsNone(
+                await asyncio.wait_for(subscription.get(), 1)
+            )
+
+        async_to_sync(run)()
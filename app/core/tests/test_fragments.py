@@ -0,0 +1,99 @@
+"""
+Tests for the fragment cache
+"""
+import threading
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from core import fragments
+from core.versions import get_versions, make_key
+
+def builder(calls):
+    """ Return a build function recording the idents it is asked for """
+    def build(idents):
+        calls.append(sorted(idents))
+        return {ident: f'<{ident}>'.encode() for ident in idents}
+    return build
+
+class FragmentCacheTests(TestCase):
+    """ Test caching and expiring rendered fragments """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fragments_cached(self):
+        """ Test only missing fragments are built """
+        calls = []
+        build = builder(calls)
+
+        fragments.get_fragments('thing', 'thing', [1, 2], (), build)
+        found = fragments.get_fragments('thing', 'thing', [1, 2, 3], (), build)
+
+        self.assertEqual(found, {1: b'<1>', 2: b'<2>', 3: b'<3>'})
+        self.assertEqual(calls, [[1, 2], [3]])
+
+    def test_touch_expires_on_commit(self):
+        """ Test a committed write expires the fragment """
+        calls = []
+        build = builder(calls)
+        fragments.get_fragments('thing', 'thing', [1, 2], (), build)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fragments.touch('thing', [1])
+        fragments.get_fragments('thing', 'thing', [1, 2], (), build)
+
+        self.assertEqual(calls, [[1, 2], [1]])
+
+    def test_uncommitted_touch_bypasses_cache(self):
+        """ Test a write is built fresh until its transaction commits """
+        calls = []
+        build = builder(calls)
+        fragments.get_fragments('thing', 'thing', [1], (), build)
+
+        with self.captureOnCommitCallbacks():
+            fragments.touch('thing', [1])
+            fragments.get_fragments('thing', 'thing', [1], (), build)
+            fragments.get_fragments('thing', 'thing', [1], (), build)
+
+        self.assertEqual(calls, [[1], [1], [1]])
+        fragments.pending_writes().clear()
+
+    def test_waits_for_locked_rebuild(self):
+        """ Test a worker waits for the fragment another one rebuilds """
+        version = get_versions('thing', [1])[1]
+        key = make_key('thing', version, 'thing', 1)
+        cache.add(f'lock:{key}', 1)
+        threading.Timer(0.05, cache.set, [key, b'<other>']).start()
+        build = Mock()
+
+        found = fragments.get_fragments('thing', 'thing', [1], (), build)
+
+        self.assertEqual(found, {1: b'<other>'})
+        build.assert_not_called()
+
+    @patch('core.fragments.LOCK_WAIT', 0.05)
+    def test_stale_lock_falls_back_to_build(self):
+        """ Test a worker builds the fragment when the lock never clears """
+        version = get_versions('thing', [1])[1]
+        cache.add(f"lock:{make_key('thing', version, 'thing', 1)}", 1)
+        calls = []
+
+        found = fragments.get_fragments(
+            'thing', 'thing', [1], (), builder(calls)
+        )
+
+        self.assertEqual(found, {1: b'<1>'})
+        self.assertEqual(calls, [[1]])
+
+    def test_renderer_splices_fragments(self):
+        """ Test RawJSON is copied into the response and reads as a dict """
+        raw = fragments.RawJSON(b'{"id":1,"name":"Dal"}')
+
+        rendered = fragments.render({'results': [raw], 'next': None})
+
+        self.assertEqual(
+            rendered, b'{"results":[{"id":1,"name":"Dal"}],"next":null}'
+        )
+        self.assertEqual(raw, {'id': 1, 'name': 'Dal'})
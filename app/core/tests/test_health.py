@@ -0,0 +1,96 @@
+"""
+Tests for the health and readiness probes
+"""
+import threading
+import time
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.db import connection, connections
+from django.db.utils import OperationalError
+from django.test import TestCase
+from django.urls import reverse
+
+from core import health
+
+HEALTHZ_URL = reverse('healthz')
+READYZ_URL = reverse('readyz')
+
+class HealthTests(TestCase):
+    """ Test liveness and readiness endpoints """
+
+    def tearDown(self):
+        health.close_connections()
+
+    def test_healthz(self):
+        """ Test liveness answers without touching dependencies """
+        with patch('core.health.run_checks') as patched_checks:
+            res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+        patched_checks.assert_not_called()
+
+    def test_readyz_ok(self):
+        """ Test readiness reports every database and cache alias """
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['checks'], {
+            'database:default': 'ok',
+            'cache:default': 'ok',
+        })
+
+    @patch('core.health.check_database')
+    def test_readyz_unavailable(self, patched_check):
+        """ Test readiness fails when a database is down """
+        patched_check.side_effect = OperationalError('connection refused')
+
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['status'], 'unavailable')
+        self.assertIn(
+            'connection refused', res.json()['checks']['database:default']
+        )
+
+    def test_run_checks_timeout(self):
+        """ Test probes that hang are reported as timed out """
+        def hang(alias):
+            time.sleep(0.5)
+
+        with patch('core.health.check_cache', side_effect=hang):
+            results = health.run_checks(timeout=0.05)
+
+        self.assertIsNone(results['database:default'])
+        self.assertIn('timed out', results['cache:default'])
+
+    def test_probes_reuse_their_thread(self):
+        """ Test every probe of a check runs on the same kept thread """
+        threads = []
+
+        def record(alias):
+            threads.append(threading.current_thread())
+
+        with patch('core.health.check_database', side_effect=record):
+            health.run_checks(cache_aliases=[])
+            health.run_checks(cache_aliases=[])
+
+        self.assertEqual(len(threads), 2)
+        self.assertIs(threads[0], threads[1])
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    @skipUnless(
+        connection.vendor == 'postgresql', 'in-memory SQLite never closes'
+    )
+    def test_stale_connection_reopened(self):
+        """ Test a kept connection that went away is replaced """
+        health.run_checks(cache_aliases=[])
+        executor = health.get_executor('database:default')
+        executor.submit(
+            lambda: connections['default'].connection.close()
+        ).result()
+
+        results = health.run_checks(cache_aliases=[])
+
+        self.assertEqual(results, {'database:default': None})
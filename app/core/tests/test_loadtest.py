@@ -0,0 +1,58 @@
+"""
+Tests for the load test helpers
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import SimpleTestCase
+
+from core import loadtest
+
+class OkHandler(BaseHTTPRequestHandler):
+    """ Answer every GET with a small keep-alive response """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status = 200 if self.headers.get('Authorization') else 401
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+class LoadTestTests(SimpleTestCase):
+    """ Test the load test client and scaling check """
+
+    def test_client_loop_counts_responses(self):
+        """ Test a client counts successes and failed statuses """
+        server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        port = server.server_address[1]
+
+        ok, errors = loadtest.client_loop(
+            port, '/', {'Authorization': 'Token x'}, 0.2
+        )
+        self.assertGreater(ok, 0)
+        self.assertEqual(errors, 0)
+
+        ok, errors = loadtest.client_loop(port, '/', {}, 0.2)
+        self.assertEqual(ok, 0)
+        self.assertGreater(errors, 0)
+
+    def test_scaling_failures(self):
+        """ Test runs below linear efficiency fail within the core count """
+        results = {
+            1: {'rps': 100.0},
+            2: {'rps': 190.0},
+            4: {'rps': 250.0},
+            8: {'rps': 260.0},
+        }
+
+        self.assertEqual(loadtest.scaling_failures(results, 0.7, 2), [])
+        failures = loadtest.scaling_failures(results, 0.7, 4)
+        self.assertEqual(len(failures), 1)
+        self.assertTrue(failures[0].startswith('4 workers'))
@@ -0,0 +1,76 @@
+"""
+Tests for the metrics endpoint
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+
+METRICS_URL = reverse('metrics')
+TAGS_URL = reverse('recipe:tag-list')
+
+@override_settings(METRICS_TOKEN='scrape-token')
+class MetricsTests(TestCase):
+    """ Test metrics collection and exposition """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_route_metrics_exposed(self):
+        """ Test latency, status and query metrics are labelled by route """
+        self.client.get(TAGS_URL)
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer scrape-token'
+        )
+
+        body = res.content.decode()
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            'route="recipe:tag-list"}', body
+        )
+        self.assertIn(
+            'http_requests_total{method="GET",route="recipe:tag-list",'
+            'status="200"}', body
+        )
+        self.assertIn(
+            'db_queries_total{alias="default",route="recipe:tag-list"}', body
+        )
+        self.assertIn('http_requests_in_flight', body)
+
+    def test_metrics_need_token(self):
+        """ Test scrapes without the configured token are refused """
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 403)
+
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer other-token'
+        )
+        self.assertEqual(res.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_metrics_hidden_without_token(self):
+        """ Test metrics are not served without a token outside DEBUG """
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_record_cache(self):
+        """ Test cache hits and misses are counted separately """
+        before = metrics.CACHE_REQUESTS.labels('schema', 'hit')._value.get()
+
+        metrics.record_cache('schema', True)
+        metrics.record_cache('schema', False)
+
+        self.assertEqual(
+            metrics.CACHE_REQUESTS.labels('schema', 'hit')._value.get(),
+            before + 1,
+        )
@@ -0,0 +1,49 @@
+"""
+Tests for the request profiling middleware
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Tag
+
+TAGS_URL = reverse('recipe:tag-list')
+
+class RequestProfilingMiddlewareTests(TestCase):
+    """ Test request profiling middleware """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        Tag.objects.create(user=self.user, name='Vegan')
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_reports_timings(self):
+        """ Test Server-Timing header and log line on sampled requests """
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            res = client.get(TAGS_URL)
+
+        timing = res['Server-Timing']
+        for metric in ('db;', 'dup;', 'serialize;', 'render;', 'total;'):
+            self.assertIn(metric, timing)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['route'], 'recipe:tag-list')
+        self.assertGreater(record['queries'], 0)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0)
+    def test_disabled_without_sampling(self):
+        """ Test no instrumentation when sampling is off """
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.get(TAGS_URL)
+
+        self.assertFalse(res.has_header('Server-Timing'))
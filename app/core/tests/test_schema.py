@@ -0,0 +1,75 @@
+"""
+Tests for the cached OpenAPI schema
+"""
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+
+class CachedSchemaTests(SimpleTestCase):
+    """ Test schema is generated once and served with an ETag """
+
+    def setUp(self):
+        cache_dir = override_settings(SCHEMA_CACHE_DIR=tempfile.mkdtemp())
+        cache_dir.enable()
+        self.addCleanup(cache_dir.disable)
+        schema._memory.clear()
+        self.client = APIClient()
+
+    def test_schema_built_once(self):
+        """ Test repeated requests reuse the generated schema """
+        with patch(
+            'core.schema.build_schema', wraps=schema.build_schema
+        ) as build:
+            res1 = self.client.get(SCHEMA_URL)
+            res2 = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res1.status_code, 200)
+        self.assertIn(b'/api/recipe/recipes/', res1.content)
+        self.assertEqual(res1.content, res2.content)
+        build.assert_called_once()
+
+    def test_etag_not_modified(self):
+        """ Test a matching If-None-Match gets 304 """
+        res = self.client.get(SCHEMA_URL)
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_warm_schema_writes_files(self):
+        """ Test warm_schema fills the file cache for every format """
+        call_command('warm_schema', stdout=StringIO())
+
+        for format in schema.RENDERERS:
+            self.assertTrue(schema.cache_path(format, None).exists())
+
+    def test_unknown_lang_not_cached(self):
+        """ Test lang values outside LANGUAGES fall back to the default """
+        self.client.get(SCHEMA_URL)
+        files = set(Path(settings.SCHEMA_CACHE_DIR).rglob('*'))
+
+        for lang in ('../../../pwnzone/evil', 'xx-unknown'):
+            res = self.client.get(SCHEMA_URL, {'lang': lang})
+
+            self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            set(Path(settings.SCHEMA_CACHE_DIR).rglob('*')), files
+        )
+        self.assertEqual(
+            {key[2] for key in schema._memory}, {None}
+        )
+        self.assertFalse(
+            Path(settings.SCHEMA_CACHE_DIR, '../../../pwnzone').exists()
+        )
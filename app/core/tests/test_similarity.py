@@ -0,0 +1,171 @@
+"""
+Tests for the recipe similarity index
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from core import similarity
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import run_in_process, shared_cache
+
+def brute_force(user, recipe, metric):
+    """ Score every other recipe one pair at a time """
+    weights = {'tags': 1.0, 'ingredients': 2.0}
+
+    def features(item):
+        return {('tags', pk): weights['tags']
+                for pk in item.tags.values_list('pk', flat=True)} | \
+            {('ingredients', pk): weights['ingredients']
+             for pk in item.ingredients.values_list('pk', flat=True)}
+
+    query = features(recipe)
+    scores = {}
+    for other in Recipe.objects.filter(user=user).exclude(pk=recipe.pk):
+        theirs = features(other)
+        shared = sum(query[key] for key in query.keys() & theirs.keys())
+        if not shared:
+            continue
+        if metric == 'cosine':
+            shared_sq = sum(query[key] ** 2 for key in query.keys() & theirs)
+            scores[other.pk] = shared_sq / (
+                sum(v ** 2 for v in query.values()) *
+                sum(v ** 2 for v in theirs.values())
+            ) ** 0.5
+        else:
+            scores[other.pk] = shared / sum(
+                {**query, **theirs}.values()
+            )
+    return scores
+
+class SimilarityIndexTests(TestCase):
+    """ Test similarity scores and incremental index updates """
+
+    def setUp(self):
+        cache.clear()
+        similarity._indexes.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        rng = random.Random(1)
+        self.tags = [
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(6)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(
+                user=self.user, name=f'Ingredient {i}', quantity=1,
+                scale='kg',
+            )
+            for i in range(8)
+        ]
+        self.recipes = []
+        for i in range(30):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5,
+                price=Decimal('1.00'),
+            )
+            recipe.tags.add(*rng.sample(self.tags, rng.randint(0, 3)))
+            recipe.ingredients.add(
+                *rng.sample(self.ingredients, rng.randint(0, 4))
+            )
+            self.recipes.append(recipe)
+
+    def assertMatchesBruteForce(self, index):
+        for recipe in self.recipes[:10]:
+            for metric in similarity.METRICS:
+                expected = brute_force(self.user, recipe, metric)
+                found = dict(index.similar(recipe.pk, k=100, metric=metric))
+                self.assertEqual(set(found), set(expected))
+                for pk, score in expected.items():
+                    self.assertAlmostEqual(found[pk], score)
+
+    def test_scores_match_brute_force(self):
+        """ Test vectorized scores equal pairwise scores """
+        index = similarity.SimilarityIndex.build(self.user.id, 'v1')
+
+        self.assertMatchesBruteForce(index)
+
+    def test_incremental_updates_match_rebuild(self):
+        """ Test patched and compacted indexes equal a fresh build """
+        similarity.get_index(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].tags.add(self.tags[5])
+            self.recipes[1].ingredients.remove(
+                *self.recipes[1].ingredients.all()
+            )
+            self.recipes[2].tags.clear()
+            new_tag = Tag.objects.create(user=self.user, name='New')
+            self.recipes[3].tags.add(new_tag)
+            self.recipes[4].tags.add(new_tag)
+            self.recipes.pop(29).delete()
+        index = similarity.get_index(self.user.id)
+        self.assertTrue(index.overlay)
+
+        self.assertMatchesBruteForce(index)
+        index.compact()
+        self.assertFalse(index.overlay)
+        self.assertMatchesBruteForce(index)
+
+    def test_version_change_rebuilds(self):
+        """ Test another process's change invalidates the local index """
+        index = similarity.get_index(self.user.id)
+        cache.incr(similarity.version_key(self.user.id))
+
+        self.assertIsNot(similarity.get_index(self.user.id), index)
+
+    def test_tag_delete_invalidates(self):
+        """ Test cascaded M2M deletes rebuild the index """
+        index = similarity.get_index(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tags[0].delete()
+
+        self.assertNotIn(self.user.id, similarity._indexes)
+        self.assertIsNot(similarity.get_index(self.user.id), index)
+        self.assertMatchesBruteForce(similarity.get_index(self.user.id))
+
+@shared_cache()
+class SimilaritySharedCacheTests(TestCase):
+    """ Test indexes follow changes handled by other processes """
+
+    def setUp(self):
+        cache.clear()
+        similarity._indexes.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Dal', time_minutes=10,
+            price=Decimal('1.00'),
+        )
+
+    def change_in_other_process(self):
+        """ Record a change as the worker handling the write would """
+        run_in_process(
+            'from core import similarity\n'
+            f'similarity._apply_change({self.user.id}, {self.recipe.id}, '
+            f'"add", "tags", [{self.tag.id}])'
+        )
+
+    def test_change_in_other_process_rebuilds(self):
+        """ Test a change made by another worker rebuilds the index """
+        index = similarity.get_index(self.user.id)
+
+        self.change_in_other_process()
+
+        self.assertIsNot(similarity.get_index(self.user.id), index)
+
+    def test_concurrent_change_not_patched(self):
+        """ Test an index missing another worker's change is dropped """
+        similarity.get_index(self.user.id)
+        self.change_in_other_process()
+
+        similarity._apply_change(
+            self.user.id, self.recipe.id, 'add', 'tags', [self.tag.id]
+        )
+
+        self.assertNotIn(self.user.id, similarity._indexes)
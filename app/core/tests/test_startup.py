@@ -0,0 +1,51 @@
+"""
+Tests for startup helpers
+"""
+import sys
+import tempfile
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from app.startup import lazy_view, preload
+from core.tests.utils import run_in_process
+
+class StartupTests(SimpleTestCase):
+    """ Test lazy views and preloading """
+
+    def test_lazy_view_imports_on_first_request(self):
+        """ Test the view class is imported only when first called """
+        view = lazy_view('drf_spectacular.views.SpectacularSwaggerView')
+
+        with patch('app.startup.import_string') as patched_import:
+            view.load()
+            view.load()
+
+        patched_import.assert_called_once_with(
+            'drf_spectacular.views.SpectacularSwaggerView'
+        )
+
+    def test_docs_served_through_lazy_view(self):
+        """ Test the swagger page still renders """
+        res = self.client.get(reverse('api-docs'))
+
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(SCHEMA_CACHE_DIR=tempfile.mkdtemp())
+    def test_preload_warms_deferred_modules(self):
+        """ Test preload imports the modules deferred to first use """
+        preload()
+
+        self.assertIn('PIL.Image', sys.modules)
+        self.assertIn('drf_spectacular.views', sys.modules)
+        self.assertIn('drf_spectacular.openapi', sys.modules)
+
+    def test_urls_do_not_import_schema_generation(self):
+        """ Test loading the URLs leaves drf_spectacular.openapi out """
+        run_in_process(
+            'import sys\n'
+            'from django.urls import get_resolver\n'
+            'get_resolver().reverse_dict\n'
+            'assert "drf_spectacular.openapi" not in sys.modules'
+        )
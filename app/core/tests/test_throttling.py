@@ -0,0 +1,164 @@
+"""
+Tests for token bucket throttling
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.throttling import MmapBucketStore, parse_rate
+
+TAGS_URL = reverse('recipe:tag-list')
+TOKEN_URL = reverse('user:token')
+
+def throttle_rates(**rates):
+    """ Return REST_FRAMEWORK settings with the given throttle rates """
+    return {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}
+
+class ThrottleAPITests(TestCase):
+    """ Test throttling of API requests """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass123'
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(reads='2/min'))
+    def test_reads_throttled_with_retry_after(self):
+        """ Test bursts beyond capacity get 429 with Retry-After """
+        self.client.force_authenticate(self.user)
+        for _ in range(2):
+            res = self.client.get(TAGS_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '30')
+
+    @override_settings(
+        REST_FRAMEWORK=throttle_rates(reads='1/min', token='1/min')
+    )
+    def test_scopes_have_separate_buckets(self):
+        """ Test token issuance does not consume the reads bucket """
+        payload = {'email': 'test@example.com', 'password': 'testpass123'}
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        self.client.force_authenticate(self.user)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+class MmapBucketStoreTests(SimpleTestCase):
+    """ Test the shared memory bucket store """
+
+    def test_update_persists_per_key(self):
+        """ Test state is kept per key across store instances """
+        path = os.path.join(tempfile.mkdtemp(), 'buckets')
+        store = MmapBucketStore(path=path, slots=64)
+        store.update('a', lambda state: ((5.0, 1.0), state), 60)
+
+        other = MmapBucketStore(path=path, slots=64)
+        result = other.update('a', lambda state: (state, state), 60)
+
+        self.assertEqual(result, (5.0, 1.0))
+        self.assertIsNone(
+            other.update('b', lambda state: ((1.0, 1.0), state), 60)
+        )
+
+    def test_colliding_keys_keep_their_buckets(self):
+        """ Test keys sharing a group of slots never reset each other """
+        path = os.path.join(tempfile.mkdtemp(), 'buckets')
+        store = MmapBucketStore(path=path, slots=MmapBucketStore.PROBES)
+        keys = [f'key-{i}' for i in range(MmapBucketStore.PROBES)]
+        for tokens, key in enumerate(keys):
+            store.update(
+                key, lambda state: ((tokens, 1.0), state), 60 + tokens
+            )
+
+        for tokens, key in enumerate(keys):
+            self.assertEqual(
+                store.update(key, lambda state: (state, state), 60 + tokens),
+                (tokens, 1.0),
+            )
+
+    def test_full_group_never_gives_a_full_bucket(self):
+        """ Test a key evicting another inherits its tokens """
+        path = os.path.join(tempfile.mkdtemp(), 'buckets')
+        store = MmapBucketStore(path=path, slots=MmapBucketStore.PROBES)
+        for i in range(MmapBucketStore.PROBES):
+            store.update(f'key-{i}', lambda state: ((i, 1.0), state), 60 + i)
+
+        result = store.update('other', lambda state: (state, state), 60)
+
+        self.assertEqual(result, (0, 1.0))
+
+    def test_concurrent_updates_not_lost(self):
+        """ Test workers updating one bucket at once never lose updates """
+        path = os.path.join(tempfile.mkdtemp(), 'buckets')
+        MmapBucketStore(path=path, slots=64)
+
+        def spend():
+            store = MmapBucketStore(path=path, slots=64)
+            for _ in range(200):
+                store.update(
+                    'a', lambda state: (((state or (0, 0))[0] + 1, 0), None),
+                    60,
+                )
+
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=spend) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        store = MmapBucketStore(path=path, slots=64)
+        self.assertEqual(store.update('a', lambda state: (state, state), 60),
+                         (800, 0))
+
+    def test_threads_do_not_lose_updates(self):
+        """ Test threads of one worker are excluded from a bucket too """
+        path = os.path.join(tempfile.mkdtemp(), 'buckets')
+        store = MmapBucketStore(path=path, slots=64)
+
+        def add_one(state):
+            count = (state or (0, 0))[0]
+            time.sleep(0.001)
+            return (count + 1, 0), None
+
+        def spend():
+            for _ in range(20):
+                store.update('a', add_one, 60)
+
+        threads = [threading.Thread(target=spend) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(store.update('a', lambda state: (state, state), 60),
+                         (80, 0))
+
+    def test_parse_rate(self):
+        """ Test rates become capacity and refill per second """
+        self.assertEqual(parse_rate('120/min'), (120, 2))
+        self.assertEqual(parse_rate('10/s'), (10, 10))
@@ -0,0 +1,38 @@
+"""
+Helpers for tests of state shared between processes
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+
+def shared_cache():
+    """
+        Return settings overriding the default cache with one kept in
+        files, which other processes started by run_in_process share
+    """
+    return override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.mkdtemp(),
+        },
+    })
+
+def run_in_process(code):
+    """
+        Run code in a fresh Django process using the current default
+        cache, as another worker would
+    """
+    cache = settings.CACHES['default']
+    env = dict(
+        os.environ,
+        CACHE_BACKEND=cache['BACKEND'],
+        CACHE_LOCATION=cache['LOCATION'],
+    )
+    subprocess.run(
+        [sys.executable, '-c', f'import django\ndjango.setup()\n{code}'],
+        cwd=settings.BASE_DIR, env=env, check=True, timeout=60,
+    )
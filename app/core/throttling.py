@@ -0,0 +1,151 @@
+"""
+Token bucket throttling for the API
+"""
+import fcntl
+import functools
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+class CacheBucketStore:
+    """
+        Keep buckets in the default Django cache, best-effort only. The
+        read-modify-write is locked within the process but not across
+        processes, so workers updating a bucket at the same time can
+        spend the same token. Exact for a single process such as the
+        development server, gunicorn uses MmapBucketStore instead.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def update(self, key, fn, timeout):
+        with self.lock:
+            state, result = fn(cache.get(key))
+            cache.set(key, state, timeout)
+        return result
+
+class MmapBucketStore:
+    """
+        Keep buckets in a memory-mapped file shared by every worker on
+        the node. A key hashes to a group of PROBES slots, and each slot
+        stores the full 64-bit hash of its key, so colliding keys get
+        slots of their own. Only the group is locked for the
+        read-modify-write, so clients of other groups never contend.
+
+        A key finding its group full of live buckets takes over the one
+        that expires first and keeps its tokens. It never gets a fresh,
+        full bucket that would let colliding keys bypass the limit.
+    """
+    SLOT = struct.Struct('=Qddd')
+    PROBES = 8
+
+    def __init__(self, path=None, slots=None):
+        self.path = path or settings.THROTTLE_MMAP_PATH
+        self.slots = slots or settings.THROTTLE_MMAP_SLOTS
+        self.groups = max(1, self.slots // self.PROBES)
+        size = self.groups * self.PROBES * self.SLOT.size
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+        # fcntl locks belong to the process and never exclude its threads
+        self.lock = threading.Lock()
+
+    def update(self, key, fn, timeout):
+        # 0 marks an empty slot
+        digest = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big'
+        ) or 1
+        length = self.PROBES * self.SLOT.size
+        start = (digest % self.groups) * length
+        now = time.time()
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, length, start)
+            try:
+                return self._update(digest, start, length, now, fn, timeout)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, length, start)
+
+    def _update(self, digest, start, length, now, fn, timeout):
+        """ Read-modify-write the key's slot, with its group locked """
+        slot, state, oldest = None, None, None
+        for offset in range(start, start + length, self.SLOT.size):
+            stored, *stored_state, expires = self.SLOT.unpack_from(
+                self.map, offset
+            )
+            if stored == digest:
+                slot, state = offset, tuple(stored_state)
+                break
+            if stored == 0 or expires < now:
+                if slot is None:
+                    slot = offset
+            elif oldest is None or expires < oldest[0]:
+                oldest = (expires, offset, tuple(stored_state))
+        if slot is None:
+            expires, slot, state = oldest
+        state, result = fn(state)
+        self.SLOT.pack_into(self.map, slot, digest, *state, now + timeout)
+        return result
+
+@functools.lru_cache(maxsize=None)
+def get_store(path):
+    """ Return the bucket store configured by THROTTLE_STORE """
+    return import_string(path)()
+
+def parse_rate(rate):
+    """ Return (capacity, refill per second) for a rate like '60/min' """
+    num, period = rate.split('/')
+    duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(num), int(num) / duration
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+        Token bucket throttle per user (or client IP) and endpoint class.
+
+        The endpoint class is the view's throttle_scope when it sets one
+        (uploads, token), otherwise reads for safe methods and writes for
+        everything else. Rates come from DEFAULT_THROTTLE_RATES, where a
+        rate of '60/min' allows bursts of 60 refilled at one per second.
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            scope = 'reads' if request.method in ('GET', 'HEAD', 'OPTIONS') \
+                else 'writes'
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        capacity, refill = parse_rate(rate)
+        now = time.time()
+
+        def consume(state):
+            tokens, updated = state or (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            if tokens >= 1:
+                return (tokens - 1, now), 0
+            return (tokens, now), (1 - tokens) / refill
+
+        self.wait_seconds = get_store(settings.THROTTLE_STORE).update(
+            f'throttle:{scope}:{ident}', consume, int(capacity / refill) + 1
+        )
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,68 @@
+"""
+Version tokens for cache entries that are invalidated by writes
+
+Cached results include the version token of what they were computed
+from in their key. A write only replaces the token, so every stale
+entry is skipped at once and later expires on its own.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.metrics import record_cache
+
+def version_key(scope, ident):
+    """ Return the cache key holding the version of scope:ident """
+    return f'version:{scope}:{ident}'
+
+def get_version(scope, ident):
+    """ Return the current version token of scope:ident """
+    version = cache.get(version_key(scope, ident))
+    if version is None:
+        cache.add(version_key(scope, ident), uuid.uuid4().hex, None)
+        version = cache.get(version_key(scope, ident))
+    return version
+
+def get_versions(scope, idents):
+    """ Return {ident: version} for many idents of scope at once """
+    keys = {ident: version_key(scope, ident) for ident in idents}
+    found = cache.get_many(list(keys.values()))
+    missing = [key for key in keys.values() if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        found.update(cache.get_many(missing))
+    return {ident: found[key] for ident, key in keys.items()}
+
+def bump_version(scope, ident):
+    """ Replace the version of scope:ident once the transaction commits """
+    transaction.on_commit(
+        lambda: cache.set(version_key(scope, ident), uuid.uuid4().hex, None)
+    )
+
+def bump_versions(scope, idents):
+    """ Replace the versions of many idents once the transaction commits """
+    keys = [version_key(scope, ident) for ident in idents]
+    transaction.on_commit(lambda: cache.set_many(
+        {key: uuid.uuid4().hex for key in keys}, None
+    ))
+
+def make_key(prefix, version, *parts):
+    """ Return a cache key for prefix, version and any hashable parts """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'{prefix}:{version}:{digest}'
+
+def get_or_compute(prefix, scope, ident, parts, compute, timeout):
+    """
+        Return compute() cached under the current version of
+        scope:ident, counting hits and misses as the prefix cache.
+    """
+    key = make_key(prefix, get_version(scope, ident), scope, ident, *parts)
+    value = cache.get(key)
+    record_cache(prefix, value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
@@ -0,0 +1,72 @@
+"""
+Gunicorn configuration for production
+
+Run from the app directory with:
+
+    gunicorn app.wsgi
+
+or serve the ASGI app with GUNICORN_WORKER_CLASS set to
+uvicorn.workers.UvicornWorker and app.asgi:application.
+
+Graceful reloads: HUP replaces the workers with fresh ones once they
+finish their in-flight requests. Because the app is preloaded in the
+master, deploying new code needs USR2 (start a new master next to the
+old one) followed by QUIT to the old master.
+"""
+import multiprocessing
+import os
+
+def default_workers():
+    """ Two workers per core plus one, the usual sync worker sizing """
+    return multiprocessing.cpu_count() * 2 + 1
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS') or default_workers())
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# Load the app once in the master and fork it, see app.startup.preload
+preload_app = True
+os.environ.setdefault('APP_PRELOAD', '1')
+
+# Token buckets must be shared and updated atomically by all workers
+os.environ.setdefault('THROTTLE_STORE', 'core.throttling.MmapBucketStore')
+
+# Recycle workers to bound memory growth, jittered so they do not all
+# restart at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Only the gthread and async workers keep connections alive, the sync
+# worker closes each one after its response. Behind the proxy keep the
+# idle ones short so they do not hold on to a thread
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-') or None
+
+def on_starting(server):
+    """ Start with an empty Prometheus multiprocess directory """
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+        # Only the files, the directory may be a mount point
+        for name in os.listdir(path):
+            os.unlink(os.path.join(path, name))
+    if workers > 1 and not os.environ.get('CACHE_LOCATION'):
+        server.log.warning(
+            'CACHE_LOCATION is not set: each of the %s workers caches for '
+            'itself and misses the writes handled by the others', workers
+        )
+
+def post_fork(server, worker):
+    """ Never share database connections opened in the master """
+    from django.db import connections
+    connections.close_all()
+
+def child_exit(server, worker):
+    """ Drop live gauges of workers that exited """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
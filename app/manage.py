@@ -15,6 +15,10 @@ def main():
             "available on your PYTHONPATH environment variable? Did you "
             "forget to activate a virtual environment?"
         ) from exc
+    if os.environ.get('STARTUP_PROFILE'):
+        import django
+        from app.startup import profile_startup
+        profile_startup('manage.py', django.setup)
     execute_from_command_line(sys.argv)
 
 
@@ -0,0 +1,59 @@
+"""
+Facet counts of tags and ingredients over a filtered recipe list
+"""
+from django.conf import settings
+from django.db.models import Count
+
+from core.models import Recipe
+from core.versions import get_or_compute
+
+# Facet name -> (recipe M2M field, related model name)
+FACETS = {
+    'tags': ('tags', 'tag'),
+    'ingredients': ('ingredients', 'ingredient'),
+}
+
+def facet_counts(user, filters, names, lookups=None):
+    """
+        Return {facet: [{'id', 'name', 'count'}]} for the requested
+        facet names, cached per user and filter until the user's data
+        changes.
+
+        filters maps facet names to the IDs the list is filtered by and
+        lookups holds the other ORM filters of the list. Each facet is
+        counted with the filters of the other facets only, so its counts
+        are what selecting one of its values would match.
+    """
+    filters = {name: sorted(set(ids)) for name, ids in filters.items() if ids}
+    names = sorted(set(names))
+    lookups = lookups or {}
+    return get_or_compute(
+        'facets', 'user', user.pk,
+        (names, sorted(filters.items()), sorted(lookups.items())),
+        lambda: {
+            name: count_facet(user, filters, name, lookups) for name in names
+        },
+        settings.FACET_CACHE_TIMEOUT,
+    )
+
+def count_facet(user, filters, name, lookups=None):
+    """ Count recipes per value of one facet in a single grouped query """
+    recipes = Recipe.objects.filter(user=user, **(lookups or {}))
+    for other, ids in filters.items():
+        if other != name:
+            recipes = recipes.filter(**{f'{FACETS[other][0]}__id__in': ids})
+    field, related = FACETS[name]
+    rows = getattr(Recipe, field).through.objects.filter(
+        recipe__in=recipes.values('id'),
+        **{f'{related}__deleted_at__isnull': True},
+    ).values(f'{related}_id', f'{related}__name').annotate(
+        count=Count('recipe_id', distinct=True)
+    ).order_by('-count', f'{related}__name')
+    return [
+        {
+            'id': row[f'{related}_id'],
+            'name': row[f'{related}__name'],
+            'count': row['count'],
+        }
+        for row in rows
+    ]
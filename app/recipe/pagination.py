@@ -0,0 +1,153 @@
+"""
+Orderings and keyset pagination for the recipe list
+"""
+import base64
+import json
+from decimal import Decimal
+
+from django.db.models import Q
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Ordering parameter -> (sort key, descending). Every key is backed by a
+# (user, key, id) index, id breaks ties so the order is total.
+ORDERINGS = {
+    'created': ('id', False),
+    '-created': ('id', True),
+    'price': ('price', False),
+    '-price': ('price', True),
+    'time_minutes': ('time_minutes', False),
+    '-time_minutes': ('time_minutes', True),
+    'title': ('title', False),
+    '-title': ('title', True),
+}
+DEFAULT_ORDERING = '-created'
+# JSON type of each sort key in a cursor, prices are sent as strings
+CURSOR_TYPES = {'id': int, 'price': str, 'time_minutes': int, 'title': str}
+
+def get_ordering(request):
+    """ Return (key, descending) for the ordering query parameter """
+    ordering = request.query_params.get('ordering', DEFAULT_ORDERING)
+    if ordering not in ORDERINGS:
+        raise ValidationError({
+            'ordering': f"Must be one of {', '.join(ORDERINGS)}."
+        })
+    return ORDERINGS[ordering]
+
+def order_by(queryset, request):
+    """ Apply the requested ordering with id as tie-breaker """
+    key, descending = get_ordering(request)
+    prefix = '-' if descending else ''
+    fields = [f'{prefix}{key}']
+    if key != 'id':
+        fields.append(f'{prefix}id')
+    return queryset.order_by(*fields)
+
+class KeysetPagination(BasePagination):
+    """
+        Keyset (seek) pagination over the requested ordering.
+
+        The cursor holds the sort key and id of the last row served, so
+        the next page is a range scan on the (user, key, id) index
+        instead of an OFFSET. The list is only paginated when the client
+        asks for it with page_size or cursor.
+    """
+    page_size = 50
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not ('page_size' in request.query_params or
+                'cursor' in request.query_params):
+            return None
+        self.request = request
+        self.key, self.descending = get_ordering(request)
+        self.size = self.get_page_size(request)
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            value, last_id = self.decode_cursor(cursor)
+            lookup = 'lt' if self.descending else 'gt'
+            if self.key == 'id':
+                queryset = queryset.filter(**{f'id__{lookup}': last_id})
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{self.key}__{lookup}': value}) |
+                    Q(**{self.key: value, f'id__{lookup}': last_id})
+                )
+
+        page = list(queryset[:self.size + 1])
+        self.has_next = len(page) > self.size
+        page = page[:self.size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer.'})
+        if not 1 <= size <= self.max_page_size:
+            raise ValidationError({
+                'page_size': f'Must be between 1 and {self.max_page_size}.'
+            })
+        return size
+
+    def encode_cursor(self, recipe):
+        value = getattr(recipe, self.key)
+        if isinstance(value, Decimal):
+            value = str(value)
+        raw = json.dumps([value, recipe.id]).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            value, last_id = json.loads(base64.urlsafe_b64decode(cursor))
+            # Exact types, bool is an int and lists or objects must never
+            # reach the filter
+            if type(value) is not CURSOR_TYPES[self.key] or \
+                    type(last_id) is not int:
+                raise TypeError
+            if self.key == 'price':
+                value = Decimal(value)
+                if not value.is_finite():
+                    raise ValueError
+            return value, last_id
+        except (ValueError, TypeError, ArithmeticError):
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, 'cursor', self.encode_cursor(self.last)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': 'cursor', 'required': False, 'in': 'query',
+                'description': 'Cursor from the previous page.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': 'page_size', 'required': False, 'in': 'query',
+                'description': 'Paginate with this many results per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,80 @@
+"""
+Recipe list and detail payloads assembled from cached fragments
+"""
+from core.fragments import RawJSON, get_fragments, render
+from core.models import Recipe, Tag, Ingredient
+from recipe import serializers
+
+# Nested collection -> (version scope, model, serializer)
+NESTED = {
+    'tags': ('tag', Tag, serializers.TagSerializer),
+    'ingredients': (
+        'ingredient', Ingredient, serializers.IngredientSerializer
+    ),
+}
+
+def recipe_payloads(request, ids, serializer_class):
+    """
+        Return the recipes with ids, in that order, as RawJSON rendered
+        by serializer_class. A recipe fragment holds the recipe's own
+        fields with placeholders for its tags and ingredients, which are
+        fragments of their own as their recipe_count changes with other
+        recipes.
+    """
+    base = request.build_absolute_uri('/')
+    templates = get_fragments(
+        f'recipe-{serializer_class.__name__}', 'recipe', ids, (base,),
+        lambda missing: build_recipes(request, missing, serializer_class),
+    )
+    nested = {}
+    for field, (scope, model, serializer) in NESTED.items():
+        wanted = {
+            pk for template in templates.values() for pk in template[field]
+        }
+        nested[field] = get_fragments(
+            f'{scope}-fragment', scope, sorted(wanted), (),
+            lambda missing, model=model, serializer=serializer:
+                build_nested(model, serializer, missing),
+        )
+
+    payloads = []
+    for pk in ids:
+        template = templates.get(pk)
+        if template is None:
+            continue
+        content = template['content']
+        for field in NESTED:
+            items = b','.join(
+                nested[field][item] for item in template[field]
+                if item in nested[field]
+            )
+            content = content.replace(
+                placeholder(field), b'[' + items + b']', 1
+            )
+        payloads.append(RawJSON(content))
+    return payloads
+
+def placeholder(field):
+    """ Return how the placeholder of a nested field is rendered """
+    return render(f'\x00{field}')
+
+def build_recipes(request, ids, serializer_class):
+    """ Render recipe templates with the IDs of their nested objects """
+    recipes = Recipe.objects.filter(id__in=ids).prefetch_related(*NESTED)
+    templates = {}
+    for recipe in recipes:
+        data = serializer_class(recipe, context={'request': request}).data
+        template = {}
+        for field in NESTED:
+            template[field] = [item['id'] for item in data[field]]
+            data[field] = f'\x00{field}'
+        template['content'] = render(data)
+        templates[recipe.id] = template
+    return templates
+
+def build_nested(model, serializer, ids):
+    """ Render tag or ingredient fragments """
+    return {
+        obj.id: render(serializer(obj).data)
+        for obj in model.objects.filter(id__in=ids)
+    }
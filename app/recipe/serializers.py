@@ -2,21 +2,33 @@
 Serializer for Recipe API
 """
 from rest_framework import serializers
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, Tag, Ingredient, normalize_name
 
 class IngredientSerializer(serializers.ModelSerializer):
     """ serializer for ingredients """
     class Meta:
         model = Ingredient
-        fields = ['id', 'name', 'quantity', 'scale']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'quantity', 'scale', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
+    def validate_name(self, value):
+        """ Store names the way they are matched """
+        return normalize_name(value)
+
+    def validate_scale(self, value):
+        """ Store scales the way they are matched """
+        return normalize_name(value)
 
 class TagSerializer(serializers.ModelSerializer):
     """ Serializer for tags """
     class Meta:
         model = Tag
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
+    def validate_name(self, value):
+        """ Store names the way they are matched """
+        return normalize_name(value)
 
 class RecipeSerializer(serializers.ModelSerializer):
     """ Serializer for recipe """
@@ -31,14 +43,20 @@ class RecipeSerializer(serializers.ModelSerializer):
         """ get or create tags """
         auth_user = self.context['request'].user
         for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(user=auth_user, **tag)
+            tag_obj, created = Tag.objects.get_or_create(
+                user=auth_user, name__iexact=tag['name'], defaults=tag
+            )
             recipe.tags.add(tag_obj)
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """ get or create ingredients """
         auth_user = self.context['request'].user
         for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(user=auth_user, **ingredient)
+            ingredient_obj, created = Ingredient.objects.get_or_create(
+                user=auth_user, name__iexact=ingredient['name'],
+                quantity=ingredient['quantity'],
+                scale__iexact=ingredient['scale'], defaults=ingredient,
+            )
             recipe.ingredients.add(ingredient_obj)
 
     def create(self, validated_data):
@@ -73,6 +91,83 @@ class RecipeDetailSerializer(RecipeSerializer):
     class Meta(RecipeSerializer.Meta):
         fields = RecipeSerializer.Meta.fields + ['description']
 
+class SimilarRecipeSerializer(RecipeSerializer):
+    """ Serializer for a recipe with its similarity score """
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['score']
+        read_only_fields = fields
+
+class ShoppingListItemSerializer(serializers.Serializer):
+    """ Serializer for a merged shopping list entry """
+    name = serializers.CharField()
+    quantity = serializers.FloatField()
+    scale = serializers.CharField()
+    recipes = serializers.IntegerField(
+        help_text='Number of recipes needing this ingredient.'
+    )
+
+class HistogramBinSerializer(serializers.Serializer):
+    """ Serializer for one histogram bucket """
+    start = serializers.FloatField()
+    end = serializers.FloatField()
+    count = serializers.IntegerField()
+
+class DistributionSerializer(serializers.Serializer):
+    """ Serializer for the distribution of a numeric recipe field """
+    min = serializers.FloatField(allow_null=True)
+    max = serializers.FloatField(allow_null=True)
+    mean = serializers.FloatField(allow_null=True)
+    percentiles = serializers.DictField(
+        child=serializers.FloatField(allow_null=True),
+        help_text='Nearest-rank p50, p90, p95 and p99.',
+    )
+    histogram = HistogramBinSerializer(many=True)
+
+class TagStatsSerializer(serializers.Serializer):
+    """ Serializer for the recipes of one tag """
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+    mean_price = serializers.FloatField()
+    mean_time_minutes = serializers.FloatField()
+
+class RecipeStatsSerializer(serializers.Serializer):
+    """ Serializer for statistics over a user's recipes """
+    count = serializers.IntegerField()
+    price = DistributionSerializer()
+    time_minutes = DistributionSerializer()
+    tags = TagStatsSerializer(many=True)
+
+class DuplicateSerializer(serializers.Serializer):
+    """ Serializer for a tag or ingredient merged into another """
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+
+class DuplicateClusterSerializer(serializers.Serializer):
+    """ Serializer for near-duplicate tags or ingredients """
+    id = serializers.IntegerField(help_text='ID of the one kept.')
+    name = serializers.CharField()
+    duplicates = DuplicateSerializer(
+        many=True, help_text='The ones merged into it.'
+    )
+
+class MergeSerializer(serializers.Serializer):
+    """ Serializer for merging tags or ingredients into one """
+    into = serializers.IntegerField(help_text='ID of the one to keep.')
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=100,
+        help_text='IDs of the ones merged into it and deleted.',
+    )
+
+    def validate(self, attrs):
+        if attrs['into'] in attrs['ids']:
+            raise serializers.ValidationError(
+                'Cannot merge an object into itself.'
+            )
+        return attrs
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """ serializer for uploading images """
     class Meta:
@@ -0,0 +1,80 @@
+"""
+Shopping list aggregation over the ingredients of many recipes
+"""
+from django.db.models import (
+    Case, CharField, Count, F, FloatField, Min, Sum, Value, When,
+)
+from django.db.models.functions import Lower, Trim
+
+from core.models import Recipe
+
+# Scale spellings mapped to (base unit, factor to the base unit)
+UNITS = {
+    'mg': ('g', 0.001),
+    'g': ('g', 1), 'gm': ('g', 1), 'gms': ('g', 1),
+    'gram': ('g', 1), 'grams': ('g', 1),
+    'kg': ('g', 1000), 'kgs': ('g', 1000),
+    'kilogram': ('g', 1000), 'kilograms': ('g', 1000),
+    'oz': ('g', 28.349523125), 'lb': ('g', 453.59237),
+    'lbs': ('g', 453.59237),
+    'ml': ('ml', 1), 'l': ('ml', 1000),
+    'litre': ('ml', 1000), 'litres': ('ml', 1000),
+    'liter': ('ml', 1000), 'liters': ('ml', 1000),
+    'tsp': ('ml', 4.92892159375), 'teaspoon': ('ml', 4.92892159375),
+    'tbsp': ('ml', 14.78676478125), 'tablespoon': ('ml', 14.78676478125),
+    'cup': ('ml', 236.5882365), 'cups': ('ml', 236.5882365),
+    '': ('piece', 1), 'pc': ('piece', 1), 'pcs': ('piece', 1),
+    'piece': ('piece', 1), 'pieces': ('piece', 1),
+}
+# Larger units a base unit total is shown in once it reaches them
+DISPLAY_UNITS = {'g': (1000, 'kg'), 'ml': (1000, 'l')}
+
+def shopping_list(recipes):
+    """
+        Return merged ingredient totals for a recipe queryset.
+
+        Ingredients are grouped by case-insensitive name and by unit
+        family, so '500 gm' and '1 kg' of rice become '1.5 kg'. Scales
+        that are not recognised are kept as they are. Everything is
+        computed in one grouped query.
+    """
+    scale = Lower(Trim('ingredient__scale'))
+    unit = Case(
+        *[When(scale_key=alias, then=Value(base))
+          for alias, (base, factor) in UNITS.items()],
+        default=F('scale_key'),
+        output_field=CharField(),
+    )
+    factor = Case(
+        *[When(scale_key=alias, then=Value(float(factor)))
+          for alias, (base, factor) in UNITS.items()],
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+    rows = Recipe.ingredients.through.objects.filter(
+        recipe__in=recipes.values('id'), ingredient__deleted_at__isnull=True
+    ).annotate(
+        name_key=Lower(Trim('ingredient__name')),
+        scale_key=scale,
+    ).annotate(unit=unit).values('name_key', 'unit').annotate(
+        name=Min('ingredient__name'),
+        total=Sum(
+            F('ingredient__quantity') * factor, output_field=FloatField()
+        ),
+        recipes=Count('recipe_id', distinct=True),
+    ).order_by('name_key', 'unit')
+
+    items = []
+    for row in rows:
+        quantity, scale = row['total'], row['unit']
+        if scale in DISPLAY_UNITS:
+            threshold, larger = DISPLAY_UNITS[scale]
+            if quantity >= threshold:
+                quantity, scale = quantity / threshold, larger
+        items.append({
+            'name': row['name'],
+            'quantity': round(quantity, 2),
+            'scale': scale,
+            'recipes': row['recipes'],
+        })
+    return items
@@ -0,0 +1,126 @@
+"""
+Statistics over a user's recipes computed in the database
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import (
+    Avg, Count, F, FloatField, IntegerField, Value,
+)
+from django.db.models.functions import Cast, Floor, Least
+
+from core.models import Recipe
+from core.versions import get_or_compute
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+DISTRIBUTIONS = ('price', 'time_minutes')
+
+def recipe_stats(user, bins=10):
+    """ Return the user's recipe statistics, cached until they change """
+    return get_or_compute(
+        'recipe-stats', 'user', user.pk, (bins,),
+        lambda: compute_stats(user, bins), settings.STATS_CACHE_TIMEOUT,
+    )
+
+def compute_stats(user, bins):
+    """
+        Compute count, distributions of price and time_minutes and a
+        breakdown by tag. Percentiles use the nearest-rank method: the
+        smallest value whose CUME_DIST() reaches the percentile.
+    """
+    summary = summarize(user)
+    stats = {'count': summary.pop('count')}
+    for field in DISTRIBUTIONS:
+        distribution = summary[field]
+        distribution['histogram'] = histogram(
+            user, field, distribution['min'], distribution['max'], bins
+        )
+        stats[field] = distribution
+    stats['tags'] = tag_breakdown(user)
+    return stats
+
+def summarize(user):
+    """ Return count, min, max, mean and percentiles in one query """
+    quote = connection.ops.quote_name
+    columns, params = ['COUNT(*)'], []
+    for field in DISTRIBUTIONS:
+        columns += [f'MIN({field})', f'MAX({field})', f'AVG({field})']
+        for fraction in PERCENTILES:
+            columns.append(
+                f'MIN(CASE WHEN {field}_rank >= %s THEN {field} END)'
+            )
+            params.append(fraction)
+    sql = (
+        'WITH ranked AS ('
+        ' SELECT price, time_minutes,'
+        ' CUME_DIST() OVER (ORDER BY price) AS price_rank,'
+        ' CUME_DIST() OVER (ORDER BY time_minutes) AS time_minutes_rank'
+        f' FROM {quote(Recipe._meta.db_table)}'
+        ' WHERE user_id = %s AND deleted_at IS NULL'
+        f') SELECT {", ".join(columns)} FROM ranked'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user.pk] + params)
+        row = list(cursor.fetchone())
+
+    summary = {'count': row.pop(0)}
+    for field in DISTRIBUTIONS:
+        values = [None if value is None else round(float(value), 2)
+                  for value in row[:3 + len(PERCENTILES)]]
+        del row[:3 + len(PERCENTILES)]
+        summary[field] = {
+            'min': values[0],
+            'max': values[1],
+            'mean': values[2],
+            'percentiles': {
+                f'p{round(fraction * 100)}': value
+                for fraction, value in zip(PERCENTILES, values[3:])
+            },
+        }
+    return summary
+
+def histogram(user, field, low, high, bins):
+    """ Count recipes in bins equal-width buckets between low and high """
+    if low is None:
+        return []
+    width = (high - low) / bins or 1
+    bucket = Least(
+        Cast(
+            Floor((Cast(F(field), FloatField()) - Value(low)) / Value(width)),
+            IntegerField(),
+        ),
+        Value(bins - 1),
+    )
+    counts = dict(
+        Recipe.objects.filter(user=user).annotate(bucket=bucket)
+        .values('bucket').annotate(count=Count('id'))
+        .values_list('bucket', 'count')
+    )
+    return [
+        {
+            'start': round(low + index * width, 2),
+            'end': round(low + (index + 1) * width, 2),
+            'count': counts.get(index, 0),
+        }
+        for index in range(bins if high > low else 1)
+    ]
+
+def tag_breakdown(user):
+    """ Return recipe count, mean price and mean time per tag """
+    rows = Recipe.tags.through.objects.filter(
+        recipe__user=user, recipe__deleted_at__isnull=True,
+        tag__deleted_at__isnull=True,
+    ).values('tag_id', 'tag__name').annotate(
+        count=Count('recipe_id'),
+        mean_price=Avg('recipe__price'),
+        mean_time_minutes=Avg('recipe__time_minutes'),
+    ).order_by('-count', 'tag__name')
+    return [
+        {
+            'id': row['tag_id'],
+            'name': row['tag__name'],
+            'count': row['count'],
+            'mean_price': round(float(row['mean_price']), 2),
+            'mean_time_minutes': round(float(row['mean_time_minutes']), 2),
+        }
+        for row in rows
+    ]
@@ -117,6 +117,7 @@ class PrivateIngredientAPITest(TestCase):
 
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
 
+        in1.refresh_from_db()
         s1 = IngredientSerializer(in1)
         s2 = IngredientSerializer(in2)
         self.assertIn(s1.data, res.data)
@@ -143,4 +144,52 @@ class PrivateIngredientAPITest(TestCase):
 
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data), 1)
+
+    def test_recipe_count_tracks_assignments(self):
+        """ Test recipe_count follows adding and removing recipes """
+        ing = create_ingredients(user=self.user)
+        recipe1 = Recipe.objects.create(
+            title='Momo',
+            time_minutes=40,
+            price=Decimal('3.00'),
+            user=self.user,
+        )
+        recipe2 = Recipe.objects.create(
+            title='Sel Roti',
+            time_minutes=30,
+            price=Decimal('2.00'),
+            user=self.user,
+        )
+        recipe1.ingredients.add(ing)
+        recipe2.ingredients.add(ing)
+        recipe1.ingredients.clear()
+
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+        recipe2.delete()
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res.data), 0)
+
+    def test_merge_ingredients(self):
+        """ Test merging ingredients moves their recipes over """
+        kept = create_ingredients(self.user, name='Maida')
+        other = create_ingredients(self.user, name='Flour')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Roti', time_minutes=20,
+            price=Decimal('1.00'),
+        )
+        recipe.ingredients.add(kept, other)
+
+        res = self.client.post(
+            reverse('recipe:ingredient-merge'),
+            {'into': kept.id, 'ids': [other.id]}, format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 1)
+        self.assertEqual(list(recipe.ingredients.all()), [kept])
+        self.assertFalse(Ingredient.objects.filter(id=other.id).exists())
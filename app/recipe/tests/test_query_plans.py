@@ -0,0 +1,161 @@
+"""
+Query plan regression tests for the hot recipe API queries
+"""
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import views
+from recipe.pagination import KeysetPagination
+
+USERS = 200
+RECIPES_PER_USER = 100
+ATTRS_PER_USER = 25
+
+def view_queryset(viewset, user, **params):
+    """ Return the list queryset a viewset builds for user """
+    request = Request(APIRequestFactory().get('/', params))
+    request.user = user
+    view = viewset(request=request, format_kwarg=None, action='list')
+    return view.get_queryset()
+
+def first_attrs(attrs, recipe_index, count=3):
+    """ Return the first tags or ingredients of a recipe's owner """
+    start = recipe_index // RECIPES_PER_USER * ATTRS_PER_USER
+    return attrs[start:start + count]
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'EXPLAIN plans are Postgres specific'
+)
+class QueryPlanTests(TestCase):
+    """ Test hot list queries are answered from indexes """
+
+    @classmethod
+    def setUpTestData(cls):
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f'plan{i}@example.com', name=f'plan{i}')
+            for i in range(USERS)
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f'tag{i}', recipe_count=i % 2)
+            for user in users for i in range(ATTRS_PER_USER)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(
+                user=user, name=f'ing{i}', quantity=i, scale='gm',
+                recipe_count=i % 2,
+            )
+            for user in users for i in range(ATTRS_PER_USER)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                user=user, title=f'recipe{i}', time_minutes=i,
+                price=Decimal(i % 50),
+            )
+            for user in users for i in range(RECIPES_PER_USER)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for index, recipe in enumerate(recipes)
+            for tag in first_attrs(tags, index)
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(
+                recipe_id=recipe.id, ingredient_id=ingredient.id
+            )
+            for index, recipe in enumerate(recipes)
+            for ingredient in first_attrs(ingredients, index)
+        )
+        with connection.cursor() as cursor:
+            for model in (Recipe, Tag, Ingredient):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+            for field in ('tags', 'ingredients'):
+                through = Recipe._meta.get_field(field).remote_field.through
+                cursor.execute(f'ANALYZE {through._meta.db_table}')
+        cls.user = users[USERS // 2]
+        cls.tag = tags[USERS // 2 * ATTRS_PER_USER]
+        cls.ingredient = ingredients[USERS // 2 * ATTRS_PER_USER]
+
+    def assertIndexScan(self, queryset, table):
+        """ Assert the plan reads table through an index """
+        plan = queryset.explain()
+        self.assertNotIn(f'Seq Scan on {table}', plan, plan)
+        self.assertIn('Index', plan, plan)
+
+    def test_recipe_list_uses_index(self):
+        """ Test recipe list is served by the (user, -id) index """
+        queryset = view_queryset(views.RecipeViewSet, self.user)
+
+        self.assertIndexScan(queryset, 'core_recipe ')
+
+    def test_recipe_orderings_use_index(self):
+        """ Test each ordering pages through its (user, key, id) index """
+        indexes = {
+            'id': 'recipe_user_id_live_idx',
+            'price': 'recipe_user_price_live_idx',
+            'time_minutes': 'recipe_user_time_live_idx',
+            'title': 'recipe_user_title_live_idx',
+        }
+        for ordering, (key, descending) in views.ORDERINGS.items():
+            for params in ({}, {'max_price': '10', 'max_time': '30'}):
+                queryset = view_queryset(
+                    views.RecipeViewSet, self.user,
+                    ordering=ordering, **params
+                )[:KeysetPagination.page_size + 1]
+
+                plan = queryset.explain()
+                self.assertIn(indexes[key], plan, plan)
+                self.assertNotIn('Sort', plan, plan)
+
+    def test_recipe_filter_by_tags_uses_index(self):
+        """ Test tag filter walks the through table by tag """
+        queryset = view_queryset(
+            views.RecipeViewSet, self.user, tags=str(self.tag.id)
+        )
+
+        self.assertIndexScan(queryset, 'core_recipe_tags')
+
+    def test_recipe_filter_by_ingredients_uses_index(self):
+        """ Test ingredient filter walks the through table by ingredient """
+        queryset = view_queryset(
+            views.RecipeViewSet, self.user, ingredients=str(self.ingredient.id)
+        )
+
+        self.assertIndexScan(queryset, 'core_recipe_ingredients')
+
+    def test_tag_list_uses_index(self):
+        """ Test tag list and assigned_only filter use indexes """
+        for params in ({}, {'assigned_only': 1}):
+            queryset = view_queryset(views.TagViewSet, self.user, **params)
+
+            self.assertIndexScan(queryset, 'core_tag')
+
+    def test_ingredient_list_uses_index(self):
+        """ Test ingredient list and assigned_only filter use indexes """
+        for params in ({}, {'assigned_only': 1}):
+            queryset = view_queryset(
+                views.IngredientViewSet, self.user, **params
+            )
+
+            self.assertIndexScan(queryset, 'core_ingredient')
+
+    def test_name_lookup_uses_unique_index(self):
+        """ Test get_or_create lookups by name use the unique indexes """
+        lookups = (
+            (Tag, 'tag_user_name_unique', {'name__iexact': 'TAG1'}),
+            (Ingredient, 'ingredient_user_name_unique', {
+                'name__iexact': 'ING1', 'quantity': 1, 'scale__iexact': 'GM',
+            }),
+        )
+        for model, index, lookup in lookups:
+            queryset = model.objects.filter(user=self.user, **lookup)
+
+            plan = queryset.explain()
+            self.assertIn(index, plan, plan)
@@ -1,20 +1,29 @@
 """
 Test for recipe api
 """
+import base64
+import json
+from datetime import timedelta
 from decimal import Decimal
 import tempfile
 import os
+from unittest.mock import patch
 
 from PIL import Image
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
+from core import similarity
+from core.models import Recipe, Tag, Ingredient, IdempotencyKey
+from core.tests.utils import run_in_process, shared_cache
 
 from recipe.serializers import (
     RecipeSerializer,
@@ -32,6 +41,17 @@ def image_upload_url(recipe_id):
     """ create and return image upload url """
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+STATS_URL = reverse('recipe:recipe-stats')
+
+def restore_url(recipe_id):
+    """ create and return recipe restore url """
+    return reverse('recipe:recipe-restore', args=[recipe_id])
+
+def similar_url(recipe_id):
+    """ create and return similar recipes url """
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
 def create_recipe(user, **params):
     """ Create and return a sample recipe """
     defaults = {
@@ -311,6 +331,30 @@ class PrivateRecipeAPITests(TestCase):
             ).exists()
             self.assertTrue(exists)
     
+    def test_create_recipe_matches_names_ignoring_case(self):
+        """ Test tags and ingredients are reused whatever their case """
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        rice = Ingredient.objects.create(
+            user=self.user, name='Basmati rice', quantity=200, scale='g'
+        )
+        payload = {
+            'title': 'Pulao',
+            'time_minutes': 30,
+            'price': Decimal('3.00'),
+            'tags': [{'name': ' vegan '}, {'name': 'VEGAN'}],
+            'ingredients': [
+                {'name': 'basmati  RICE', 'quantity': 200, 'scale': 'G'},
+            ],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(list(recipe.tags.all()), [vegan])
+        self.assertEqual(list(recipe.ingredients.all()), [rice])
+        self.assertEqual(Tag.objects.count(), 1)
+        self.assertEqual(Ingredient.objects.count(), 1)
+
     def test_create_recipe_with_existing_ingredients(self):
         """ Test creating a recipe with existing ingredients """
         ingre_salt = Ingredient.objects.create(user=self.user, name='Noon', quantity=1, scale='gm')
@@ -458,4 +502,744 @@ class ImageUploadTest(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
-        
\ No newline at end of file
+        
+class IdempotencyKeyTest(TestCase):
+    """ test Idempotency-Key support on recipe writes """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.payload = {
+            'title': 'Chicken Curry',
+            'time_minutes': 30,
+            'price': Decimal('5.50'),
+        }
+
+    def test_create_retry_replays_response(self):
+        """ Test retrying a create returns the first response """
+        res1 = self.client.post(
+            RECIPE_URL, self.payload, HTTP_IDEMPOTENCY_KEY='abc'
+        )
+        res2 = self.client.post(
+            RECIPE_URL, self.payload, HTTP_IDEMPOTENCY_KEY='abc'
+        )
+
+        self.assertEqual(res2.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.data, res1.data)
+        self.assertEqual(res2['Idempotent-Replayed'], 'true')
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_key_reused_for_other_request_error(self):
+        """ Test reusing a key with a different payload is rejected """
+        self.client.post(RECIPE_URL, self.payload, HTTP_IDEMPOTENCY_KEY='abc')
+        self.payload['title'] = 'Mutton Curry'
+
+        res = self.client.post(
+            RECIPE_URL, self.payload, HTTP_IDEMPOTENCY_KEY='abc'
+        )
+
+        self.assertEqual(
+            res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    def test_concurrent_duplicate_rejected(self):
+        """ Test a retry while the first request runs gets a conflict """
+        with patch('core.idempotency.request_fingerprint') as fingerprint:
+            fingerprint.return_value = 'f' * 64
+            IdempotencyKey.objects.create(
+                user=self.user, key='abc', fingerprint='f' * 64
+            )
+
+            res = self.client.post(
+                RECIPE_URL, self.payload, HTTP_IDEMPOTENCY_KEY='abc'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_abandoned_key_reclaimed(self):
+        """ Test a key left unfinished past its lease can be retried """
+        with patch('core.idempotency.request_fingerprint') as fingerprint:
+            fingerprint.return_value = 'f' * 64
+            claimed = IdempotencyKey.objects.create(
+                user=self.user, key='abc', fingerprint='f' * 64
+            )
+            IdempotencyKey.objects.filter(pk=claimed.pk).update(
+                created=timezone.now() - timedelta(
+                    seconds=settings.IDEMPOTENCY_KEY_LEASE + 1
+                )
+            )
+
+            res = self.client.post(
+                RECIPE_URL, self.payload, HTTP_IDEMPOTENCY_KEY='abc'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(
+            IdempotencyKey.objects.get(user=self.user).status_code, 201
+        )
+
+    def test_long_key_rejected(self):
+        """ Test keys longer than the stored column get 400 """
+        res = self.client.post(
+            RECIPE_URL, self.payload, HTTP_IDEMPOTENCY_KEY='k' * 256
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+class SimilarRecipesTest(TestCase):
+    """ test listing similar recipes """
+
+    def setUp(self):
+        cache.clear()
+        similarity._indexes.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dinner = Tag.objects.create(user=self.user, name='Dinner')
+        self.rice = Ingredient.objects.create(
+            user=self.user, name='Rice', quantity=200, scale='gm'
+        )
+        self.dal = create_recipe(user=self.user, title='Dal Bhat')
+        self.dal.tags.add(self.vegan, self.dinner)
+        self.dal.ingredients.add(self.rice)
+
+    def test_similar_recipes_ranked(self):
+        """ Test recipes sharing more tags and ingredients rank first """
+        close = create_recipe(user=self.user, title='Khichdi')
+        close.tags.add(self.vegan)
+        close.ingredients.add(self.rice)
+        far = create_recipe(user=self.user, title='Salad')
+        far.tags.add(self.vegan)
+        create_recipe(user=self.user, title='Steak')
+        other_user = create_user(email='other@example.com', password='test123')
+        other = create_recipe(user=other_user, title='Other Dal')
+        other.tags.add(
+            Tag.objects.create(user=other_user, name='Vegan')
+        )
+
+        res = self.client.get(similar_url(self.dal.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data], ['Khichdi', 'Salad']
+        )
+        self.assertGreater(res.data[0]['score'], res.data[1]['score'])
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Vegan')
+
+    def test_similar_follows_m2m_changes(self):
+        """ Test tag and ingredient changes update the similarity index """
+        khichdi = create_recipe(user=self.user, title='Khichdi')
+        self.client.get(similar_url(self.dal.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            khichdi.ingredients.add(self.rice)
+        res = self.client.get(similar_url(self.dal.id))
+        self.assertEqual([recipe['id'] for recipe in res.data], [khichdi.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            khichdi.delete()
+        res = self.client.get(similar_url(self.dal.id))
+        self.assertEqual(res.data, [])
+
+    def test_similar_invalid_params(self):
+        """ Test bad k and metric values are rejected """
+        for params in ({'k': 0}, {'k': 'ten'}, {'metric': 'euclid'}):
+            res = self.client.get(similar_url(self.dal.id), params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_similar_other_users_recipe_not_found(self):
+        """ Test another user's recipe cannot be used as the query """
+        other_user = create_user(email='other@example.com', password='test123')
+        other = create_recipe(user=other_user)
+
+        res = self.client.get(similar_url(other.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+class ShoppingListTest(TestCase):
+    """ test the aggregated shopping list """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.dal = create_recipe(user=self.user, title='Dal Bhat')
+        self.khichdi = create_recipe(user=self.user, title='Khichdi')
+        self.salad = create_recipe(user=self.user, title='Salad')
+
+    def add_ingredient(self, recipe, name, quantity, scale):
+        """ Create an ingredient and add it to recipe """
+        ingredient = Ingredient.objects.create(
+            user=self.user, name=name, quantity=quantity, scale=scale
+        )
+        recipe.ingredients.add(ingredient)
+        return ingredient
+
+    def test_totals_merged_across_compatible_scales(self):
+        """ Test quantities are summed per name and unit family """
+        self.add_ingredient(self.dal, 'Rice', 500, 'gm')
+        self.add_ingredient(self.khichdi, 'rice ', 1, 'KG')
+        self.add_ingredient(self.dal, 'Ghee', 2, 'tbsp')
+        self.add_ingredient(self.khichdi, 'Ghee', 1, 'tsp')
+        self.add_ingredient(self.dal, 'Onion', 2, 'piece')
+        self.add_ingredient(self.khichdi, 'Onion', 100, 'gm')
+        self.add_ingredient(self.salad, 'Lettuce', 1, 'head')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(SHOPPING_LIST_URL, {
+                'recipes': f'{self.dal.id},{self.khichdi.id}'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'name': 'Ghee', 'quantity': 34.5, 'scale': 'ml', 'recipes': 2},
+            {'name': 'Onion', 'quantity': 100.0, 'scale': 'g', 'recipes': 1},
+            {'name': 'Onion', 'quantity': 2.0, 'scale': 'piece',
+             'recipes': 1},
+            {'name': 'Rice', 'quantity': 1.5, 'scale': 'kg', 'recipes': 2},
+        ])
+
+    def test_shared_ingredient_counted_per_recipe(self):
+        """ Test an ingredient used by two recipes is bought twice """
+        rice = self.add_ingredient(self.dal, 'Rice', 200, 'gm')
+        self.khichdi.ingredients.add(rice)
+
+        res = self.client.get(SHOPPING_LIST_URL, {
+            'recipes': f'{self.dal.id},{self.khichdi.id}'
+        })
+
+        self.assertEqual(res.data[0]['quantity'], 400)
+
+    def test_filter_by_tags(self):
+        """ Test recipes can be selected with a tag filter """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.salad.tags.add(tag)
+        self.add_ingredient(self.salad, 'Lettuce', 1, 'head')
+        self.add_ingredient(self.dal, 'Rice', 200, 'gm')
+
+        res = self.client.get(SHOPPING_LIST_URL, {'tags': str(tag.id)})
+
+        self.assertEqual(
+            [item['name'] for item in res.data], ['Lettuce']
+        )
+        self.assertEqual(res.data[0]['scale'], 'head')
+
+    def test_other_users_recipes_ignored(self):
+        """ Test recipes of other users are never included """
+        other_user = create_user(email='other@example.com', password='test123')
+        other = create_recipe(user=other_user)
+        other.ingredients.add(Ingredient.objects.create(
+            user=other_user, name='Rice', quantity=1, scale='kg'
+        ))
+
+        res = self.client.get(SHOPPING_LIST_URL, {'recipes': str(other.id)})
+
+        self.assertEqual(res.data, [])
+
+    def test_selection_required(self):
+        """ Test a recipe selection is required and must be valid """
+        for params in ({}, {'recipes': 'a,b'}):
+            res = self.client.get(SHOPPING_LIST_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+class RecipeFacetsTest(TestCase):
+    """ test facet counts on the recipe list """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dinner = Tag.objects.create(user=self.user, name='Dinner')
+        self.rice = Ingredient.objects.create(
+            user=self.user, name='Rice', quantity=200, scale='gm'
+        )
+        self.dal = create_recipe(user=self.user, title='Dal Bhat')
+        self.dal.tags.add(self.vegan, self.dinner)
+        self.dal.ingredients.add(self.rice)
+        self.salad = create_recipe(user=self.user, title='Salad')
+        self.salad.tags.add(self.vegan)
+        self.steak = create_recipe(user=self.user, title='Steak')
+        self.steak.tags.add(self.dinner)
+
+    def test_facets_over_filtered_list(self):
+        """ Test each facet is counted with the other facets' filters """
+        res = self.client.get(RECIPE_URL, {
+            'facets': 'tags,ingredients',
+            'ingredients': str(self.rice.id),
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data['results']], ['Dal Bhat']
+        )
+        self.assertEqual(res.data['facets']['tags'], [
+            {'id': self.dinner.id, 'name': 'Dinner', 'count': 1},
+            {'id': self.vegan.id, 'name': 'Vegan', 'count': 1},
+        ])
+        self.assertEqual(res.data['facets']['ingredients'], [
+            {'id': self.rice.id, 'name': 'Rice', 'count': 1},
+        ])
+
+        res = self.client.get(RECIPE_URL, {'facets': 'tags'})
+        self.assertEqual(
+            [
+                (tag['name'], tag['count'])
+                for tag in res.data['facets']['tags']
+            ],
+            [('Dinner', 2), ('Vegan', 2)],
+        )
+
+    def test_facets_cached_until_write(self):
+        """ Test facet counts are cached and expire on recipe changes """
+        params = {'facets': 'tags'}
+        self.client.get(RECIPE_URL, params)
+
+        with patch('recipe.facets.count_facet') as count_facet:
+            res = self.client.get(RECIPE_URL, params)
+        count_facet.assert_not_called()
+        self.assertEqual(len(res.data['facets']['tags']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salad.tags.add(self.dinner)
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.data['facets']['tags'][0], {
+            'id': self.dinner.id, 'name': 'Dinner', 'count': 3,
+        })
+
+    def test_list_without_facets_unchanged(self):
+        """ Test the list stays a plain array without facets """
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data), 3)
+
+    def test_unknown_facet_rejected(self):
+        """ Test unknown facet names are rejected """
+        res = self.client.get(RECIPE_URL, {'facets': 'price'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+class RecipeStatsTest(TestCase):
+    """ test recipe statistics """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        for price in range(1, 11):
+            recipe = create_recipe(
+                user=self.user, time_minutes=price * 10,
+                price=Decimal(price),
+            )
+            if price <= 4:
+                recipe.tags.add(self.vegan)
+        other_user = create_user(email='other@example.com', password='test123')
+        create_recipe(user=other_user, price=Decimal('99.00'))
+
+    def test_stats(self):
+        """ Test distributions and tag breakdown of the user's recipes """
+        res = self.client.get(STATS_URL, {'bins': 3})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 10)
+        price = res.data['price']
+        self.assertEqual((price['min'], price['max']), (1.0, 10.0))
+        self.assertEqual(price['mean'], 5.5)
+        self.assertEqual(price['percentiles'], {
+            'p50': 5.0, 'p90': 9.0, 'p95': 10.0, 'p99': 10.0,
+        })
+        self.assertEqual(
+            [bucket['count'] for bucket in price['histogram']], [3, 3, 4]
+        )
+        self.assertEqual(price['histogram'][0]['start'], 1.0)
+        self.assertEqual(price['histogram'][-1]['end'], 10.0)
+        self.assertEqual(res.data['time_minutes']['percentiles']['p50'], 50)
+        self.assertEqual(res.data['tags'], [{
+            'id': self.vegan.id, 'name': 'Vegan', 'count': 4,
+            'mean_price': 2.5, 'mean_time_minutes': 25.0,
+        }])
+
+    def test_stats_empty(self):
+        """ Test stats of a user without recipes """
+        self.client.force_authenticate(
+            create_user(email='new@example.com', password='test123')
+        )
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['count'], 0)
+        self.assertIsNone(res.data['price']['min'])
+        self.assertEqual(res.data['price']['histogram'], [])
+
+    def test_stats_cached_until_write(self):
+        """ Test stats are served from cache until a recipe changes """
+        self.client.get(STATS_URL)
+
+        with self.assertNumQueries(0):
+            self.client.get(STATS_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(user=self.user, price=Decimal('20.00'))
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['count'], 11)
+
+    def test_invalid_bins(self):
+        """ Test bins outside the allowed range are rejected """
+        res = self.client.get(STATS_URL, {'bins': 0})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+class RecipeOrderingTest(TestCase):
+    """ test recipe ordering, range filters and keyset pagination """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            create_recipe(
+                user=self.user, title=title, price=Decimal(price),
+                time_minutes=minutes,
+            )
+            for title, price, minutes in [
+                ('Dal', '2.00', 30), ('Curry', '8.00', 45),
+                ('Momo', '5.00', 60), ('Salad', '5.00', 10),
+                ('Soup', '3.50', 20),
+            ]
+        ]
+
+    def titles(self, data):
+        return [recipe['title'] for recipe in data]
+
+    def test_orderings(self):
+        """ Test each supported ordering sorts with id as tie-breaker """
+        expected = {
+            'price': ['Dal', 'Soup', 'Momo', 'Salad', 'Curry'],
+            '-price': ['Curry', 'Salad', 'Momo', 'Soup', 'Dal'],
+            'time_minutes': ['Salad', 'Soup', 'Dal', 'Curry', 'Momo'],
+            '-title': ['Soup', 'Salad', 'Momo', 'Dal', 'Curry'],
+            'created': ['Dal', 'Curry', 'Momo', 'Salad', 'Soup'],
+        }
+        for ordering, titles in expected.items():
+            res = self.client.get(RECIPE_URL, {'ordering': ordering})
+
+            self.assertEqual(self.titles(res.data), titles, ordering)
+
+    def test_unsupported_ordering_rejected(self):
+        """ Test orderings without a backing index are rejected """
+        res = self.client.get(RECIPE_URL, {'ordering': 'description'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_range_filters(self):
+        """ Test price and time ranges filter the list """
+        res = self.client.get(RECIPE_URL, {
+            'min_price': '3', 'max_price': '5.00', 'max_time': 30,
+            'ordering': 'price',
+        })
+
+        self.assertEqual(self.titles(res.data), ['Soup', 'Salad'])
+
+        res = self.client.get(RECIPE_URL, {'max_price': 'cheap'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_keyset_pagination(self):
+        """ Test pages follow the cursor without gaps across ties """
+        params = {'ordering': '-price', 'page_size': 2}
+        titles = []
+        res = self.client.get(RECIPE_URL, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            titles += self.titles(res.data['results'])
+            if res.data['next'] is None:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            titles, ['Curry', 'Salad', 'Momo', 'Soup', 'Dal']
+        )
+
+    def test_invalid_cursor_rejected(self):
+        """ Test a malformed cursor is rejected """
+        res = self.client.get(RECIPE_URL, {'cursor': 'garbage'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_values_of_wrong_type_rejected(self):
+        """ Test a well formed cursor with values of the wrong type """
+        for ordering, value, last_id in (
+            ('title', ['Dal'], 1),
+            ('time_minutes', {'gt': 1}, 1),
+            ('price', 'NaN', 1),
+            ('-created', True, 1),
+            ('title', 'Dal', [1]),
+        ):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps([value, last_id]).encode()
+            ).decode()
+
+            res = self.client.get(
+                RECIPE_URL, {'ordering': ordering, 'cursor': cursor}
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+class RecipeFragmentCacheTest(TestCase):
+    """ test recipe payloads assembled from cached fragments """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+            self.recipe = create_recipe(self.user, title='Dal')
+            self.recipe.tags.add(self.vegan)
+            self.recipe.ingredients.add(Ingredient.objects.create(
+                user=self.user, name='Lentils', quantity=200, scale='g'
+            ))
+
+    def test_detail_cached(self):
+        """ Test a repeated detail GET only checks the recipe exists """
+        res = self.client.get(detail_url(self.recipe.id))
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(res.data, RecipeDetailSerializer(
+            self.recipe, context={'request': res.wsgi_request}
+        ).data)
+
+    def test_list_cached(self):
+        """ Test a repeated list GET only fetches the recipe IDs """
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.user, title='Momo')
+        res = self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPE_URL)
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data], ['Momo', 'Dal']
+        )
+        self.assertEqual(res.data[1]['tags'][0]['name'], 'Vegan')
+
+    def test_update_expires_recipe(self):
+        """ Test saving a recipe or its tags changes the cached payload """
+        self.client.get(detail_url(self.recipe.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url(self.recipe.id), {'title': 'Daal'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vegan.name = 'Plant based'
+            self.vegan.save()
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.data['title'], 'Daal')
+        self.assertEqual(res.data['tags'][0]['name'], 'Plant based')
+
+    def test_recipe_count_expires_tag(self):
+        """ Test tagging another recipe updates the shared tag fragment """
+        self.client.get(detail_url(self.recipe.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.user, title='Momo').tags.add(self.vegan)
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.data['tags'][0]['recipe_count'], 2)
+
+    def test_uncommitted_writes_bypass_cache(self):
+        """ Test a transaction reads its own writes before they commit """
+        self.client.get(detail_url(self.recipe.id))
+
+        self.recipe.title = 'Daal'
+        self.recipe.save()
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.data['title'], 'Daal')
+
+@shared_cache()
+class RecipeSharedCacheTest(TestCase):
+    """ test cached payloads follow writes handled by other processes """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = create_recipe(self.user, title='Dal')
+
+    def bump_in_other_process(self, scope, ident):
+        """ Bump a version as the worker handling a write would """
+        run_in_process(
+            'from core.versions import bump_version\n'
+            f'bump_version({scope!r}, {ident})'
+        )
+
+    def test_write_in_other_process_expires_fragment(self):
+        """ Test a version bumped by another worker is seen at once """
+        self.client.get(detail_url(self.recipe.id))
+        with self.assertNumQueries(1):
+            self.client.get(detail_url(self.recipe.id))
+        # The row as committed by a write handled in another worker
+        Recipe.objects.filter(id=self.recipe.id).update(title='Daal')
+
+        self.bump_in_other_process('recipe', self.recipe.id)
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.data['title'], 'Daal')
+
+    def test_write_in_other_process_expires_facets(self):
+        """ Test facet counts follow a write handled by another worker """
+        params = {'facets': 'tags'}
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.data['facets']['tags'], [])
+        # Tagged by another worker, which bumps the user's version
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.through.objects.create(recipe=self.recipe, tag=tag)
+
+        self.bump_in_other_process('user', self.user.id)
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(
+            [
+                (tag['name'], tag['count'])
+                for tag in res.data['facets']['tags']
+            ],
+            [('Vegan', 1)],
+        )
+
+    def test_write_in_other_process_expires_stats(self):
+        """ Test stats follow a write handled by another worker """
+        self.assertEqual(self.client.get(STATS_URL).data['count'], 1)
+        Recipe.objects.filter(id=self.recipe.id).update(
+            deleted_at=timezone.now()
+        )
+
+        self.bump_in_other_process('user', self.user.id)
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['count'], 0)
+
+class RecipeSoftDeleteTest(TestCase):
+    """ test soft deleting and restoring recipes """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.lentils = Ingredient.objects.create(
+            user=self.user, name='Lentils', quantity=200, scale='g'
+        )
+        self.recipe = create_recipe(self.user, title='Dal', price=Decimal('2'))
+        self.recipe.tags.add(self.vegan)
+        self.recipe.ingredients.add(self.lentils)
+        create_recipe(self.user, title='Momo', price=Decimal('4'))
+
+    def delete_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.delete(detail_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_delete_hides_recipe(self):
+        """ Test a deleted recipe is kept but no longer served """
+        self.delete_recipe()
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual([recipe['title'] for recipe in res.data], ['Momo'])
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        recipe = Recipe.all_objects.get(id=self.recipe.id)
+        self.assertIsNotNone(recipe.deleted_at)
+        self.assertEqual(recipe.tags.count(), 1)
+        self.vegan.refresh_from_db()
+        self.assertEqual(self.vegan.recipe_count, 0)
+
+    def test_restore_recipe(self):
+        """ Test restoring brings the recipe and its counts back """
+        self.delete_recipe()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(restore_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Dal')
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['tags'][0]['recipe_count'], 1)
+        self.lentils.refresh_from_db()
+        self.assertEqual(self.lentils.recipe_count, 1)
+
+    def test_restore_live_or_other_users_recipe_not_found(self):
+        """ Test only the user's deleted recipes can be restored """
+        res = self.client.post(restore_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        other = create_user(email='other@example.com', password='test123')
+        recipe = create_recipe(other)
+        recipe.soft_delete()
+        res = self.client.post(restore_url(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deleted_recipes_excluded_from_aggregates(self):
+        """ Test stats, facets and the shopping list skip deleted recipes """
+        self.delete_recipe()
+
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['count'], 1)
+        self.assertEqual(res.data['price']['max'], 4.0)
+        self.assertEqual(res.data['tags'], [])
+        res = self.client.get(RECIPE_URL, {'facets': 'tags'})
+        self.assertEqual(res.data['facets']['tags'], [])
+        res = self.client.get(SHOPPING_LIST_URL, {'recipes': self.recipe.id})
+        self.assertEqual(res.data, [])
+
+    def test_deleted_tag_hidden_from_recipe(self):
+        """ Test a deleted tag drops out of recipes until restored """
+        tag_url = reverse('recipe:tag-detail', args=[self.vegan.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(tag_url)
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['tags'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                reverse('recipe:tag-restore', args=[self.vegan.id])
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegan')
+
+    def test_restored_tag_shown_on_recipe_cached_meanwhile(self):
+        """ Test restoring a tag expires recipes cached while it was gone """
+        tag_url = reverse('recipe:tag-detail', args=[self.vegan.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(tag_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url(self.recipe.id), {'title': 'Tadka'})
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['tags'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('recipe:tag-restore', args=[self.vegan.id])
+            )
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegan')
+        res = self.client.get(RECIPE_URL)
+        listed = next(r for r in res.data if r['id'] == self.recipe.id)
+        self.assertEqual(listed['tags'][0]['name'], 'Vegan')
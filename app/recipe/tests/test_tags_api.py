@@ -20,6 +20,9 @@ def detail_url(tag_id):
     """ Create and return tag detail URL """
     return reverse('recipe:tag-detail', args=[tag_id])
 
+DUPLICATES_URL = reverse('recipe:tag-duplicates')
+MERGE_URL = reverse('recipe:tag-merge')
+
 def create_user(email="test@example.com", password="testpass123"):
     """ Create and return a user """
     return get_user_model().objects.create_user(email, password)
@@ -104,6 +107,7 @@ class PrivateTagsAPITest(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
+        tag1.refresh_from_db()
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
         self.assertIn(s1.data, res.data)
@@ -130,4 +134,110 @@ class PrivateTagsAPITest(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data), 1)
+
+    def test_recipe_count_tracks_reverse_assignments(self):
+        """ Test recipe_count when recipes are linked from the tag side """
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe1 = Recipe.objects.create(
+            title='Pancakes',
+            time_minutes=5,
+            price=Decimal('5.00'),
+            user=self.user,
+        )
+        recipe2 = Recipe.objects.create(
+            title='Porridge',
+            time_minutes=3,
+            price=Decimal('2.00'),
+            user=self.user,
+        )
+        tag.recipe_set.add(recipe1, recipe2)
+        tag.recipe_set.remove(recipe1)
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+    def test_rename_to_existing_name_rejected(self):
+        """ Test a tag cannot be renamed to another tag's name """
+        Tag.objects.create(user=self.user, name='Vegan')
+        tag = Tag.objects.create(user=self.user, name='Plant based')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'VEGAN '})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Plant based')
+
+    def test_restore_clashing_tag_rejected(self):
+        """ Test restoring a tag whose name was taken meanwhile fails """
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag.soft_delete()
+        Tag.objects.create(user=self.user, name='vegan')
+
+        res = self.client.post(reverse('recipe:tag-restore', args=[tag.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.filter(id=tag.id).exists())
+
+    def test_list_and_merge_duplicates(self):
+        """ Test near-duplicate tags are listed, then merged """
+        kept = Tag.objects.create(user=self.user, name='Gluten free')
+        dashed = Tag.objects.create(user=self.user, name='Gluten-Free')
+        Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Dal', time_minutes=20,
+            price=Decimal('2.00'),
+        )
+        recipe.tags.add(kept, dashed)
+        expected = [{
+            'id': kept.id, 'name': 'Gluten free',
+            'duplicates': [{'id': dashed.id, 'name': 'Gluten-Free'}],
+        }]
+
+        res = self.client.get(DUPLICATES_URL)
+        self.assertEqual(res.data, expected)
+        self.assertTrue(Tag.objects.filter(id=dashed.id).exists())
+
+        res = self.client.post(DUPLICATES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, expected)
+        self.assertFalse(Tag.objects.filter(id=dashed.id).exists())
+        self.assertEqual(list(recipe.tags.all()), [kept])
+        self.assertEqual(self.client.get(DUPLICATES_URL).data, [])
+
+    def test_merge_tags(self):
+        """ Test merging chosen tags into one """
+        veg = Tag.objects.create(user=self.user, name='Veg')
+        vegetarian = Tag.objects.create(user=self.user, name='Vegetarian')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Dal', time_minutes=20,
+            price=Decimal('2.00'),
+        )
+        recipe.tags.add(veg)
+
+        res = self.client.post(
+            MERGE_URL, {'into': vegetarian.id, 'ids': [veg.id]}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 1)
+        self.assertEqual(list(recipe.tags.all()), [vegetarian])
+        self.assertFalse(Tag.all_objects.filter(id=veg.id).exists())
+
+    def test_merge_invalid_tags_rejected(self):
+        """ Test merging needs live tags of the user and two of them """
+        tag = Tag.objects.create(user=self.user, name='Veg')
+        other = Tag.objects.create(
+            user=create_user('ram@email.com'), name='Veg'
+        )
+
+        for payload, code in (
+            ({'into': tag.id, 'ids': [tag.id]}, status.HTTP_400_BAD_REQUEST),
+            ({'into': tag.id, 'ids': [other.id]}, status.HTTP_400_BAD_REQUEST),
+            ({'into': other.id, 'ids': [tag.id]}, status.HTTP_404_NOT_FOUND),
+        ):
+            res = self.client.post(MERGE_URL, payload, format='json')
+
+            self.assertEqual(res.status_code, code)
+        self.assertEqual(Tag.objects.count(), 2)
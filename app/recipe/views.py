@@ -1,21 +1,62 @@
 """
 View for recipe
 """
-from drf_spectacular.utils import (
-    extend_schema_view,
-    extend_schema,
-    OpenApiParameter,
-    OpenApiTypes,
-)
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
 
 from rest_framework import viewsets, mixins, status
+from rest_framework.generics import get_object_or_404
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core import dedupe
+from core.annotations import (
+    extend_schema_view,
+    extend_schema,
+    OpenApiParameter,
+    OpenApiTypes,
+)
+from core.fragments import FragmentJSONRenderer
+from core.idempotency import idempotent
+from core.metrics import IMAGE_UPLOADS_IN_PROGRESS
 from core.models import Recipe, Tag, Ingredient
 from recipe import serializers
+from recipe.facets import FACETS, facet_counts
+from recipe.pagination import ORDERINGS, KeysetPagination, order_by
+from recipe.payloads import recipe_payloads
+from recipe.shopping import shopping_list
+from recipe.stats import recipe_stats
+
+NAME_TAKEN = 'You already have one with this name, merge them instead.'
+
+class SoftDeleteMixin:
+    """ Soft delete on DELETE and a restore action for deleted objects """
+
+    def perform_destroy(self, instance):
+        instance.soft_delete()
+
+    @extend_schema(request=None)
+    @action(methods=['POST'], detail=True)
+    def restore(self, request, pk=None):
+        """ Restore an object deleted within the retention period """
+        model = self.queryset.model
+        instance = get_object_or_404(
+            model.all_objects.filter(
+                user=request.user, deleted_at__isnull=False
+            ),
+            pk=pk,
+        )
+        try:
+            with transaction.atomic():
+                instance.restore()
+        except IntegrityError:
+            raise ValidationError({'name': [NAME_TAKEN]})
+        return Response(self.get_serializer(instance).data)
 
 @extend_schema_view(
     list=extend_schema(
@@ -30,20 +71,59 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
             ),
+            OpenApiParameter(
+                'facets',
+                OpenApiTypes.STR,
+                description='Comma separated facets (tags, ingredients) to '
+                            'count. Adds a facets block to the response.',
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=list(ORDERINGS),
+                description='Sort order, newest first by default.',
+            ),
+            OpenApiParameter('min_price', OpenApiTypes.DECIMAL),
+            OpenApiParameter('max_price', OpenApiTypes.DECIMAL),
+            OpenApiParameter('min_time', OpenApiTypes.INT),
+            OpenApiParameter('max_time', OpenApiTypes.INT),
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SoftDeleteMixin, viewsets.ModelViewSet):
     """ Viewset for mamaging recipe apis """
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     authentication_classes=[TokenAuthentication]
     permission_classes=[IsAuthenticated]
+    pagination_class = KeysetPagination
+    renderer_classes = [FragmentJSONRenderer, BrowsableAPIRenderer]
+    throttle_scope = None
+    # Range parameter -> (lookup, type)
+    range_filters = {
+        'min_price': ('price__gte', Decimal),
+        'max_price': ('price__lte', Decimal),
+        'min_time': ('time_minutes__gte', int),
+        'max_time': ('time_minutes__lte', int),
+    }
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers."""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _range_lookups(self):
+        """ Return the ORM lookups of the range query parameters """
+        lookups = {}
+        for param, (lookup, cast) in self.range_filters.items():
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                lookups[lookup] = cast(value)
+            except (ValueError, ArithmeticError):
+                raise ValidationError({param: 'Must be a number.'})
+        return lookups
+
     def get_queryset(self):
         """ Retrieve recipes for authed user """
         tags = self.request.query_params.get('tags')
@@ -55,10 +135,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-        
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()
+        if tags or ingredients:
+            # Only the M2M joins can repeat a recipe, DISTINCT would
+            # otherwise force a sort instead of an ordered index scan
+            queryset = queryset.distinct()
+
+        return order_by(queryset.filter(
+            user=self.request.user, **self._range_lookups()
+        ), self.request)
 
     def get_serializer_class(self):
         """ return the serializer class for request """
@@ -66,14 +150,87 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'similar':
+            return serializers.SimilarRecipeSerializer
 
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        """
+            List recipes assembled from cached fragments, with facet
+            counts when facets are requested
+        """
+        facets = request.query_params.get('facets')
+        if facets:
+            names = facets.split(',')
+            unknown = set(names) - set(FACETS)
+            if unknown:
+                raise ValidationError({
+                    'facets': f"Unknown facets: {', '.join(sorted(unknown))}."
+                })
+            try:
+                filters = {
+                    name: self._params_to_ints(request.query_params[name])
+                    for name in FACETS if request.query_params.get(name)
+                }
+            except ValueError:
+                raise ValidationError('IDs must be comma separated integers.')
+
+        # Only the columns the ordering and its cursor need
+        queryset = self.filter_queryset(self.get_queryset()).only(
+            *{key for key, descending in ORDERINGS.values()}
+        )
+        page = self.paginate_queryset(queryset)
+        recipes = queryset if page is None else page
+        data = recipe_payloads(
+            request, [recipe.id for recipe in recipes],
+            self.get_serializer_class(),
+        )
+        if page is None:
+            response = Response(data)
+        else:
+            response = self.get_paginated_response(data)
+
+        if facets:
+            if not isinstance(response.data, dict):
+                response.data = {'results': response.data}
+            response.data['facets'] = facet_counts(
+                request.user, filters, names, self._range_lookups()
+            )
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """ Return the recipe assembled from cached fragments """
+        recipe = self.get_object()
+        payloads = recipe_payloads(
+            request, [recipe.id], self.get_serializer_class()
+        )
+        if not payloads:
+            raise NotFound()
+        return Response(payloads[0])
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        """ Create recipe, replayable with an Idempotency-Key """
+        return super().create(request, *args, **kwargs)
+
+    @idempotent
+    def update(self, request, *args, **kwargs):
+        """ Update recipe, replayable with an Idempotency-Key """
+        return super().update(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """ Create new recipes """
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @action(
+        methods=['POST'],
+        detail=True,
+        url_path='upload-image',
+        throttle_scope='uploads',
+    )
+    @IMAGE_UPLOADS_IN_PROGRESS.track_inprogress()
+    @idempotent
     def upload_image(self, request, pk=None):
         """ upload an image to recipe """
         recipe = self.get_object()
@@ -85,6 +242,114 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'recipes',
+                OpenApiTypes.STR,
+                description='Comma separated list of recipe IDs to shop for',
+            ),
+            OpenApiParameter(
+                'tags',
+                OpenApiTypes.STR,
+                description='Comma separated list of tag IDs to filter',
+            ),
+        ],
+        responses=serializers.ShoppingListItemSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        """ Merge the ingredients of the selected recipes """
+        recipe_ids = request.query_params.get('recipes')
+        if not recipe_ids and not request.query_params.get('tags'):
+            raise ValidationError(
+                {'recipes': 'Select recipes by ID or filter by tags.'}
+            )
+        try:
+            queryset = self.get_queryset()
+            if recipe_ids:
+                queryset = queryset.filter(
+                    id__in=self._params_to_ints(recipe_ids)
+                )
+        except ValueError:
+            raise ValidationError('IDs must be comma separated integers.')
+
+        serializer = serializers.ShoppingListItemSerializer(
+            shopping_list(queryset), many=True
+        )
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'bins', OpenApiTypes.INT,
+                description='Histogram buckets, 1 to 50 (default 10).',
+            ),
+        ],
+        responses=serializers.RecipeStatsSerializer,
+    )
+    @action(methods=['GET'], detail=False)
+    def stats(self, request):
+        """ Summarize prices, cooking times and tags of all recipes """
+        try:
+            bins = int(request.query_params.get('bins', 10))
+        except ValueError:
+            raise ValidationError({'bins': 'Must be an integer.'})
+        if not 1 <= bins <= 50:
+            raise ValidationError({'bins': 'Must be between 1 and 50.'})
+
+        serializer = serializers.RecipeStatsSerializer(
+            recipe_stats(request.user, bins)
+        )
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'k', OpenApiTypes.INT,
+                description=(
+                    'Number of similar recipes, 1 to 100 (default 10).'
+                ),
+            ),
+            OpenApiParameter(
+                'metric', OpenApiTypes.STR, enum=['cosine', 'jaccard'],
+                description='Similarity over shared tags and ingredients.',
+            ),
+        ],
+        responses=serializers.SimilarRecipeSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """ List the recipes sharing the most tags and ingredients """
+        from core import similarity
+
+        recipe = self.get_object()
+        try:
+            k = int(request.query_params.get('k', 10))
+        except ValueError:
+            raise ValidationError({'k': 'Must be an integer.'})
+        if not 1 <= k <= 100:
+            raise ValidationError({'k': 'Must be between 1 and 100.'})
+        metric = request.query_params.get('metric', 'cosine')
+        if metric not in similarity.METRICS:
+            raise ValidationError(
+                {'metric': f"Must be one of {', '.join(similarity.METRICS)}."}
+            )
+
+        matches = similarity.similar_recipes(
+            request.user.id, recipe.id, k, metric
+        )
+        found = Recipe.objects.prefetch_related(
+            'tags', 'ingredients'
+        ).in_bulk([recipe_id for recipe_id, score in matches])
+        recipes = []
+        for recipe_id, score in matches:
+            if recipe_id in found:
+                found[recipe_id].score = score
+                recipes.append(found[recipe_id])
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
 @extend_schema_view(
     list=extend_schema(
         parameters=[
@@ -96,7 +361,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(SoftDeleteMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin, 
                             mixins.ListModelMixin, 
                             viewsets.GenericViewSet):
@@ -111,11 +377,64 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by('-name')
+
+    def perform_update(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'name': [NAME_TAKEN]})
+
+    @extend_schema(
+        request=None,
+        responses=serializers.DuplicateClusterSerializer(many=True),
+    )
+    @action(methods=['GET', 'POST'], detail=False)
+    def duplicates(self, request):
+        """
+            List clusters of near-duplicate names such as "Gluten-free"
+            and "gluten free". POST merges each into its most used one.
+        """
+        model = self.queryset.model
+        if request.method == 'POST':
+            clusters = dedupe.merge_duplicates(model, request.user.id)
+        else:
+            clusters = dedupe.find_duplicates(model, request.user.id)
+        serializer = serializers.DuplicateClusterSerializer([
+            {'id': kept.id, 'name': kept.name, 'duplicates': duplicates}
+            for kept, duplicates in clusters
+        ], many=True)
+        return Response(serializer.data)
+
+    @extend_schema(request=serializers.MergeSerializer)
+    @action(methods=['POST'], detail=False)
+    def merge(self, request):
+        """ Merge others into one, moving their recipes over """
+        serializer = serializers.MergeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queryset = self.queryset.filter(user=request.user)
+        into = get_object_or_404(
+            queryset, pk=serializer.validated_data['into']
+        )
+        ids = set(serializer.validated_data['ids'])
+        missing = ids - set(
+            queryset.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        if missing:
+            raise ValidationError({
+                'ids': [f'Not found: {", ".join(map(str, sorted(missing)))}']
+            })
+
+        dedupe.merge(self.queryset.model, request.user.id, {
+            into.pk: sorted(ids)
+        })
+        into.refresh_from_db()
+        return Response(self.get_serializer(into).data)
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """ manage tags in the database """
@@ -8,6 +8,8 @@ from django.contrib.auth import (
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from core.models import UserDeletion
+
 class UserSerializer(serializers.ModelSerializer):
     """ Serializer for user object """
     class Meta:
@@ -60,3 +62,9 @@ class AuthTokenSerializer(serializers.Serializer):
         attrs['user'] = user
         return attrs
 
+class UserDeletionSerializer(serializers.ModelSerializer):
+    """ Serializer for the progress of a user deletion """
+    class Meta:
+        model = UserDeletion
+        fields = ['email', 'deleted', 'created', 'finished']
+        read_only_fields = fields
@@ -1,22 +1,44 @@
 """
 Views for user API
 """
-from rest_framework import generics, authentication, permissions
-from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework import (
+    generics, authentication, parsers, permissions, status,
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+
+from core.annotations import extend_schema
+from core.deletion import schedule_user_deletion
 from user.serializers import (
     UserSerializer,
-    AuthTokenSerializer
+    AuthTokenSerializer,
+    UserDeletionSerializer,
 )
 
 class CreateUserView(generics.CreateAPIView):
     """create new user in the system"""
     serializer_class = UserSerializer
 
-class CreateTokenView(ObtainAuthToken):
+# Not ObtainAuthToken: its class body imports DEFAULT_SCHEMA_CLASS, and
+# with it drf_spectacular.openapi, in every worker
+class CreateTokenView(generics.GenericAPIView):
     """ create new auth token for user """
     serializer_class = AuthTokenSerializer
+    parser_classes = (
+        parsers.FormParser, parsers.MultiPartParser, parsers.JSONParser,
+    )
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'token'
+    permission_classes = ()
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        return Response({'token': token.key})
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """ Manage authenticated user """
@@ -26,4 +48,16 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
 
     def get_object(self):
         """ retrieve and return user """
-        return self.request.user
\ No newline at end of file
+        return self.request.user
+
+    @extend_schema(responses={202: UserDeletionSerializer})
+    def delete(self, request, *args, **kwargs):
+        """
+            Deactivate the account and delete it with all its data in
+            the background
+        """
+        deletion = schedule_user_deletion(request.user)
+        return Response(
+            UserDeletionSerializer(deletion).data,
+            status=status.HTTP_202_ACCEPTED,
+        )